@@ -0,0 +1,359 @@
+"""In-memory column store of complaint facts for the analytics endpoints.
+
+The integrity, risk, department and official performance routes all
+aggregate the whole complaints table. Instead of running a GROUP BY per
+request, the engine keeps one NumPy array per fact column (type,
+department, status, assigned official, created/updated time and rating) and
+answers the group-bys with ``np.bincount`` reductions.
+
+Triggers append the id of every changed row to ``analytics_changes``. Each
+query first reads the log past the engine's cursor and patches only those
+rows, so the store stays current without reloading the table. The log prunes
+itself; an engine that falls behind the pruned range reloads from scratch.
+"""
+import threading
+
+import numpy as np
+
+CHANGES_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS analytics_changes
+                       (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        table_name TEXT NOT NULL,
+                        row_id INTEGER)'''
+
+# Rows kept in analytics_changes; older entries are pruned every PRUNE_EVERY inserts
+CHANGE_LOG_RETAIN = 100000
+PRUNE_EVERY = 1000
+
+# Complaint columns the engine stores. Updates to other columns (description,
+# analysis, ...) are not logged.
+FACT_COLUMNS = ('type', 'department', 'status', 'assigned_official_id', 'created_at', 'updated_at',
+                'satisfaction_rating')
+
+
+def trigger_sql():
+    """CREATE TRIGGER statements logging changes the engine has to pick up."""
+    statements = []
+    for table, watched, row in [('complaints', FACT_COLUMNS, 'id'), ('feedback', None, None),
+                                ('officials', None, None)]:
+        for event, alias in [('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')]:
+            on = f"UPDATE OF {', '.join(watched)}" if event == 'UPDATE' and watched else event
+            row_id = f'{alias}.{row}' if row else 'NULL'
+            statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_analytics_{table}_{event.lower()}
+                AFTER {on} ON {table}
+                BEGIN INSERT INTO analytics_changes (table_name, row_id) VALUES ('{table}', {row_id}); END''')
+    statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_analytics_changes_prune
+        AFTER INSERT ON analytics_changes WHEN NEW.seq % {PRUNE_EVERY} = 0
+        BEGIN DELETE FROM analytics_changes WHERE seq <= NEW.seq - {CHANGE_LOG_RETAIN}; END''')
+    return statements
+
+
+def install(c):
+    c.execute(CHANGES_TABLE_SQL)
+    for sql in trigger_sql():
+        c.execute(sql)
+
+
+class _Codes:
+    """Dictionary encoding of a text column; NULL gets a code like any value."""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def encode(self, values):
+        index = self.index
+        codes = [index.setdefault(value, len(index)) for value in values]
+        self.values.extend(list(index)[len(self.values):])
+        return np.array(codes, dtype=np.int32)
+
+    def code(self, value):
+        return self.index.get(value, -1)
+
+    def sorted_codes(self, codes):
+        """Orders codes the way SQLite's GROUP BY orders their values (NULL first)."""
+        return sorted(codes, key=lambda code: (self.values[code] is not None, self.values[code] or ''))
+
+
+def _avg(total, count):
+    """Element-wise total / count, NaN where count is 0 (SQL AVG gives NULL)."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _sql_value(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+class AnalyticsEngine:
+    """Column store of complaint facts, refreshed from the analytics_changes log."""
+
+    # Above this many changed complaints a full reload is cheaper than patching
+    MAX_PATCH = 50000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._reset()
+
+    def _reset(self):
+        self.types = _Codes()
+        self.departments = _Codes()
+        self.statuses = _Codes()
+        self._position = {}
+        self._size = 0
+        self._dead = 0
+        self._columns = self._allocate(0)
+        self._officials = []
+        self._feedback = {}
+        self._results = {}
+
+    @staticmethod
+    def _allocate(capacity):
+        return {
+            'type': np.zeros(capacity, dtype=np.int32),
+            'department': np.zeros(capacity, dtype=np.int32),
+            'status': np.zeros(capacity, dtype=np.int32),
+            'official': np.full(capacity, -1, dtype=np.int64),
+            'created': np.full(capacity, np.nan),
+            'updated': np.full(capacity, np.nan),
+            'rating': np.full(capacity, np.nan),
+            'live': np.zeros(capacity, dtype=bool),
+        }
+
+    # Loading
+
+    def refresh(self, conn):
+        """Brings the store up to date with everything committed so far."""
+        with self._lock:
+            self._refresh(conn)
+
+    def _refresh(self, conn):
+        if self._cursor is None:
+            self._full_load(conn)
+            return
+        # Two subqueries: SQLite only answers a lone MIN() or MAX() from the index
+        low, high = conn.execute('''SELECT (SELECT MIN(seq) FROM analytics_changes),
+                                           (SELECT MAX(seq) FROM analytics_changes)''').fetchone()
+        if high is None or high <= self._cursor:
+            return
+        if low > self._cursor + 1:
+            # Entries we never saw have been pruned
+            self._full_load(conn)
+            return
+        changes = conn.execute('SELECT table_name, row_id FROM analytics_changes WHERE seq > ? AND seq <= ?',
+                               (self._cursor, high)).fetchall()
+        complaint_ids = {row_id for table, row_id in changes if table == 'complaints'}
+        if len(complaint_ids) > self.MAX_PATCH:
+            self._full_load(conn)
+            return
+        ids = sorted(complaint_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._select_complaints(conn, f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            self._upsert(rows)
+            self._delete(set(chunk) - {row[0] for row in rows})
+        tables = {table for table, _ in changes}
+        if 'officials' in tables:
+            self._load_officials(conn)
+        if 'feedback' in tables:
+            self._load_feedback(conn)
+        self._cursor = high
+        self._results = {}
+        if self._dead > self._size // 2:
+            self._compact()
+
+    def _full_load(self, conn):
+        # Read the cursor first: changes racing the load are replayed next time, and replaying is idempotent
+        cursor = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM analytics_changes').fetchone()[0]
+        self._reset()
+        self._upsert(self._select_complaints(conn, '', ()))
+        self._load_officials(conn)
+        self._load_feedback(conn)
+        self._cursor = cursor
+
+    @staticmethod
+    def _select_complaints(conn, where, params):
+        return conn.execute(f'''SELECT id, type, department, status, assigned_official_id,
+                                       JULIANDAY(created_at), JULIANDAY(updated_at), satisfaction_rating
+                                FROM complaints {where}''', params).fetchall()
+
+    def _load_officials(self, conn):
+        self._officials = [tuple(row) for row in conn.execute('SELECT id, name, department FROM officials ORDER BY id')]
+
+    def _load_feedback(self, conn):
+        # service_name -> (feedback rows, non-NULL ratings, rating sum)
+        self._feedback = {row[0]: (row[1], row[2], row[3] or 0) for row in conn.execute(
+            'SELECT service_name, COUNT(*), COUNT(rating), SUM(rating) FROM feedback GROUP BY service_name')}
+
+    def _upsert(self, rows):
+        if not rows:
+            return
+        ids, types, departments, statuses, officials, created, updated, ratings = zip(*rows)
+        index = np.empty(len(ids), dtype=np.int64)
+        added = 0
+        for i, complaint_id in enumerate(ids):
+            position = self._position.get(complaint_id)
+            if position is None:
+                position = self._position[complaint_id] = self._size + added
+                added += 1
+            index[i] = position
+        self._grow(self._size + added)
+        self._size += added
+        columns = self._columns
+        columns['type'][index] = self.types.encode(types)
+        columns['department'][index] = self.departments.encode(departments)
+        columns['status'][index] = self.statuses.encode(statuses)
+        columns['official'][index] = [-1 if value is None else value for value in officials]
+        columns['created'][index] = np.array(created, dtype=float)
+        columns['updated'][index] = np.array(updated, dtype=float)
+        columns['rating'][index] = np.array(ratings, dtype=float)
+        columns['live'][index] = True
+
+    def _grow(self, size):
+        capacity = len(self._columns['live'])
+        if size <= capacity:
+            return
+        grown = self._allocate(max(size, capacity * 2, 1024))
+        for name, column in self._columns.items():
+            grown[name][:capacity] = column
+        self._columns = grown
+
+    def _delete(self, ids):
+        for complaint_id in ids:
+            position = self._position.pop(complaint_id, None)
+            if position is not None:
+                self._columns['live'][position] = False
+                self._dead += 1
+
+    def _compact(self):
+        keep = np.flatnonzero(self._columns['live'][:self._size])
+        ids = np.empty(self._size, dtype=np.int64)
+        for complaint_id, position in self._position.items():
+            ids[position] = complaint_id
+        columns = self._allocate(len(keep))
+        for name, column in self._columns.items():
+            columns[name][:] = column[keep]
+        self._columns = columns
+        self._position = {int(complaint_id): position for position, complaint_id in enumerate(ids[keep])}
+        self._size = len(keep)
+        self._dead = 0
+
+    # Queries. Each returns the rows the equivalent SQL returned, computed once
+    # per change to the store.
+
+    def _query(self, conn, key, compute, *args):
+        with self._lock:
+            self._refresh(conn)
+            if key not in self._results:
+                result = compute(*args)
+                if result is None:
+                    # Not cached, so unknown departments can't grow the cache
+                    return None
+                self._results[key] = result
+            return self._results[key]
+
+    def department_summary(self, conn):
+        """department, total_complaints, resolved_complaints, avg_satisfaction per non-NULL department."""
+        # Fresh dicts, since callers add keys to them
+        return [dict(row) for row in self._query(conn, 'departments', self._department_summary)]
+
+    def type_summary(self, conn):
+        """(type, total, resolved) per type, including NULL."""
+        return self._query(conn, 'types', self._type_summary)
+
+    def official_summary(self, conn):
+        """Officials LEFT JOIN their assigned complaints, grouped by official, in id order:
+        (id, name, department, assigned, resolved, avg resolution days)."""
+        return self._query(conn, 'officials', self._official_summary)
+
+    def department_performance(self, department, conn):
+        """(total, resolved, avg resolution days, avg feedback rating) for one department, or None.
+
+        Matches the original ``complaints LEFT JOIN feedback ON type = service_name``
+        query, where every complaint counts once per feedback row for its type.
+        """
+        return self._query(conn, ('department', department), self._department_performance, department)
+
+    def _view(self):
+        return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def _is(self, codes, column, value):
+        return column == codes.code(value)
+
+    def _department_summary(self):
+        col = self._view()
+        mask = col['live'] & ~self._is(self.departments, col['department'], None)
+        groups = col['department'][mask]
+        size = len(self.departments.values)
+        total = np.bincount(groups, minlength=size)
+        resolved = np.bincount(groups, weights=self._is(self.statuses, col['status'], 'Resolved')[mask],
+                               minlength=size)
+        rated = ~np.isnan(col['rating'][mask])
+        avg_rating = _avg(np.bincount(groups[rated], weights=col['rating'][mask][rated], minlength=size),
+                          np.bincount(groups[rated], minlength=size))
+        return [{
+            'department': self.departments.values[code],
+            'total_complaints': int(total[code]),
+            'resolved_complaints': int(resolved[code]),
+            'avg_satisfaction': _sql_value(avg_rating[code]),
+        } for code in self.departments.sorted_codes(np.flatnonzero(total))]
+
+    def _type_summary(self):
+        col = self._view()
+        live = col['live']
+        groups = col['type'][live]
+        size = len(self.types.values)
+        total = np.bincount(groups, minlength=size)
+        resolved = np.bincount(groups, weights=self._is(self.statuses, col['status'], 'Resolved')[live],
+                               minlength=size)
+        return [(self.types.values[code], int(total[code]), int(resolved[code]))
+                for code in self.types.sorted_codes(np.flatnonzero(total))]
+
+    def _official_summary(self):
+        if not self._officials:
+            return []
+        col = self._view()
+        official_ids = np.array([row[0] for row in self._officials], dtype=np.int64)
+        mask = col['live'] & (col['official'] >= 0)
+        slot = np.searchsorted(official_ids, col['official'][mask])
+        matched = slot < len(official_ids)
+        matched[matched] = official_ids[slot[matched]] == col['official'][mask][matched]
+        groups = slot[matched]
+        size = len(official_ids)
+        assigned = np.bincount(groups, minlength=size)
+        resolved = np.bincount(groups, weights=self._is(self.statuses, col['status'], 'Resolved')[mask][matched],
+                               minlength=size)
+        days = (col['updated'] - col['created'])[mask][matched]
+        known = ~np.isnan(days)
+        avg_days = _avg(np.bincount(groups[known], weights=days[known], minlength=size),
+                        np.bincount(groups[known], minlength=size))
+        return [(official_id, name, department, int(assigned[i]), int(resolved[i]), _sql_value(avg_days[i]))
+                for i, (official_id, name, department) in enumerate(self._officials)]
+
+    def _department_performance(self, department):
+        code = self.departments.code(department)
+        if department is None or code < 0:
+            return None
+        col = self._view()
+        mask = col['live'] & (col['department'] == code)
+        if not mask.any():
+            return None
+        size = len(self.types.values)
+        rows = np.ones(size)
+        rating_count = np.zeros(size)
+        rating_sum = np.zeros(size)
+        for type_code, value in enumerate(self.types.values):
+            # NULL never equals NULL in the join
+            if value is not None and value in self._feedback:
+                rows[type_code], rating_count[type_code], rating_sum[type_code] = self._feedback[value]
+        types = col['type'][mask]
+        weight = rows[types]
+        resolved = self._is(self.statuses, col['status'], 'Resolved')[mask]
+        days = col['updated'][mask] - col['created'][mask]
+        known = ~np.isnan(days)
+        total = weight.sum()
+        avg_days = (weight[known] * days[known]).sum() / weight[known].sum() if known.any() else np.nan
+        ratings = rating_count[types].sum()
+        avg_rating = rating_sum[types].sum() / ratings if ratings else np.nan
+        return int(total), int((weight * resolved).sum()), _sql_value(avg_days), _sql_value(avg_rating)
@@ -0,0 +1,438 @@
+"""Streaming complaint anomaly detection per department, type and place.
+
+Complaints are counted per day in series keyed by (department, type,
+geohash cell). Each series also feeds two roll-ups, (department, type, '*')
+and ('*', '*', '*'), so a spike spread over many cells still shows. Every
+series keeps an exponentially weighted mean and variance of its daily counts
+in ``anomaly_series``. The day currently being counted is held apart from
+them: a day is folded into the averages when the series' next complaint
+arrives on a later day, together with the zero days in between. Closed days
+scoring at least RECORD_MIN_Z are kept in ``anomaly_events``.
+
+``observe`` follows complaints.id from the cursor in ``anomaly_state`` and
+updates three series per new complaint, inside the caller's transaction.
+Nothing is replayed after a restart. A complaint is counted under the
+department it was filed with; later reassignment doesn't move it.
+
+``rebuild`` recomputes every series from the full history in one vectorized
+pass over the days. It runs when the tables are created, after bulk loads,
+and when the smoothing settings change:
+
+    python anomalies.py --check    # compare the stored state with a recomputation
+    python anomalies.py --rebuild  # recompute the state from complaints
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+from datetime import date
+
+import numpy as np
+
+from db import DB_PATH
+
+ALPHA = float(os.environ.get('ANOMALY_EWMA_ALPHA', 0.1))
+GEOHASH_PRECISION = int(os.environ.get('ANOMALY_GEOHASH_PRECISION', 5))
+# Days a series must have been followed before its z-scores are reported
+MIN_HISTORY_DAYS = 14
+# Variance floor. Daily counts are roughly Poisson, so the mean is one too.
+MIN_VARIANCE = 1.0
+# Closed days below this z-score are not kept
+RECORD_MIN_Z = 2.0
+# Above this many new complaints, observe() recomputes instead of stepping
+MAX_STEPS = 10000
+ALL = '*'
+
+SERIES_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS anomaly_series
+                      (department TEXT NOT NULL,
+                       type TEXT NOT NULL,
+                       geohash TEXT NOT NULL,
+                       first_day INTEGER NOT NULL,
+                       day INTEGER NOT NULL,
+                       count INTEGER NOT NULL,
+                       mean REAL NOT NULL,
+                       var REAL NOT NULL,
+                       days_seen INTEGER NOT NULL,
+                       PRIMARY KEY (department, type, geohash)) WITHOUT ROWID'''
+
+EVENTS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS anomaly_events
+                      (department TEXT NOT NULL,
+                       type TEXT NOT NULL,
+                       geohash TEXT NOT NULL,
+                       day INTEGER NOT NULL,
+                       count INTEGER NOT NULL,
+                       expected REAL NOT NULL,
+                       z_score REAL NOT NULL,
+                       PRIMARY KEY (department, type, geohash, day)) WITHOUT ROWID'''
+
+STATE_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS anomaly_state
+                     (id INTEGER PRIMARY KEY CHECK (id = 1),
+                      last_complaint_id INTEGER NOT NULL,
+                      alpha REAL NOT NULL,
+                      geohash_precision INTEGER NOT NULL)'''
+
+INDEXES_SQL = [
+    'CREATE INDEX IF NOT EXISTS idx_anomaly_series_day ON anomaly_series (day)',
+    'CREATE INDEX IF NOT EXISTS idx_anomaly_events_day ON anomaly_events (day)',
+]
+
+# Epoch day of created_at; computed in SQL so both paths agree on the calendar
+_DAY_SQL = "CAST(JULIANDAY(DATE(created_at)) - 2440587.5 AS INTEGER)"
+_COMPLAINTS_SQL = f'''SELECT id, {_DAY_SQL}, COALESCE(department, ''), COALESCE(type, ''), latitude, longitude
+                      FROM complaints WHERE id > ? AND created_at IS NOT NULL ORDER BY id'''
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_EPOCH = date(1970, 1, 1)
+
+
+def install(c):
+    c.execute(SERIES_TABLE_SQL)
+    c.execute(EVENTS_TABLE_SQL)
+    c.execute(STATE_TABLE_SQL)
+    for sql in INDEXES_SQL:
+        c.execute(sql)
+    rebuild(c)
+
+
+def epoch_day(day):
+    return (day - _EPOCH).days
+
+
+# Geohashes
+
+def _geohash_bits(precision):
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2  # longitude gets the extra bit
+
+
+def _coordinate(value):
+    """A stored coordinate as a float, or None if it is missing or not a number.
+
+    SQLite keeps text such as '' as-is in REAL columns, so rows from before
+    coordinates were validated can hold it.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point, or '' without usable coordinates."""
+    latitude, longitude = _coordinate(latitude), _coordinate(longitude)
+    if latitude is None or longitude is None:
+        return ''
+    lng_bits, lat_bits = _geohash_bits(precision)
+    x = min(int((longitude + 180) / 360 * (1 << lng_bits)), (1 << lng_bits) - 1)
+    y = min(int((latitude + 90) / 180 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    code = 0
+    for position in range(lng_bits + lat_bits):
+        # Bits alternate longitude, latitude, starting with longitude
+        if position % 2 == 0:
+            code = (code << 1) | ((x >> (lng_bits - 1 - position // 2)) & 1)
+        else:
+            code = (code << 1) | ((y >> (lat_bits - 1 - position // 2)) & 1)
+    return ''.join(_BASE32[(code >> 5 * i) & 31] for i in range(precision - 1, -1, -1))
+
+
+def geohash_array(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    """Vectorized geohash(); NaN coordinates give ''."""
+    lng_bits, lat_bits = _geohash_bits(precision)
+    known = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    lat = np.where(known, latitudes, 0.0)
+    lng = np.where(known, longitudes, 0.0)
+    x = np.minimum(((lng + 180) / 360 * (1 << lng_bits)).astype(np.int64), (1 << lng_bits) - 1)
+    y = np.minimum(((lat + 90) / 180 * (1 << lat_bits)).astype(np.int64), (1 << lat_bits) - 1)
+    code = np.zeros(len(lat), dtype=np.int64)
+    for position in range(lng_bits + lat_bits):
+        if position % 2 == 0:
+            code = (code << 1) | ((x >> (lng_bits - 1 - position // 2)) & 1)
+        else:
+            code = (code << 1) | ((y >> (lat_bits - 1 - position // 2)) & 1)
+    alphabet = np.array(list(_BASE32))
+    hashes = alphabet[(code >> 5 * (precision - 1)) & 31].astype(object)
+    for i in range(precision - 2, -1, -1):
+        hashes = hashes + alphabet[(code >> 5 * i) & 31].astype(object)
+    return np.where(known, hashes, '')
+
+
+def geohash_center(value):
+    """(latitude, longitude) of a geohash cell's centre, or None."""
+    if not value or value == ALL:
+        return None
+    lng_bits, lat_bits = _geohash_bits(len(value))
+    code = 0
+    for char in value:
+        code = (code << 5) | _BASE32.index(char)
+    x = y = 0
+    for position in range(lng_bits + lat_bits):
+        bit = (code >> (lng_bits + lat_bits - 1 - position)) & 1
+        if position % 2 == 0:
+            x = (x << 1) | bit
+        else:
+            y = (y << 1) | bit
+    return ((y + 0.5) / (1 << lat_bits) * 180 - 90, (x + 0.5) / (1 << lng_bits) * 360 - 180)
+
+
+def series_keys(department, complaint_type, cell):
+    """The series one complaint counts towards: its cell, its department and type, and everything."""
+    return [(department, complaint_type, cell), (department, complaint_type, ALL), (ALL, ALL, ALL)]
+
+
+# EWMA state
+
+def z_score(count, mean, var):
+    return (count - mean) / math.sqrt(max(var, mean, MIN_VARIANCE))
+
+
+def _fold(mean, var, days_seen, count, alpha):
+    """Adds one day's count to the running mean and variance."""
+    if days_seen == 0:
+        return float(count), 0.0
+    diff = count - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * (var + diff * increment)
+
+
+def _zero_fold_limit(alpha):
+    # After this many empty days the averages are within 1e-9 of zero
+    return math.ceil(math.log(1e-9) / math.log(1 - alpha)) if 0 < alpha < 1 else 1
+
+
+def _advance(row, day, alpha):
+    """Closes the series' open day and starts counting ``day``.
+
+    Returns the new row values and the closed day's (day, count, expected,
+    z-score) if it is worth recording, else None.
+    """
+    first_day, open_day, count, mean, var, days_seen = row
+    event = None
+    if days_seen >= MIN_HISTORY_DAYS:
+        z = z_score(count, mean, var)
+        if z >= RECORD_MIN_Z:
+            event = (open_day, count, mean, z)
+    mean, var = _fold(mean, var, days_seen, count, alpha)
+    empty = day - open_day - 1
+    for _ in range(min(empty, _zero_fold_limit(alpha))):
+        mean, var = _fold(mean, var, 1, 0, alpha)
+    return (first_day, day, 1, mean, var, days_seen + 1 + empty), event
+
+
+def _state(c):
+    return c.execute('SELECT last_complaint_id, alpha, geohash_precision FROM anomaly_state WHERE id = 1').fetchone()
+
+
+def observe(c, alpha=ALPHA, precision=GEOHASH_PRECISION):
+    """Adds complaints committed since the last call to their series, in the caller's transaction.
+
+    Returns the number of complaints added. Recomputes from scratch when the
+    settings changed or too many complaints arrived (a bulk load).
+    """
+    state = _state(c)
+    if state is None or state[1] != alpha or state[2] != precision:
+        return rebuild(c, alpha, precision)
+    newest = c.execute('SELECT MAX(id) FROM complaints').fetchone()[0]
+    if newest is None or newest <= state[0]:
+        return 0
+    if newest - state[0] > MAX_STEPS:
+        return rebuild(c, alpha, precision)
+
+    rows = c.execute(_COMPLAINTS_SQL, (state[0],)).fetchall()
+    for _, day, department, complaint_type, latitude, longitude in rows:
+        for key in series_keys(department, complaint_type, geohash(latitude, longitude, precision)):
+            row = c.execute('''SELECT first_day, day, count, mean, var, days_seen FROM anomaly_series
+                               WHERE department = ? AND type = ? AND geohash = ?''', key).fetchone()
+            if row is None:
+                c.execute('''INSERT INTO anomaly_series (department, type, geohash, first_day, day, count, mean, var,
+                                                         days_seen) VALUES (?, ?, ?, ?, ?, 1, 0, 0, 0)''',
+                          key + (day, day))
+            elif day <= row[1]:
+                # Same day, or a backdated complaint: counted on the open day
+                c.execute('''UPDATE anomaly_series SET count = count + 1
+                             WHERE department = ? AND type = ? AND geohash = ?''', key)
+            else:
+                values, event = _advance(row, day, alpha)
+                c.execute('''UPDATE anomaly_series SET first_day = ?, day = ?, count = ?, mean = ?, var = ?,
+                                    days_seen = ?
+                             WHERE department = ? AND type = ? AND geohash = ?''', values + key)
+                if event is not None:
+                    c.execute('INSERT OR REPLACE INTO anomaly_events VALUES (?, ?, ?, ?, ?, ?, ?)', key + event)
+    # Undated complaints are skipped but still move the cursor
+    c.execute('UPDATE anomaly_state SET last_complaint_id = ? WHERE id = 1', (newest,))
+    return len(rows)
+
+
+# Backfill
+
+def backfill(c, alpha=ALPHA, precision=GEOHASH_PRECISION):
+    """Recomputes every series from complaints.
+
+    Returns (rows for anomaly_series, rows for anomaly_events, last complaint
+    id, complaints counted).
+
+    Each series is stepped through its days with complaints, all series at
+    once, with the same arithmetic as observe().
+    """
+    last_id = c.execute('SELECT COALESCE(MAX(id), 0) FROM complaints').fetchone()[0]
+    rows = c.execute(_COMPLAINTS_SQL, (0,)).fetchall()
+    if not rows:
+        return [], [], last_id, 0
+    _, days, departments, types, latitudes, longitudes = zip(*rows)
+    days = np.array(days, dtype=np.int64)
+    cells = geohash_array(np.array([_coordinate(value) for value in latitudes], dtype=float),
+                          np.array([_coordinate(value) for value in longitudes], dtype=float), precision)
+    departments = np.array(departments, dtype=object)
+    types = np.array(types, dtype=object)
+    everything = np.full(len(days), ALL, dtype=object)
+    keys = np.concatenate([departments + '\x1f' + types + '\x1f' + cells,
+                           departments + '\x1f' + types + '\x1f' + ALL,
+                           everything + '\x1f' + ALL + '\x1f' + ALL])
+    names, series = np.unique(keys.astype(str), return_inverse=True)
+    days = np.tile(days, 3)
+    size = len(names)
+
+    # One entry per series and day with complaints, ordered by series and day
+    base = int(days.min())
+    span = int(days.max()) - base + 1
+    entries, entry_counts = np.unique(series * span + (days - base), return_counts=True)
+    entry_days = entries % span + base
+    starts = np.flatnonzero(np.r_[True, np.diff(entries // span) != 0])
+    lengths = np.diff(np.r_[starts, len(entries)])
+
+    first_day = entry_days[starts]
+    open_day = first_day.copy()
+    open_count = entry_counts[starts]
+    mean = np.zeros(size)
+    var = np.zeros(size)
+    days_seen = np.zeros(size, dtype=np.int64)
+    events = []
+    zero_limit = _zero_fold_limit(alpha)
+
+    # Step j moves every series with more than j days onto its j-th day, as observe() would
+    for step in range(1, int(lengths.max())):
+        active = np.flatnonzero(lengths > step)
+        entry = starts[active] + step
+        count, m, v, seen = open_count[active], mean[active], var[active], days_seen[active]
+        z = (count - m) / np.sqrt(np.maximum(np.maximum(v, m), MIN_VARIANCE))
+        for index in np.flatnonzero((seen >= MIN_HISTORY_DAYS) & (z >= RECORD_MIN_Z)):
+            events.append((active[index], int(open_day[active[index]]), int(count[index]), float(m[index]),
+                           float(z[index])))
+        diff = count - m
+        increment = alpha * diff
+        m, v = (np.where(seen == 0, count, m + increment),
+                np.where(seen == 0, 0.0, (1 - alpha) * (v + diff * increment)))
+        empty = entry_days[entry] - open_day[active] - 1
+        for gap in range(min(int(empty.max()), zero_limit)):
+            later = empty > gap
+            diff = -m[later]
+            increment = alpha * diff
+            m[later], v[later] = m[later] + increment, (1 - alpha) * (v[later] + diff * increment)
+        mean[active], var[active] = m, v
+        days_seen[active] = seen + 1 + empty
+        open_day[active] = entry_days[entry]
+        open_count[active] = entry_counts[entry]
+
+    keys = [tuple(name.split('\x1f')) for name in names]
+    result = [keys[index] + (int(first_day[index]), int(open_day[index]), int(open_count[index]),
+                             float(mean[index]), float(var[index]), int(days_seen[index]))
+              for index in range(size)]
+    return result, [keys[event[0]] + event[1:] for event in events], last_id, len(rows)
+
+
+def rebuild(c, alpha=ALPHA, precision=GEOHASH_PRECISION):
+    """Replaces the stored state with a recomputation. Returns the number of complaints counted."""
+    rows, events, last_id, counted = backfill(c, alpha, precision)
+    c.execute('DELETE FROM anomaly_series')
+    c.execute('DELETE FROM anomaly_events')
+    c.executemany('INSERT INTO anomaly_series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    c.executemany('INSERT INTO anomaly_events VALUES (?, ?, ?, ?, ?, ?, ?)', events)
+    c.execute('''INSERT OR REPLACE INTO anomaly_state (id, last_complaint_id, alpha, geohash_precision)
+                 VALUES (1, ?, ?, ?)''', (last_id, alpha, precision))
+    return counted
+
+
+def _compare(stored_rows, expected_rows, width, tolerance):
+    expected = {row[:width]: row[width:] for row in expected_rows}
+    stored = {tuple(row[:width]): tuple(row[width:]) for row in stored_rows}
+    problems = []
+    for key in sorted(set(expected) | set(stored)):
+        a, b = stored.get(key), expected.get(key)
+        same = a is not None and b is not None and all(
+            x == y or (x is not None and y is not None and abs(x - y) <= tolerance * max(1.0, abs(y)))
+            for x, y in zip(a, b))
+        if not same:
+            problems.append((key, a, b))
+    return problems
+
+
+def drift(c, alpha=ALPHA, precision=GEOHASH_PRECISION, tolerance=1e-6):
+    """Series and events whose stored state differs from a recomputation: [(key, stored, expected)]."""
+    rows, events, _, _ = backfill(c, alpha, precision)
+    return (_compare(c.execute('SELECT * FROM anomaly_series'), rows, 3, tolerance) +
+            _compare(c.execute('SELECT * FROM anomaly_events'), events, 4, tolerance))
+
+
+# Reading
+
+def detect(c, days=30, min_z=3.0, limit=50, today=None):
+    """Days in the last ``days`` days on which a series stood out, highest z-score first.
+
+    Covers recorded events and each series' open day, scored as it stands.
+    ``min_z`` below RECORD_MIN_Z only widens the open days.
+    """
+    since = epoch_day(today or date.today()) - days + 1
+    found = []
+    for department, complaint_type, cell, day, count, mean, var, days_seen in c.execute(
+            '''SELECT department, type, geohash, day, count, mean, var, days_seen FROM anomaly_series
+               WHERE day >= ? AND days_seen >= ?''', (since, MIN_HISTORY_DAYS)):
+        z = z_score(count, mean, var)
+        if z >= min_z:
+            found.append((z, department, complaint_type, cell, day, count, mean))
+    found.extend((z, department, complaint_type, cell, day, count, expected)
+                 for department, complaint_type, cell, day, count, expected, z in c.execute(
+                     'SELECT * FROM anomaly_events WHERE day >= ? AND z_score >= ?', (since, min_z)))
+    found.sort(key=lambda item: -item[0])
+
+    anomalies = []
+    for z, department, complaint_type, cell, day, count, mean in found[:limit]:
+        center = geohash_center(cell)
+        anomalies.append({
+            'date': date.fromordinal(_EPOCH.toordinal() + day).isoformat(),
+            'department': department,
+            'type': complaint_type,
+            'geohash': cell,
+            'latitude': center[0] if center else None,
+            'longitude': center[1] if center else None,
+            'count': count,
+            'expected': round(mean, 2),
+            'z_score': round(z, 2),
+            'severity': 'High' if z >= 2 * min_z else 'Medium',
+        })
+    return anomalies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or rebuild the anomaly detector state.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check', action='store_true', help='Report series that differ from a recomputation')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute the state from complaints')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        conn.execute('BEGIN IMMEDIATE')
+        counted = rebuild(conn)
+        conn.commit()
+        print(f"Rebuilt anomaly state from {counted} complaint(s)")
+    else:
+        conn.execute('BEGIN IMMEDIATE')
+        observe(conn)
+        conn.commit()
+    problems = drift(conn)
+    for key, stored, expected in problems[:20]:
+        print(f"WARNING: series {key} is {stored}, recomputed {expected}")
+    print('Anomaly state matches complaints' if not problems else f'{len(problems)} series out of step')
+    conn.close()
+    sys.exit(1 if problems else 0)
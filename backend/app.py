@@ -1,383 +1,140 @@
 import os
-import sqlite3
 import json
+import threading
 from datetime import datetime
 import google.generativeai as genai
-from presidio_analyzer import AnalyzerEngine
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from presidio_anonymizer import AnonymizerEngine
-from flask import Flask, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, Response, request, jsonify, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from dotenv import load_dotenv
+import anomalies
+import counters
+from analytics import AnalyticsEngine
+import clustering
+import derivatives
+from evidence_store import EvidenceStore, parse_blob_path
+import flaw_analysis
+import geo
+import metrics
+import outbox
+import query_log
+import responses
+import rollups
+import search
+from jobs import JobQueue, WorkerPool, enqueue
+from llm_cache import LLMCache
+from db import DB_PATH, connect, enable_wal, get_db
+from migrations import migrate
+from pagination import BadQueryParameter, fetch_page, filter_clauses, page_response
+from redaction import RedactionService, RemoteRedactionService, parse_address, parse_entities
+from response_cache import DiskTier, ResponseCache
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}})
-
-# Configuration for file uploads
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}}, expose_headers=['X-Next-Cursor', 'Link'])
+# orjson encoding when installed, and gzip/brotli for responses from RESPONSE_COMPRESS_MIN_BYTES up
+responses.init_app(app, min_bytes=int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', 1024)),
+                   gzip_level=int(os.environ.get('RESPONSE_GZIP_LEVEL', 6)),
+                   brotli_quality=int(os.environ.get('RESPONSE_BROTLI_QUALITY', 5)))
+# Per-route latency, status codes, in-flight requests and SQLite use, served on /metrics.
+# With several worker processes, METRICS_DIR (cleared on restart) lets any of them report all.
+metrics.init_app(app)
+# Slow statements with their query plans, and repeated ones (N+1), per route: /api/query-log/report
+query_log.init_app(app)
+
+# Configuration for file uploads. Evidence is streamed into a content-addressed
+# store while the request is parsed; oversized files or bodies are rejected with 413.
+# Behind nginx or Apache, EVIDENCE_SENDFILE=x-accel-redirect / x-sendfile lets the
+# proxy send the bytes (nginx needs an internal location at EVIDENCE_ACCEL_PREFIX
+# aliased to the uploads folder).
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('EVIDENCE_MAX_REQUEST_BYTES', 200 * 1024 * 1024))
+evidence_store = EvidenceStore(UPLOAD_FOLDER,
+                               max_file_bytes=int(os.environ.get('EVIDENCE_MAX_FILE_BYTES', 50 * 1024 * 1024)),
+                               sendfile=os.environ.get('EVIDENCE_SENDFILE'),
+                               accel_prefix=os.environ.get('EVIDENCE_ACCEL_PREFIX', '/protected-uploads/'))
+app.request_class = evidence_store.request_class()
 
 # Configure Gemini Pro
 genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.0-flash')
-
-# Initialize Presidio
-analyzer = AnalyzerEngine()
-anonymizer = AnonymizerEngine()
-
-# Database connection helper
-def get_db_connection():
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+GEMINI_MODEL_NAME = 'gemini-2.0-flash'
+model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# Gemini responses are cached by model, prompt template version and input.
+# Bump a template version whenever its prompt text changes.
+COMPLAINT_ANALYSIS_PROMPT_VERSION = 'complaint-analysis-v1'
+SYSTEMIC_FLAWS_PROMPT_VERSION = 'systemic-flaws-v2'
+SYSTEMIC_FLAWS_CHUNK_PROMPT_VERSION = 'systemic-flaws-chunk-v1'
+SYSTEMIC_FLAWS_REDUCE_PROMPT_VERSION = 'systemic-flaws-reduce-v1'
+llm_cache = LLMCache(
+    os.path.join(os.path.dirname(DB_PATH), 'llm_cache.db'),
+    max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 10000)),
+    max_bytes=int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl_seconds=int(os.environ.get('LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600)))
+
+# Initialize the PII redaction service. Presidio runs in a separate process pool
+# (or a shared service process, if REDACTION_SERVICE_ADDRESS is set) so the spaCy
+# model is loaded once rather than in every web worker.
+if os.environ.get('REDACTION_SERVICE_ADDRESS'):
+    redaction_service = RemoteRedactionService(
+        parse_address(os.environ['REDACTION_SERVICE_ADDRESS']),
+        os.environ.get('REDACTION_SERVICE_AUTHKEY'))
+else:
+    redaction_service = RedactionService(
+        pool_size=int(os.environ.get('REDACTION_POOL_SIZE', 1)),
+        batch_window=float(os.environ.get('REDACTION_BATCH_WINDOW_MS', 10)) / 1000,
+        max_batch_size=int(os.environ.get('REDACTION_MAX_BATCH_SIZE', 32)),
+        ner_policy=os.environ.get('REDACTION_NER_POLICY', 'always'),
+        entities=parse_entities(os.environ.get('REDACTION_ENTITIES')))
+
+# Read-only routes are answered from a cache keyed on the versions of the tables
+# they read (see response_cache.py). RESPONSE_CACHE_PATH adds a SQLite tier
+# shared by every worker process.
+response_cache = ResponseCache(
+    get_db,
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    disk=DiskTier(os.environ['RESPONSE_CACHE_PATH'],
+                  max_entries=int(os.environ.get('RESPONSE_CACHE_DISK_MAX_ENTRIES', 10000)),
+                  max_bytes=int(os.environ.get('RESPONSE_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024)))
+    if os.environ.get('RESPONSE_CACHE_PATH') else None)
+
+# Column store behind the integrity, risk and performance endpoints. It loads
+# on first use and then follows the analytics_changes log.
+analytics = AnalyticsEngine()
 
 # Database initialization
 def init_db():
-    # Define the database path
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
-    
-    # Check if database exists, if not create it
-    if not os.path.exists(db_path):
+    if not os.path.exists(DB_PATH):
         print("Database not found. Creating new database...")
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Create users table
-        c.execute('''CREATE TABLE users
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      email TEXT UNIQUE,
-                      password TEXT,
-                      aadhar TEXT UNIQUE,
-                      role TEXT,
-                      name TEXT)''')
-        
-        # Create complaints table with user_id column
-        c.execute('''CREATE TABLE complaints
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      type TEXT,
-                      description TEXT,
-                      status TEXT,
-                      created_at TIMESTAMP,
-                      updated_at TIMESTAMP,
-                      user_id INTEGER,
-                      latitude REAL,
-                      longitude REAL,
-                      assigned_official_id INTEGER,
-                      department TEXT,
-                      satisfaction_rating INTEGER,
-                      FOREIGN KEY(user_id) REFERENCES users(id),
-                      FOREIGN KEY(assigned_official_id) REFERENCES users(id))''')
-        
-        # Create rewards table
-        c.execute('''CREATE TABLE rewards
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      complaint_id INTEGER,
-                      amount INTEGER,
-                      status TEXT,
-                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''')
-        
-        # Create comments table
-        c.execute('''CREATE TABLE comments
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      complaint_id INTEGER,
-                      user_id INTEGER,
-                      comment TEXT,
-                      timestamp TIMESTAMP,
-                      FOREIGN KEY(complaint_id) REFERENCES complaints(id),
-                      FOREIGN KEY(user_id) REFERENCES users(id))''')
-        
-        # Create most wanted criminals table
-        c.execute('''CREATE TABLE most_wanted
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      name TEXT,
-                      crime TEXT,
-                      description TEXT,
-                      last_seen TEXT,
-                      reward_amount INTEGER,
-                      status TEXT,
-                      image_url TEXT)''')
-        
-        # Create officials table for accountability
-        c.execute('''CREATE TABLE officials
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      name TEXT,
-                      department TEXT,
-                      position TEXT,
-                      performance_score REAL)''')
-        
-        # Create community reports table
-        c.execute('''CREATE TABLE community_reports
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      location TEXT,
-                      issue TEXT,
-                      severity TEXT,
-                      description TEXT,
-                      status TEXT,
-                      created_at TIMESTAMP)''')
-        
-        # Create feedback table
-        c.execute('''CREATE TABLE feedback
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      service_name TEXT,
-                      rating INTEGER,
-                      comments TEXT,
-                      anonymous INTEGER,
-                      created_at TIMESTAMP)''')
-        
-        # Create evidence table to store file paths
-        c.execute('''CREATE TABLE evidence
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      complaint_id INTEGER,
-                      file_path TEXT,
-                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''')
-
-        # Create user_tags table for flagging officials
-        c.execute('''CREATE TABLE user_tags
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER,
-                      tag_type TEXT,
-                      complaint_id INTEGER,
-                      created_at TIMESTAMP,
-                      FOREIGN KEY(user_id) REFERENCES users(id),
-                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''')
-
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-        # Insert dummy users
-        c.execute("INSERT INTO users (email, password, aadhar, role, name) VALUES (?, ?, ?, ?, ?)",
-                  ("citizen@example.com", "password123", "123456789012", "citizen", "Rajesh Kumar"))
-                  
-        c.execute("INSERT INTO users (email, password, aadhar, role, name) VALUES (?, ?, ?, ?, ?)",
-                  ("police@example.com", "password123", "123456789013", "police", "Inspector Sharma"))
-                  
-        c.execute("INSERT INTO users (email, password, aadhar, role, name) VALUES (?, ?, ?, ?, ?)",
-                  ("official@example.com", "password123", "123456789014", "official", "Officer Singh"))
-        
-        # Insert mock complaints
-        c.execute("INSERT INTO complaints (type, description, status, created_at, updated_at, user_id, latitude, longitude, department) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                  ("bribery", "Officer asked for ₹5000 to approve license", "Resolved", datetime.now(), datetime.now(), 1, 19.0760, 72.8777, "Police"))
-        
-        c.execute("INSERT INTO complaints (type, description, status, created_at, updated_at, user_id, latitude, longitude, department) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                  ("delay", "Passport application pending for 3 months", "In Progress", datetime.now(), datetime.now(), 1, 28.6139, 77.2090, "Passport Office"))
-        
-        # Insert mock reward
-        c.execute("INSERT INTO rewards (complaint_id, amount, status) VALUES (?, ?, ?)",
-                  (1, 5000, "Distributed"))
-        
-        # Insert most wanted criminals
-        c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  ("Vijay Mallya", "Financial Fraud", "Wanted for bank fraud and money laundering", "London, UK", 5000000, "Active", "https://example.com/mallya.jpg"))
-        
-        c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  ("Nirav Modi", "Punjab National Bank Scam", "Wanted for $1.8 billion bank fraud", "Unknown", 5000000, "Active", "https://example.com/nirav.jpg"))
-        
-        c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  ("Mehul Choksi", "Punjab National Bank Scam", "Wanted for bank fraud", "Antigua", 5000000, "Active", "https://example.com/mehul.jpg"))
-        
-        # Insert officials
-        c.execute("INSERT INTO officials (name, department, position, performance_score) VALUES (?, ?, ?, ?)",
-                  ("Rakesh Asthana", "Police", "Special Director", 85.5))
-        
-        c.execute("INSERT INTO officials (name, department, position, performance_score) VALUES (?, ?, ?, ?)",
-                  ("Alok Verma", "Passport Office", "Director", 78.2))
-        
-        # Insert community reports
-        c.execute("INSERT INTO community_reports (location, issue, severity, description, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                  ("Mumbai", "Bribe at RTO office", "High", "Officials asking for bribes to issue driving licenses", "Pending", datetime.now()))
-        
-        c.execute("INSERT INTO community_reports (location, issue, severity, description, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                  ("Delhi", "Harassment", "Medium", "Citizens being harassed by police for no reason", "Investigating", datetime.now()))
-        
-        # Insert feedback
-        c.execute("INSERT INTO feedback (service_name, rating, comments, anonymous, created_at) VALUES (?, ?, ?, ?, ?)",
-                  ("Passport Office", 2, "Very slow service, staff not helpful", 0, datetime.now()))
-        
-        c.execute("INSERT INTO feedback (service_name, rating, comments, anonymous, created_at) VALUES (?, ?, ?, ?, ?)",
-                  ("RTO", 4, "Process was smooth, but took longer than expected", 1, datetime.now()))
-        
+    conn = connect()
+    migrate(conn)
+    # Complaints are observed as they are filed; this catches up after loads
+    # that bypassed submit_complaint, so /api/anomalies can stay read-only
+    if anomalies.observe(conn):
         conn.commit()
-        conn.close()
-        print("Database created successfully!")
-    else:
-        # Check if the database has the correct schema
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Check if new tables exist
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='most_wanted'")
-        if not c.fetchone():
-            print("most_wanted table missing. Creating it...")
-            c.execute('''CREATE TABLE most_wanted
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          name TEXT,
-                          crime TEXT,
-                          description TEXT,
-                          last_seen TEXT,
-                          reward_amount INTEGER,
-                          status TEXT,
-                          image_url TEXT)''')
-            
-            # Insert most wanted criminals
-            c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                      ("Vijay Mallya", "Financial Fraud", "Wanted for bank fraud and money laundering", "London, UK", 5000000, "Active", "https://example.com/mallya.jpg"))
-            
-            c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                      ("Nirav Modi", "Punjab National Bank Scam", "Wanted for $1.8 billion bank fraud", "Unknown", 5000000, "Active", "https://example.com/nirav.jpg"))
-            
-            c.execute("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                      ("Mehul Choksi", "Punjab National Bank Scam", "Wanted for bank fraud", "Antigua", 5000000, "Active", "https://example.com/mehul.jpg"))
-            
-            conn.commit()
-            print("most_wanted table created successfully!")
-        
-        # Check if officials table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='officials'")
-        if not c.fetchone():
-            print("officials table missing. Creating it...")
-            c.execute('''CREATE TABLE officials
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          name TEXT,
-                          department TEXT,
-                          position TEXT,
-                          performance_score REAL)''')
-            
-            # Insert officials
-            c.execute("INSERT INTO officials (name, department, position, performance_score) VALUES (?, ?, ?, ?)",
-                      ("Rakesh Asthana", "CBI", "Special Director", 85.5))
-            
-            c.execute("INSERT INTO officials (name, department, position, performance_score) VALUES (?, ?, ?, ?)",
-                      ("Alok Verma", "CBI", "Director", 78.2))
-            
-            conn.commit()
-            print("officials table created successfully!")
-
-        # Check if community_reports table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='community_reports'")
-        if not c.fetchone():
-            print("community_reports table missing. Creating it...")
-            c.execute('''CREATE TABLE community_reports
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          location TEXT,
-                          issue TEXT,
-                          severity TEXT,
-                          description TEXT,
-                          status TEXT,
-                          created_at TIMESTAMP)''')
-            # Insert community reports
-            c.execute("INSERT INTO community_reports (location, issue, severity, description, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                      ("Mumbai", "Bribe at RTO office", "High", "Officials asking for bribes to issue driving licenses", "Pending", datetime.now()))
-            c.execute("INSERT INTO community_reports (location, issue, severity, description, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                      ("Delhi", "Harassment", "Medium", "Citizens being harassed by police for no reason", "Investigating", datetime.now()))
-            conn.commit()
-            print("community_reports table created successfully!")
-
-        # Check if feedback table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='feedback'")
-        if not c.fetchone():
-            print("feedback table missing. Creating it...")
-            c.execute('''CREATE TABLE feedback
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          service_name TEXT,
-                          rating INTEGER,
-                          comments TEXT,
-                          anonymous INTEGER,
-                          created_at TIMESTAMP)''')
-            conn.commit()
-            print("feedback table created successfully!")
-
-        # Check if evidence table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='evidence'")
-        if not c.fetchone():
-            print("evidence table missing. Creating it...")
-            c.execute('''CREATE TABLE evidence
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          complaint_id INTEGER,
-                          file_path TEXT,
-                          FOREIGN KEY(complaint_id) REFERENCES complaints(id))''')
-            conn.commit()
-            print("evidence table created successfully!")
-        
-        # Check if user_id column exists in complaints table
-        c.execute("PRAGMA table_info(complaints)")
-        # columns = [column<source_id data="1" title="N/A" /> for column in c.fetchall()]
-        columns = [column[1] for column in c.fetchall()]
-        
-        if 'department' not in columns:
-            print("Older schema detected. Upgrading database with new columns...")
-            if 'user_id' not in columns:
-                c.execute("ALTER TABLE complaints ADD COLUMN user_id INTEGER")
-                c.execute("ALTER TABLE complaints ADD COLUMN latitude REAL")
-                c.execute("ALTER TABLE complaints ADD COLUMN longitude REAL")
-            c.execute("ALTER TABLE complaints ADD COLUMN assigned_official_id INTEGER REFERENCES users(id)")
-            c.execute("ALTER TABLE complaints ADD COLUMN department TEXT")
-            c.execute("ALTER TABLE complaints ADD COLUMN satisfaction_rating INTEGER")
-            c.execute("UPDATE complaints SET department = 'Police' WHERE type = 'bribery'")
-            c.execute("UPDATE complaints SET department = 'Passport Office' WHERE type = 'delay'")
-            c.execute("UPDATE complaints SET department = 'Municipal Corporation' WHERE type = 'nepotism'")
-            c.execute("UPDATE complaints SET user_id = 1 WHERE user_id IS NULL")
-            conn.commit()
-            print("Database schema upgraded successfully!")
-
-        # Migration for user_tags table
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user_tags'")
-        if not c.fetchone():
-            print("user_tags table missing. Creating it...")
-            c.execute('''CREATE TABLE user_tags
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                          user_id INTEGER,
-                          tag_type TEXT,
-                          complaint_id INTEGER,
-                          created_at TIMESTAMP,
-                          FOREIGN KEY(user_id) REFERENCES users(id),
-                          FOREIGN KEY(complaint_id) REFERENCES complaints(id))''')
-            conn.commit()
-            print("user_tags table created successfully!")
+    conn.close()
+    evidence_store.ensure_dirs()
+
+    # Let readers proceed while a write is in progress
+    enable_wal()
 
-        
-        conn.close()
-        
 # PII Redaction function
+# All user-supplied free text (complaints, comments, bulk imports) goes through here.
+@metrics.timed('redact_pii')
 def redact_pii(text):
-    results = analyzer.analyze(text=text, language='en')
-    anonymized_text = anonymizer.anonymize(text=text, analyzer_results=results)
-    return anonymized_text.text
-
-def send_email(to_address, subject, body):
-    """Sends an email using SMTP (configured for Gmail)."""
-    from_address = os.environ.get("EMAIL_USER")
-    password = os.environ.get("EMAIL_PASSWORD")
-
-    if not from_address or not password:
-        print("WARNING: EMAIL_USER or EMAIL_PASSWORD not set in .env file. Skipping email.")
-        return
+    return redaction_service.redact(text)
 
-    msg = MIMEMultipart()
-    msg['From'] = from_address
-    msg['To'] = to_address
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(from_address, password)
-        text = msg.as_string()
-        server.sendmail(from_address, to_address, text)
-        server.quit()
-        print(f"Confirmation email sent successfully to {to_address}")
-    except Exception as e:
-        print(f"ERROR: Failed to send email. {e}")
+@metrics.timed('redact_pii_many')
+def redact_pii_many(texts):
+    return redaction_service.redact_many(texts)
 
 # Gemini Pro analysis function
+@metrics.timed('analyze_with_gemini')
 def analyze_with_gemini(text):
     try:
         prompt = f"""
@@ -389,42 +146,259 @@ def analyze_with_gemini(text):
         Complaint: {text}
         """
         
-        response = model.generate_content(prompt)
-        return response.text
+        return llm_cache.get_or_compute(GEMINI_MODEL_NAME, COMPLAINT_ANALYSIS_PROMPT_VERSION, text,
+                                        lambda: model.generate_content(prompt).text)
     except Exception as e:
         return f"Error analyzing with Gemini: {str(e)}"
 
-def analyze_systemic_flaws(complaints_json):
+class SystemicFlawAnalysisError(Exception):
+    """The model call failed; the message is shown to the user in place of the analysis."""
+
+@metrics.timed('analyze_systemic_flaws')
+def analyze_systemic_flaws(clusters_json):
     try:
         prompt = f"""
-        As a Systemic Flaw Analyst AI, your task is to identify root causes and process vulnerabilities from a list of corruption complaints.
-        Analyze the following JSON data of all complaints. Look for clusters of similar issues (e.g., same complaint type, same location, recurring keywords).
+        As a Systemic Flaw Analyst AI, your task is to identify root causes and process vulnerabilities from corruption complaints.
+        The complaints have already been grouped into clusters of similar wording. The following JSON describes each cluster:
+        its size, top terms, and the departments, complaint types and locations (rounded latitude/longitude) it covers.
         Based on these clusters, identify 1-3 potential systemic flaws.
         For each flaw, provide:
         1.  **Flaw Description:** A brief summary of the recurring problem.
-        2.  **Evidence:** Mention the complaint types or keywords that point to this flaw.
+        2.  **Evidence:** Mention the clusters, complaint types or keywords that point to this flaw.
         3.  **Policy Recommendation:** Suggest a concrete, actionable policy change to fix the vulnerability.
 
-        Complaints Data: {complaints_json}
+        Complaint Clusters: {clusters_json}
         """
-        response = model.generate_content(prompt)
-        return response.text
+        return llm_cache.get_or_compute(GEMINI_MODEL_NAME, SYSTEMIC_FLAWS_PROMPT_VERSION, clusters_json,
+                                        lambda: model.generate_content(prompt).text)
     except Exception as e:
-        return f"Error analyzing for systemic flaws with Gemini: {str(e)}"
+        raise SystemicFlawAnalysisError(f"Error analyzing for systemic flaws with Gemini: {str(e)}") from e
+
+# Map-reduce mode for complaint sets that don't fit in one prompt (see flaw_analysis.py)
+SYSTEMIC_FLAWS_CHUNK_CHARS = int(os.environ.get('SYSTEMIC_FLAWS_CHUNK_CHARS', 12000))
+SYSTEMIC_FLAWS_WINDOW_DAYS = int(os.environ.get('SYSTEMIC_FLAWS_WINDOW_DAYS', 30))
+SYSTEMIC_FLAWS_CONCURRENCY = int(os.environ.get('SYSTEMIC_FLAWS_CONCURRENCY', 4))
+
+def summarize_complaint_chunk(chunk):
+    # Cached by chunk text, so only partitions that changed are summarized again
+    prompt = f"""
+    You are helping a Systemic Flaw Analyst find recurring problems in corruption complaints.
+    Summarize the following complaint records (or summaries of earlier batches) in at most 10 bullet points.
+    Keep the department, complaint type and period, recurring keywords and locations, and roughly how many
+    complaints each point covers. Do not include names or other personal details.
+
+    {chunk}
+    """
+    return llm_cache.get_or_compute(GEMINI_MODEL_NAME, SYSTEMIC_FLAWS_CHUNK_PROMPT_VERSION, chunk,
+                                    lambda: model.generate_content(prompt).text)
+
+def reduce_flaw_summaries(summaries):
+    prompt = f"""
+    As a Systemic Flaw Analyst AI, your task is to identify root causes and process vulnerabilities from corruption complaints.
+    The complaints were grouped by department, complaint type and period, and each group was summarized below.
+    Look for issues that recur across groups (e.g., same complaint type, same location, recurring keywords).
+    Based on these, identify 1-3 potential systemic flaws.
+    For each flaw, provide:
+    1.  **Flaw Description:** A brief summary of the recurring problem.
+    2.  **Evidence:** Mention the departments, complaint types or keywords that point to this flaw.
+    3.  **Policy Recommendation:** Suggest a concrete, actionable policy change to fix the vulnerability.
+
+    Complaint Group Summaries:
+    {summaries}
+    """
+    return llm_cache.get_or_compute(GEMINI_MODEL_NAME, SYSTEMIC_FLAWS_REDUCE_PROMPT_VERSION, summaries,
+                                    lambda: model.generate_content(prompt).text)
+
+@metrics.timed('analyze_systemic_flaws_map_reduce')
+def analyze_systemic_flaws_map_reduce(complaints):
+    try:
+        chunks = flaw_analysis.chunks(complaints, SYSTEMIC_FLAWS_WINDOW_DAYS, SYSTEMIC_FLAWS_CHUNK_CHARS)
+        return flaw_analysis.map_reduce(chunks, summarize_complaint_chunk, reduce_flaw_summaries,
+                                        SYSTEMIC_FLAWS_CHUNK_CHARS, SYSTEMIC_FLAWS_CONCURRENCY)
+    except Exception as e:
+        raise SystemicFlawAnalysisError(f"Error analyzing for systemic flaws with Gemini: {str(e)}") from e
+
+# Complaint processing pipeline
+# Each stage runs on a worker thread and hands the complaint on to the next one:
+# redact -> analyze -> fir_draft -> notify.
+pipeline_queue = JobQueue(connect)
+
+def redact_stage(c, payload):
+    redacted_description = redact_pii(payload['description'])
+    c.execute("UPDATE complaints SET description = ?, processing_status = ? WHERE id = ?",
+              (redacted_description, 'analyzing', payload['complaint_id']))
+    return [('complaint.analyze', {'complaint_id': payload['complaint_id']})]
+
+def analyze_stage(c, payload):
+    c.execute('SELECT description FROM complaints WHERE id = ?', (payload['complaint_id'],))
+    analysis = analyze_with_gemini(c.fetchone()['description'])
+    c.execute("UPDATE complaints SET analysis = ?, processing_status = ? WHERE id = ?",
+              (analysis, 'drafting', payload['complaint_id']))
+    return [('complaint.fir_draft', {'complaint_id': payload['complaint_id']})]
+
+def fir_draft_stage(c, payload):
+    c.execute('SELECT type, description, analysis FROM complaints WHERE id = ?', (payload['complaint_id'],))
+    complaint = c.fetchone()
+    # Generate mock FIR draft
+    fir_draft = f"""
+    FIR DRAFT
+    
+    Complaint Type: {complaint['type']}
+    Description: {complaint['description']}
+    
+    Analysis: {complaint['analysis']}
+    
+    This is an auto-generated FIR draft based on the complaint submitted.
+    """
+    c.execute("UPDATE complaints SET fir_draft = ?, processing_status = ? WHERE id = ?",
+              (fir_draft, 'ready', payload['complaint_id']))
+    return [('complaint.notify', {'complaint_id': payload['complaint_id']})]
+
+def notify_stage(c, payload):
+    complaint_id = payload['complaint_id']
+    # Fetch user's email to send confirmation
+    c.execute('''SELECT u.email, c.fir_draft FROM complaints c
+                 JOIN users u ON c.user_id = u.id WHERE c.id = ?''', (complaint_id,))
+    user_record = c.fetchone()
+    if user_record:
+        user_email = user_record['email']
+        email_subject = f"Complaint Registered Successfully (ID: {complaint_id})"
+        email_body = f"""
+Dear Citizen,
+
+Thank you for submitting your complaint. It has been registered with the ID: {complaint_id}.
+
+Please find a copy of the auto-generated preliminary FIR draft below for your records.
+--------------------------------------------------
+{user_record['fir_draft']}
+--------------------------------------------------
+
+We will keep you updated on the progress.
+
+Regards,
+Bhrashtachar Mukt Team
+"""
+        # The confirmation was held in the outbox when the complaint was inserted
+        if not outbox.release(c, complaint_id, email_subject, email_body):
+            outbox.enqueue(c, user_email, email_subject, email_body, complaint_id)
+
+def derive_evidence_stage(c, payload):
+    blob = c.execute('SELECT content_type FROM evidence_blobs WHERE sha256 = ?', (payload['sha256'],)).fetchone()
+    if blob is None:
+        # Collected after every referencing row was deleted
+        return []
+    # Rendering happens before the first write, so the write lock is held only for the UPDATE
+    result = derivatives.derive(UPLOAD_FOLDER, payload['sha256'], blob['content_type'])
+    derivatives.record(c, payload['sha256'], result)
+    return []
+
+pipeline_handlers = {
+    'complaint.redact': redact_stage,
+    'complaint.analyze': analyze_stage,
+    'complaint.fir_draft': fir_draft_stage,
+    'complaint.notify': notify_stage,
+    'evidence.derive': derive_evidence_stage,
+}
+
+# Emails are written to the outbox by routes and stages and sent by one background
+# sender over a reused SMTP session. SMTP_HOST/SMTP_PORT can point at a local
+# stand-in (e.g. aiosmtpd with SMTP_STARTTLS=0) for testing.
+email_sender = outbox.OutboxSender(
+    connect,
+    host=os.environ.get('SMTP_HOST', 'smtp.gmail.com'),
+    port=int(os.environ.get('SMTP_PORT', 587)),
+    username=os.environ.get('EMAIL_USER'),
+    password=os.environ.get('EMAIL_PASSWORD'),
+    from_address=os.environ.get('EMAIL_FROM') or os.environ.get('EMAIL_USER') or 'no-reply@localhost',
+    starttls=os.environ.get('SMTP_STARTTLS', '1') != '0',
+    batch_size=int(os.environ.get('EMAIL_BATCH_SIZE', 50)),
+    max_attempts=int(os.environ.get('EMAIL_MAX_ATTEMPTS', 6)),
+    backoff_seconds=float(os.environ.get('EMAIL_BACKOFF_SECONDS', 30)))
+
+def start_email_sender():
+    if not os.environ.get('SMTP_HOST') and not (os.environ.get('EMAIL_USER') and os.environ.get('EMAIL_PASSWORD')):
+        print("WARNING: EMAIL_USER or EMAIL_PASSWORD not set in .env file. Emails stay queued in the outbox.")
+        return None
+    email_sender.start()
+    return email_sender
+
+def start_pipeline_workers():
+    workers = WorkerPool(pipeline_queue, pipeline_handlers, size=int(os.environ.get('PIPELINE_WORKERS', 2)))
+    workers.start()
+    return workers
+
+def warm_analytics():
+    """Loads the analytics column store so the first analytics request doesn't pay for it."""
+    with get_db() as conn:
+        analytics.refresh(conn)
+
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background_work():
+    """Starts the pipeline workers, email sender and analytics warm-up once per process."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    start_pipeline_workers()
+    start_email_sender()
+    threading.Thread(target=warm_analytics, daemon=True).start()
+
+# Each serving process (the reloader child, or every gunicorn/uWSGI worker after
+# the fork) starts its own workers on its first request. Set BACKGROUND_WORKERS=0
+# when a separate `python worker.py` process does the background work instead.
+if os.environ.get('BACKGROUND_WORKERS', '1') != '0':
+    app.before_request(start_background_work)
 
 # Routes
+@app.errorhandler(BadQueryParameter)
+def bad_query_parameter(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': e.description}), 413
+
+def save_evidence(c, complaint_id):
+    """Records every uploaded 'evidence' file against the complaint.
+
+    Blobs without thumbnails or metadata yet get an evidence.derive job.
+    Returns True if any job was queued.
+    """
+    queued = set()
+    for file in request.files.getlist('evidence'):
+        if file:
+            evidence_id, sha256 = evidence_store.save(c, complaint_id, file)
+            if not derivatives.reuse(c, evidence_id, sha256) and sha256 not in queued:
+                enqueue(c, 'evidence.derive', {'sha256': sha256})
+                queued.add(sha256)
+    return bool(queued)
+
+def evidence_item(row):
+    """An evidence row with URLs for the original and its derivatives."""
+    item = dict(row)
+    item['url'] = f"/uploads/{row['file_path']}"
+    item['thumbnail_url'] = f"/uploads/{row['thumbnail_path']}" if row['thumbnail_path'] else None
+    item['preview_url'] = f"/uploads/{row['preview_path']}" if row['preview_path'] else None
+    item['metadata'] = json.loads(row['metadata']) if row['metadata'] else None
+    return item
+
+# Filters accepted by the complaint list endpoints, mapped to their columns
+COMPLAINT_FILTERS = {'status': 'status', 'department': 'department', 'type': 'type'}
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     email = data.get('email')
     password = data.get('password')
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM users WHERE email = ? AND password = ?', (email, password))
-    user = c.fetchone()
-    conn.close()
+        c.execute('SELECT * FROM users WHERE email = ? AND password = ?', (email, password))
+        user = c.fetchone()
     
     if user:
         return jsonify({
@@ -439,73 +413,69 @@ def login():
 @app.route('/api/user/complaints', methods=['GET'])
 def get_user_complaints():
     user_id = request.args.get('user_id')
+    where, params = filter_clauses(request.args, COMPLAINT_FILTERS, 'created_at')
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM complaints WHERE user_id = ?', (user_id,))
-    complaints = c.fetchall()
-    conn.close()
+        complaints, next_cursor = fetch_page(c, 'SELECT * FROM complaints', ['user_id = ?'] + where, [user_id] + params,
+                                             ('created_at', 'id'), request.args)
     
-    return jsonify([dict(complaint) for complaint in complaints])
+    return page_response(complaints, next_cursor)
 
 @app.route('/api/police/complaints', methods=['GET'])
 def get_police_complaints():
-    conn = get_db_connection()
-    c = conn.cursor()
+    where, params = filter_clauses(request.args, {name: f'c.{column}' for name, column in COMPLAINT_FILTERS.items()},
+                                   'c.created_at')
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT c.*, u.name as user_name FROM complaints c JOIN users u ON c.user_id = u.id')
-    complaints = c.fetchall()
-    conn.close()
+        complaints, next_cursor = fetch_page(c, 'SELECT c.*, u.name as user_name FROM complaints c JOIN users u ON c.user_id = u.id',
+                                             where, params, ('c.created_at', 'c.id'), request.args)
     
-    return jsonify([dict(complaint) for complaint in complaints])
+    return page_response(complaints, next_cursor)
 
 @app.route('/api/police/complaints/<int:complaint_id>/comment', methods=['POST'])
 def add_comment(complaint_id):
     # Handle multipart form data to allow file uploads with comments
     user_id = request.form.get('user_id')
-    comment_text = request.form.get('comment')
+    comment_text = redact_pii(request.form.get('comment'))
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('''INSERT INTO comments (complaint_id, user_id, comment, timestamp)
-                 VALUES (?, ?, ?, ?)''',
-              (complaint_id, user_id, comment_text, datetime.now()))
+        c.execute('''INSERT INTO comments (complaint_id, user_id, comment, timestamp)
+                     VALUES (?, ?, ?, ?)''',
+                  (complaint_id, user_id, comment_text, datetime.now()))
     
-    # On first official comment, assign the official and their department to the complaint
-    c.execute('SELECT assigned_official_id FROM complaints WHERE id = ?', (complaint_id,))
-    if c.fetchone()['assigned_official_id'] is None:
-        # This is a simplification. In a real app, you'd look up the user's department.
-        # For now, we'll derive it from the complaint type as a fallback.
-        c.execute('SELECT type FROM complaints WHERE id = ?', (complaint_id,))
-        complaint_type = c.fetchone()['type']
-        department_map = {'bribery': 'Police', 'harassment': 'Police', 'delay': 'Passport Office', 'nepotism': 'Municipal Corporation', 'embezzlement': 'Finance Ministry'}
-        department = department_map.get(complaint_type, 'General Administration')
+        # On first official comment, assign the official and their department to the complaint
+        c.execute('SELECT assigned_official_id FROM complaints WHERE id = ?', (complaint_id,))
+        if c.fetchone()['assigned_official_id'] is None:
+            # This is a simplification. In a real app, you'd look up the user's department.
+            # For now, we'll derive it from the complaint type as a fallback.
+            c.execute('SELECT type FROM complaints WHERE id = ?', (complaint_id,))
+            complaint_type = c.fetchone()['type']
+            department_map = {'bribery': 'Police', 'harassment': 'Police', 'delay': 'Passport Office', 'nepotism': 'Municipal Corporation', 'embezzlement': 'Finance Ministry'}
+            department = department_map.get(complaint_type, 'General Administration')
 
-        # **Corruption Tagging Logic**
-        # If the complaint is about bribery, tag the assigned officer.
-        if complaint_type == 'bribery':
-            c.execute("INSERT INTO user_tags (user_id, tag_type, complaint_id, created_at) VALUES (?, ?, ?, ?)",
-                      (user_id, 'bribery_complaint', complaint_id, datetime.now()))
+            # **Corruption Tagging Logic**
+            # If the complaint is about bribery, tag the assigned officer.
+            if complaint_type == 'bribery':
+                c.execute("INSERT INTO user_tags (user_id, tag_type, complaint_id, created_at) VALUES (?, ?, ?, ?)",
+                          (user_id, 'bribery_complaint', complaint_id, datetime.now()))
 
-        c.execute('UPDATE complaints SET assigned_official_id = ?, department = ? WHERE id = ?', (user_id, department, complaint_id))
+            c.execute('UPDATE complaints SET assigned_official_id = ?, department = ? WHERE id = ?', (user_id, department, complaint_id))
     
-    # Update complaint status to "In Progress"
-    c.execute('UPDATE complaints SET status = ? WHERE id = ?', ('In Progress', complaint_id))
+        # Update complaint status to "In Progress"
+        c.execute('UPDATE complaints SET status = ?, updated_at = ? WHERE id = ?',
+                  ('In Progress', datetime.now(), complaint_id))
     
-    # Handle file uploads for evidence
-    files = request.files.getlist('evidence')
-    for file in files:
-        if file:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            # Store just the filename in the evidence table
-            c.execute("INSERT INTO evidence (complaint_id, file_path) VALUES (?, ?)", (complaint_id, filename))
+        # Handle file uploads for evidence
+        derive_queued = save_evidence(c, complaint_id)
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    if derive_queued:
+        pipeline_queue.wakeup()
     
     return jsonify({'success': True})
 
@@ -513,67 +483,59 @@ def add_comment(complaint_id):
 def close_complaint(complaint_id):
     # Handle multipart form data to allow file uploads with the closing statement
     user_id = request.form.get('user_id')
-    resolution = request.form.get('resolution')
+    resolution = redact_pii(request.form.get('resolution'))
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    # Add resolution as a comment
-    c.execute('''INSERT INTO comments (complaint_id, user_id, comment, timestamp)
-                 VALUES (?, ?, ?, ?)''',
-              (complaint_id, user_id, f"RESOLUTION: {resolution}", datetime.now()))
+        # Add resolution as a comment
+        c.execute('''INSERT INTO comments (complaint_id, user_id, comment, timestamp)
+                     VALUES (?, ?, ?, ?)''',
+                  (complaint_id, user_id, f"RESOLUTION: {resolution}", datetime.now()))
     
-    # Update complaint status to "Resolved"
-    c.execute('UPDATE complaints SET status = ? WHERE id = ?', ('Resolved', complaint_id))
+        # Update complaint status to "Resolved"
+        c.execute('UPDATE complaints SET status = ?, updated_at = ? WHERE id = ?',
+                  ('Resolved', datetime.now(), complaint_id))
     
-    # Handle final evidence file uploads
-    files = request.files.getlist('evidence')
-    for file in files:
-        if file:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            # Store just the filename in the evidence table
-            c.execute("INSERT INTO evidence (complaint_id, file_path) VALUES (?, ?)", (complaint_id, filename))
+        # Handle final evidence file uploads
+        derive_queued = save_evidence(c, complaint_id)
     
-    conn.commit()
-    conn.close()
+        conn.commit()
+    if derive_queued:
+        pipeline_queue.wakeup()
     
     return jsonify({'success': True})
 
 @app.route('/api/complaints/<int:complaint_id>/comments', methods=['GET'])
 def get_comments(complaint_id):
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('''SELECT c.*, u.name, u.role FROM comments c 
-                 JOIN users u ON c.user_id = u.id 
-                 WHERE c.complaint_id = ?
-                 ORDER BY c.timestamp''', (complaint_id,))
-    comments = c.fetchall()
-    conn.close()
+        c.execute('''SELECT c.*, u.name, u.role FROM comments c 
+                     JOIN users u ON c.user_id = u.id 
+                     WHERE c.complaint_id = ?
+                     ORDER BY c.timestamp''', (complaint_id,))
+        comments = c.fetchall()
     
     return jsonify([dict(comment) for comment in comments])
 
 @app.route('/api/complaints/<int:complaint_id>/evidence', methods=['GET'])
 def get_evidence(complaint_id):
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM evidence WHERE complaint_id = ?', (complaint_id,))
-    evidence_files = c.fetchall()
-    conn.close()
+        c.execute('SELECT * FROM evidence WHERE complaint_id = ?', (complaint_id,))
+        evidence_files = c.fetchall()
     
-    return jsonify([dict(file) for file in evidence_files])
+    return jsonify([evidence_item(file) for file in evidence_files])
 
 @app.route('/api/users/<int:user_id>/tags', methods=['GET'])
 def get_user_tags(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT tag_type, COUNT(*) as count FROM user_tags WHERE user_id = ? GROUP BY tag_type', (user_id,))
-    tags = c.fetchall()
-    conn.close()
+        c.execute('SELECT tag_type, COUNT(*) as count FROM user_tags WHERE user_id = ? GROUP BY tag_type', (user_id,))
+        tags = c.fetchall()
     return jsonify([dict(tag) for tag in tags])
 
 @app.route('/api/complaints/<int:complaint_id>/rate', methods=['POST'])
@@ -585,20 +547,40 @@ def rate_complaint(complaint_id):
     if not (1 <= rating <= 5):
         return jsonify({'error': 'Rating must be between 1 and 5'}), 400
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE complaints SET satisfaction_rating = ? WHERE id = ? AND status = "Resolved"', (rating, complaint_id))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE complaints SET satisfaction_rating = ? WHERE id = ? AND status = "Resolved"', (rating, complaint_id))
+        conn.commit()
     return jsonify({'success': True})
 
 # Route to serve uploaded files
-@app.route('/uploads/<filename>')
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     # Ensure that the path is safe
     if '..' in filename or filename.startswith('/'):
         return "Invalid path", 400
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    blob_path = parse_blob_path(filename)
+    if blob_path is None:
+        # Staging files and malformed blob paths are never served
+        if filename.split('/', 1)[0] in ('objects', 'tmp'):
+            return jsonify({'error': 'Evidence not found'}), 404
+        # Uploads from before the content-addressed store are served by file name
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+
+    sha256, derivative = blob_path
+    response = evidence_store.not_modified(sha256, derivative)
+    if response is not None:
+        return response
+    with get_db() as conn:
+        blob = conn.execute('SELECT content_type FROM evidence_blobs WHERE sha256 = ?', (sha256,)).fetchone()
+    if blob is None:
+        return jsonify({'error': 'Evidence not found'}), 404
+    try:
+        return evidence_store.send(sha256, blob['content_type'], derivative)
+    except FileNotFoundError:
+        if derivative is None:
+            print(f"ERROR: evidence blob {sha256} is recorded but missing from disk")
+        return jsonify({'error': 'Evidence not found'}), 404
 
 @app.route('/api/complaints', methods=['POST'])
 def submit_complaint():
@@ -606,88 +588,57 @@ def submit_complaint():
     complaint_type = request.form.get('type')
     description = request.form.get('description')
     user_id = request.form.get('user_id')
-    latitude = request.form.get('latitude')
-    longitude = request.form.get('longitude')
-    
-    # Redact PII
-    redacted_description = redact_pii(description)
-    
-    # Analyze with Gemini Pro
-    analysis = analyze_with_gemini(redacted_description)
-    
-    # Generate mock FIR draft
-    fir_draft = f"""
-    FIR DRAFT
+    # A blank coordinate means none was given; anything else must be a number
+    latitude = parse_number(request.form, 'latitude', None, -90, 90, float)
+    longitude = parse_number(request.form, 'longitude', None, -180, 180, float)
     
-    Complaint Type: {complaint_type}
-    Description: {redacted_description}
-    
-    Analysis: {analysis}
-    
-    This is an auto-generated FIR draft based on the complaint submitted.
-    """
-    
-    # Store in database
-    conn = get_db_connection()
-    c = conn.cursor()
-    # Assign a default department based on type
-    department_map = {'bribery': 'Police', 'harassment': 'Police', 'delay': 'Passport Office', 'nepotism': 'Municipal Corporation', 'embezzlement': 'Finance Ministry'}
-    department = department_map.get(complaint_type, 'General Administration')
-    c.execute('''INSERT INTO complaints (type, description, status, created_at, updated_at, user_id, latitude, longitude, department)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (complaint_type, redacted_description, 'Submitted', datetime.now(), datetime.now(), user_id, latitude, longitude, department))
-    complaint_id = c.lastrowid
-
-    # Handle file uploads
-    files = request.files.getlist('evidence')
-    for file in files:
-        if file:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            # Store just the filename in the new evidence table
-            c.execute("INSERT INTO evidence (complaint_id, file_path) VALUES (?, ?)", (complaint_id, filename))
-
-    # Fetch user's email to send confirmation
-    c.execute('SELECT email FROM users WHERE id = ?', (user_id,))
-    user_record = c.fetchone()
-    if user_record:
-        user_email = user_record['email']
-        email_subject = f"Complaint Registered Successfully (ID: {complaint_id})"
-        email_body = f"""
-Dear Citizen,
-
-Thank you for submitting your complaint. It has been registered with the ID: {complaint_id}.
+    # Store in database; redaction, analysis, the FIR draft and the confirmation
+    # email are handled by the pipeline workers once the complaint is queued.
+    with get_db() as conn:
+        c = conn.cursor()
+        # Assign a default department based on type
+        department_map = {'bribery': 'Police', 'harassment': 'Police', 'delay': 'Passport Office', 'nepotism': 'Municipal Corporation', 'embezzlement': 'Finance Ministry'}
+        department = department_map.get(complaint_type, 'General Administration')
+        # The description is only written back once it has been redacted
+        c.execute('''INSERT INTO complaints (type, description, status, created_at, updated_at, user_id, latitude, longitude, department, processing_status)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (complaint_type, None, 'Submitted', datetime.now(), datetime.now(), user_id, latitude, longitude, department, 'queued'))
+        complaint_id = c.lastrowid
+        anomalies.observe(c)
 
-Please find a copy of the auto-generated preliminary FIR draft below for your records.
---------------------------------------------------
-{fir_draft}
---------------------------------------------------
+        # Handle file uploads
+        save_evidence(c, complaint_id)
 
-We will keep you updated on the progress.
+        enqueue(c, 'complaint.redact', {'complaint_id': complaint_id, 'description': description})
+        outbox.hold(c, complaint_id, user_id)
 
-Regards,
-Bhrashtachar Mukt Team
-"""
-        send_email(user_email, email_subject, email_body)
-
-    conn.commit()
-    conn.close()
+        conn.commit()
+    pipeline_queue.wakeup()
     
     return jsonify({
         'id': complaint_id,
         'status': 'Submitted',
-        'analysis': analysis,
-        'fir_draft': fir_draft
-    }), 201
+        'processing_status': 'queued',
+        'status_url': f'/api/complaints/{complaint_id}/status'
+    }), 202
+
+@app.route('/api/complaints/<int:complaint_id>/status', methods=['GET'])
+def get_complaint_status(complaint_id):
+    with get_db() as conn:
+        c = conn.cursor()
+        c.execute('SELECT id, status, processing_status, analysis, fir_draft FROM complaints WHERE id = ?', (complaint_id,))
+        complaint = c.fetchone()
+
+    if complaint:
+        return jsonify(dict(complaint))
+    return jsonify({'error': 'Complaint not found'}), 404
     
 @app.route('/api/complaints/<int:complaint_id>', methods=['GET'])
 def get_complaint(complaint_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM complaints WHERE id = ?', (complaint_id,))
-    complaint = c.fetchone()
-    conn.close()
+    with get_db() as conn:
+        c = conn.cursor()
+        c.execute('SELECT * FROM complaints WHERE id = ?', (complaint_id,))
+        complaint = c.fetchone()
     
     if complaint:
         return jsonify({
@@ -701,71 +652,33 @@ def get_complaint(complaint_id):
     return jsonify({'error': 'Complaint not found'}), 404
 
 @app.route('/api/dashboard', methods=['GET'])
+@response_cache.cached('complaints', 'rewards', 'most_wanted', 'community_reports', 'feedback')
 def get_dashboard():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Get statistics
-    c.execute('SELECT COUNT(*) FROM complaints')
-    total_complaints = c.fetchone()[0]
-    
-    c.execute("SELECT COUNT(*) FROM complaints WHERE status = 'Resolved'")
-    resolved_complaints = c.fetchone()[0]
-    
-    c.execute("SELECT COUNT(*) FROM complaints WHERE status = 'In Progress'")
-    in_progress_complaints = c.fetchone()[0]
-    
-    c.execute("SELECT COUNT(*) FROM complaints WHERE status = 'Submitted'")
-    submitted_complaints = c.fetchone()[0]
-    
-    c.execute('SELECT SUM(amount) FROM rewards WHERE status = "Distributed"')
-    rewards_distributed = c.fetchone()[0] or 0
-    
-    # Get most wanted count
-    c.execute('SELECT COUNT(*) FROM most_wanted WHERE status = "Active"')
-    most_wanted_count = c.fetchone()[0]
-    
-    # Get community reports count
-    c.execute('SELECT COUNT(*) FROM community_reports WHERE status = "Pending"')
-    pending_reports = c.fetchone()[0]
-    
-    # Get average feedback rating
-    c.execute('SELECT AVG(rating) FROM feedback')
-    avg_rating = c.fetchone()[0] or 0
-    
-    conn.close()
-    
+    # One row kept current by triggers; see counters.py
+    with get_db() as conn:
+        totals = counters.read(conn)
+
+    feedback_count = totals['feedback_count']
+    avg_rating = totals['feedback_rating_sum'] / feedback_count if feedback_count else 0
     return jsonify({
-        'total_complaints': total_complaints,
-        'resolved_complaints': resolved_complaints,
-        'in_progress_complaints': in_progress_complaints,
-        'submitted_complaints': submitted_complaints,
-        'rewards_distributed': rewards_distributed,
-        'most_wanted_count': most_wanted_count,
-        'pending_reports': pending_reports,
+        'total_complaints': totals['total_complaints'],
+        'resolved_complaints': totals['resolved_complaints'],
+        'in_progress_complaints': totals['in_progress_complaints'],
+        'submitted_complaints': totals['submitted_complaints'],
+        'rewards_distributed': totals['rewards_distributed'],
+        'most_wanted_count': totals['most_wanted_count'],
+        'pending_reports': totals['pending_reports'],
         'avg_rating': round(avg_rating, 1)
     })
 
 @app.route('/api/integrity-index', methods=['GET'])
+@response_cache.cached('complaints', 'feedback', 'officials')
 def get_integrity_index():
-    conn = get_db_connection()
-    c = conn.cursor()
-
-    # Calculate scores per department
-    c.execute('''
-        SELECT
-            department,
-            COUNT(*) as total_complaints,
-            SUM(CASE WHEN status = 'Resolved' THEN 1 ELSE 0 END) as resolved_complaints,
-            AVG(satisfaction_rating) as avg_satisfaction
-        FROM complaints
-        WHERE department IS NOT NULL
-        GROUP BY department
-    ''')
-    
+    with get_db() as conn:
+        departments = analytics.department_summary(conn)
+
     index_data = []
-    for row in c.fetchall():
-        department_stats = dict(row)
+    for department_stats in departments:
         total = department_stats['total_complaints']
         resolved = department_stats['resolved_complaints']
         satisfaction = department_stats['avg_satisfaction'] or 0 # Default to 0 if no ratings
@@ -775,11 +688,10 @@ def get_integrity_index():
         satisfaction_score = (satisfaction / 5 * 100) # Scale 1-5 rating to 0-100
 
         integrity_score = (resolution_score * 0.5) + (satisfaction_score * 0.5)
-        
+
         department_stats['integrity_score'] = round(integrity_score, 1)
         index_data.append(department_stats)
 
-    conn.close()
     # Sort by highest score
     sorted_index = sorted(index_data, key=lambda x: x['integrity_score'], reverse=True)
     return jsonify(sorted_index)
@@ -790,14 +702,13 @@ def create_reward():
     complaint_id = data.get('complaint_id')
     amount = data.get('amount')
     
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''INSERT INTO rewards (complaint_id, amount, status)
-                 VALUES (?, ?, ?)''',
-              (complaint_id, amount, 'Pending'))
-    reward_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO rewards (complaint_id, amount, status)
+                     VALUES (?, ?, ?)''',
+                  (complaint_id, amount, 'Pending'))
+        reward_id = c.lastrowid
+        conn.commit()
     
     return jsonify({
         'id': reward_id,
@@ -809,20 +720,13 @@ def create_reward():
 # 1. Advanced AI-Powered Features
 
 @app.route('/api/risk-analysis', methods=['GET'])
+@response_cache.cached('complaints')
 def get_risk_analysis():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Calculate risk scores by department/type
-    c.execute('''SELECT type, 
-                 COUNT(*) as total,
-                 SUM(CASE WHEN status = "Resolved" THEN 1 ELSE 0 END) as resolved
-                 FROM complaints 
-                 GROUP BY type''')
-    
+    with get_db() as conn:
+        types = analytics.type_summary(conn)
+
     risk_data = []
-    for row in c.fetchall():
-        type_name, total, resolved = row
+    for type_name, total, resolved in types:
         risk_score = 100 - (resolved / total * 100) if total > 0 else 0
         risk_data.append({
             'type': type_name,
@@ -830,121 +734,211 @@ def get_risk_analysis():
             'resolved': resolved,
             'risk_score': round(risk_score, 2)
         })
-    
-    conn.close()
+
     return jsonify(risk_data)
 
+def parse_number(args, name, default, low, high, kind=int):
+    if not args.get(name):
+        return default
+    try:
+        value = kind(args[name])
+    except ValueError:
+        raise BadQueryParameter(f'{name} must be a number')
+    if not low <= value <= high:
+        raise BadQueryParameter(f'{name} must be between {low} and {high}')
+    return value
+
 @app.route('/api/anomalies', methods=['GET'])
+@response_cache.cached('complaints', clock=60)
 def detect_anomalies():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Detect unusual patterns (e.g., sudden spike in complaints)
-    c.execute('''SELECT DATE(created_at) as date, COUNT(*) as count 
-                 FROM complaints 
-                 WHERE created_at >= date('now', '-30 days')
-                 GROUP BY DATE(created_at)
-                 ORDER BY date''')
-    
-    daily_counts = c.fetchall()
-    
-    # Calculate average and standard deviation
-    counts = [count for _, count in daily_counts]
-    avg_count = sum(counts) / len(counts) if counts else 0
-    
-    # Flag days with unusually high complaints
-    anomalies = []
-    for date, count in daily_counts:
-        if count > avg_count * 1.5:  # 50% above average
-            anomalies.append({
-                'date': date,
-                'count': count,
-                'severity': 'High' if count > avg_count * 2 else 'Medium'
-            })
-    
-    conn.close()
-    return jsonify(anomalies)
+    # Per department, type and geohash cell, ranked by how far the latest day's
+    # count is above the series' running average; see anomalies.py
+    days = parse_number(request.args, 'days', 30, 1, 365)
+    min_z = parse_number(request.args, 'min_z', 3.0, 0.0, 100.0, float)
+    limit = parse_number(request.args, 'limit', 50, 1, 500)
+    with get_db() as conn:
+        return jsonify(anomalies.detect(conn, days, min_z, limit))
+
+def cluster_input(args, columns):
+    """Redacted complaints matching the list filters in ``args``, oldest first."""
+    where, params = filter_clauses(args, COMPLAINT_FILTERS, 'created_at')
+    where.append('description IS NOT NULL')
+    with get_db() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {columns} FROM complaints WHERE {' AND '.join(where)} ORDER BY created_at, id", params)
+        return [dict(row) for row in c.fetchall()]
+
+def parse_cluster_count(args):
+    if not args.get('k'):
+        return None
+    try:
+        k = int(args['k'])
+    except ValueError:
+        raise BadQueryParameter('k must be an integer')
+    if not 1 <= k <= clustering.MAX_CLUSTERS:
+        raise BadQueryParameter(f'k must be between 1 and {clustering.MAX_CLUSTERS}')
+    return k
+
+@app.route('/api/complaint-clusters', methods=['GET'])
+@response_cache.cached('complaints')
+def get_complaint_clusters():
+    complaints = cluster_input(request.args, 'id, type, department, latitude, longitude, description')
+    clusters, unclustered = clustering.cluster_complaints(complaints, parse_cluster_count(request.args))
+    return jsonify({'clusters': clusters, 'complaints': len(complaints), 'unclustered': unclustered})
 
 @app.route('/api/systemic-flaw-analysis', methods=['GET'])
+@response_cache.cached('complaints')
 def get_systemic_flaw_analysis():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT type, description, status, department FROM complaints')
-    complaints = [dict(row) for row in c.fetchall()]
-    conn.close()
-
-    complaints_json = json.dumps(complaints, indent=2)
-    analysis = analyze_systemic_flaws(complaints_json)
-    return jsonify({'analysis': analysis})
+    # mode=clusters (the default) sends the model local cluster summaries only;
+    # mode=map-reduce has it summarize the complaint text partition by partition.
+    mode = request.args.get('mode', 'clusters')
+    if mode not in ('clusters', 'map-reduce'):
+        raise BadQueryParameter('mode must be clusters or map-reduce')
+    try:
+        if mode == 'map-reduce':
+            complaints = cluster_input(request.args, 'id, type, description, status, department, created_at')
+            return jsonify({'analysis': analyze_systemic_flaws_map_reduce(complaints), 'mode': mode})
+
+        complaints = cluster_input(request.args, 'id, type, department, latitude, longitude, description')
+        clusters, _ = clustering.cluster_complaints(complaints, parse_cluster_count(request.args))
+        clusters_json = json.dumps([{key: value for key, value in cluster.items() if key != 'complaint_ids'}
+                                    for cluster in clusters], separators=(',', ':'))
+        return jsonify({'analysis': analyze_systemic_flaws(clusters_json), 'mode': mode, 'clusters': len(clusters)})
+    except SystemicFlawAnalysisError as e:
+        # Shown like an analysis, as before, but not cached: the next request tries the model again
+        response = jsonify({'analysis': str(e), 'mode': mode})
+        response.cache_control.no_store = True
+        return response
+
+@app.route('/api/llm-cache/stats', methods=['GET'])
+def get_llm_cache_stats():
+    return jsonify(llm_cache.stats())
+
+@app.route('/api/response-cache/stats', methods=['GET'])
+def get_response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/email-outbox/stats', methods=['GET'])
+def get_email_outbox_stats():
+    with get_db() as conn:
+        depth = outbox.depth(conn)
+        oldest = outbox.oldest_queued_age(conn)
+    return jsonify({'depth': depth, 'oldest_queued_seconds': oldest, 'sender': email_sender.stats()})
+
+@app.route('/api/query-log/report', methods=['GET'])
+def get_query_log_report():
+    return jsonify(query_log.LOG.report())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/search', methods=['GET'])
+@response_cache.cached('complaints', 'comments', 'community_reports')
+def search_text():
+    # q supports "phrases", prefix* and -excluded words; type, department and status filter hits
+    with get_db() as conn:
+        items, next_cursor = search.search(conn, request.args)
+    return page_response(items, next_cursor)
+
+@app.route('/api/search/facets', methods=['GET'])
+@response_cache.cached('complaints', 'comments', 'community_reports')
+def search_facets():
+    with get_db() as conn:
+        return jsonify(search.facets(conn, request.args))
 
 # 2. Enhanced Reporting and Analytics
 
 @app.route('/api/complaints-by-type', methods=['GET'])
+@response_cache.cached('complaints')
 def get_complaints_by_type():
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('''SELECT type, COUNT(*) as count 
-                 FROM complaints 
-                 GROUP BY type
-                 ORDER BY count DESC''')
+        c.execute('''SELECT type, COUNT(*) as count 
+                     FROM complaints 
+                     GROUP BY type
+                     ORDER BY count DESC''')
     
-    data = {
-        'labels': [row[0] for row in c.fetchall()],
-        'data': [row[1] for row in c.fetchall()]
-    }
+        data = {
+            'labels': [row[0] for row in c.fetchall()],
+            'data': [row[1] for row in c.fetchall()]
+        }
     
-    conn.close()
     return jsonify(data)
 
+def average_days(resolved, days):
+    return round(days / resolved, 1) if resolved else None
+
+def rollup_chart(args, value):
+    """Chart data for one rollup value per bucket, with a series per group when grouped."""
+    granularity, labels, group_by = rollups.parse_range(args)
+    with get_db() as conn:
+        groups = rollups.series(conn, granularity, labels, group_by)
+
+    def points(buckets):
+        return [value(*buckets.get(label, (0, 0, 0.0))) for label in labels]
+
+    totals = {}
+    for buckets in groups.values():
+        for label, row in buckets.items():
+            totals[label] = [a + b for a, b in zip(totals.get(label, (0, 0, 0.0)), row)]
+    data = {'granularity': granularity, 'labels': labels, 'data': points(totals)}
+    if group_by:
+        data['series'] = {name: points(buckets) for name, buckets in sorted(groups.items())}
+    return data
+
 @app.route('/api/trend-data', methods=['GET'])
+@response_cache.cached('complaints', clock=60)
 def get_trend_data():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT DATE(created_at) as date, COUNT(*) as count 
-                 FROM complaints 
-                 WHERE created_at >= date('now', '-30 days')
-                 GROUP BY DATE(created_at)
-                 ORDER BY date''')
-    
-    data = {
-        'labels': [row[0] for row in c.fetchall()],
-        'data': [row[1] for row in c.fetchall()]
-    }
-    
-    conn.close()
-    return jsonify(data)
+    return jsonify(rollup_chart(request.args, lambda created, resolved, days: created))
 
 @app.route('/api/resolution-time', methods=['GET'])
+@response_cache.cached('complaints', clock=60)
 def get_resolution_time():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT type, 
-                 AVG(JULIANDAY(updated_at) - JULIANDAY(created_at)) as avg_days
-                 FROM complaints 
-                 WHERE status = "Resolved"
-                 GROUP BY type''')
-    
+    if request.args.get('granularity'):
+        return jsonify(rollup_chart(request.args, lambda created, resolved, days: average_days(resolved, days)))
+
+    # All-time averages per type (or department), as before
+    group_by = request.args.get('group_by') or 'type'
+    if group_by not in rollups.GROUPS:
+        raise BadQueryParameter(f"group_by must be one of {', '.join(rollups.GROUPS)}")
+    with get_db() as conn:
+        rows = [row for row in rollups.totals(conn, group_by) if row[2]]
+
     data = {
-        'labels': [row[0] for row in c.fetchall()],
-        'data': [round(row[1], 1) for row in c.fetchall()]
+        'labels': [row[0] for row in rows],
+        'data': [average_days(row[2], row[3]) for row in rows]
     }
-    
-    conn.close()
+
     return jsonify(data)
 
 @app.route('/api/complaints-with-location', methods=['GET'])
+@response_cache.cached('complaints')
 def get_complaints_with_location():
-    conn = get_db_connection()
-    c = conn.cursor()
+    where, params = filter_clauses(request.args, COMPLAINT_FILTERS, 'created_at')
+    if request.args.get('bbox'):
+        # Map viewport: grid clusters when zoomed out, slim points when zoomed in
+        bbox = geo.parse_bbox(request.args['bbox'])
+        zoom = geo.parse_zoom(request.args.get('zoom'))
+        with get_db() as conn:
+            c = conn.cursor()
+            if zoom >= geo.POINTS_MIN_ZOOM:
+                clusters = []
+                points, truncated = geo.points(c, bbox, where, params)
+            else:
+                clusters, points = geo.grid(c, bbox, zoom, where, params)
+                truncated = False
+        return jsonify({'zoom': zoom, 'clusters': clusters, 'points': points, 'truncated': truncated})
+
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM complaints WHERE latitude IS NOT NULL AND longitude IS NOT NULL')
-    complaints = c.fetchall()
+        complaints, next_cursor = fetch_page(c, 'SELECT * FROM complaints',
+                                             ['latitude IS NOT NULL', 'longitude IS NOT NULL'] + where, params,
+                                             ('created_at', 'id'), request.args)
     
-    conn.close()
-    return jsonify([dict(complaint) for complaint in complaints])
+    return page_response(complaints, next_cursor)
 
 # 3. Citizen Empowerment Tools
 
@@ -1024,21 +1018,14 @@ def get_protection_assessment():
 # 4. Government Accountability Tools
 
 @app.route('/api/official-performance', methods=['GET'])
+@response_cache.cached('complaints', 'officials')
 def get_official_performance():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Calculate performance metrics for officials
-    c.execute('''SELECT o.id, o.name, o.department,
-                 COUNT(c.id) as assigned_complaints,
-                 SUM(CASE WHEN c.status = "Resolved" THEN 1 ELSE 0 END) as resolved,
-                 AVG(JULIANDAY(c.updated_at) - JULIANDAY(c.created_at)) as avg_resolution_time
-                 FROM officials o
-                 LEFT JOIN complaints c ON o.id = c.assigned_official
-                 GROUP BY o.id''')
-    
+    # Officials joined to the complaints assigned to them (complaints.assigned_official_id)
+    with get_db() as conn:
+        rows = analytics.official_summary(conn)
+
     officials = []
-    for row in c.fetchall():
+    for row in rows:
         officials.append({
             'id': row[0],
             'name': row[1],
@@ -1048,39 +1035,26 @@ def get_official_performance():
             'resolution_rate': round((row[4] or 0) / row[3] * 100, 2) if row[3] and row[3] > 0 else 0,
             'avg_resolution_time': round(row[5], 1) if row[5] else 0
         })
-    
-    conn.close()
+
     return jsonify(officials)
 
 @app.route('/api/departments', methods=['GET'])
+@response_cache.cached('officials')
 def get_departments():
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute("SELECT DISTINCT department FROM officials")
-    departments = [row[0] for row in c.fetchall()]
+        c.execute("SELECT DISTINCT department FROM officials")
+        departments = [row[0] for row in c.fetchall()]
     
-    conn.close()
     return jsonify(departments)
 
 @app.route('/api/department-performance/<department>', methods=['GET'])
+@response_cache.cached('complaints', 'feedback')
 def get_department_performance(department):
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Get department performance metrics
-    c.execute('''SELECT 
-                 COUNT(c.id) as total_complaints,
-                 SUM(CASE WHEN c.status = "Resolved" THEN 1 ELSE 0 END) as resolved,
-                 AVG(JULIANDAY(c.updated_at) - JULIANDAY(c.created_at)) as avg_resolution_time,
-                 AVG(f.rating) as avg_satisfaction
-                 FROM complaints c
-                 LEFT JOIN feedback f ON c.type = f.service_name
-                 WHERE c.department = ?
-                 GROUP BY c.department''', (department,))
-    
-    row = c.fetchone()
-    
+    with get_db() as conn:
+        row = analytics.department_performance(department, conn)
+
     if row:
         total_complaints, resolved, avg_resolution_time, avg_satisfaction = row
         performance = {
@@ -1088,7 +1062,7 @@ def get_department_performance(department):
             'total_complaints': total_complaints,
             'resolved': resolved,
             'resolution_rate': round(resolved / total_complaints * 100, 2) if total_complaints > 0 else 0,
-            'avg_resolution_time': round(avg_resolution_time, 1),
+            'avg_resolution_time': round(avg_resolution_time, 1) if avg_resolution_time else 0,
             'satisfaction': round(avg_satisfaction, 1) if avg_satisfaction else 0
         }
     else:
@@ -1100,22 +1074,23 @@ def get_department_performance(department):
             'avg_resolution_time': 0,
             'satisfaction': 0
         }
-    
-    conn.close()
+
     return jsonify(performance)
 
 # 5. Community Engagement Features
 
 @app.route('/api/community-reports', methods=['GET'])
+@response_cache.cached('community_reports')
 def get_community_reports():
-    conn = get_db_connection()
-    c = conn.cursor()
+    where, params = filter_clauses(request.args, {'status': 'status', 'severity': 'severity', 'location': 'location'},
+                                   'created_at')
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM community_reports ORDER BY created_at DESC')
-    reports = c.fetchall()
+        reports, next_cursor = fetch_page(c, 'SELECT * FROM community_reports', where, params,
+                                          ('created_at', 'id'), request.args)
     
-    conn.close()
-    return jsonify([dict(report) for report in reports])
+    return page_response(reports, next_cursor)
 
 @app.route('/api/community-reports', methods=['POST'])
 def submit_community_report():
@@ -1125,16 +1100,15 @@ def submit_community_report():
     severity = data.get('severity')
     description = data.get('description')
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('''INSERT INTO community_reports (location, issue, severity, description, status, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (location, issue, severity, description, 'Pending', datetime.now()))
+        c.execute('''INSERT INTO community_reports (location, issue, severity, description, status, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  (location, issue, severity, description, 'Pending', datetime.now()))
     
-    report_id = c.lastrowid
-    conn.commit()
-    conn.close()
+        report_id = c.lastrowid
+        conn.commit()
     
     return jsonify({
         'id': report_id,
@@ -1142,6 +1116,7 @@ def submit_community_report():
     }), 201
 
 @app.route('/api/services', methods=['GET'])
+@response_cache.cached()
 def get_services():
     # List of government services for feedback
     services = [
@@ -1162,16 +1137,15 @@ def submit_feedback():
     comments = data.get('comments')
     anonymous = data.get('anonymous', False)
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('''INSERT INTO feedback (service_name, rating, comments, anonymous, created_at)
-                 VALUES (?, ?, ?, ?, ?)''',
-              (service_name, rating, comments, 1 if anonymous else 0, datetime.now()))
+        c.execute('''INSERT INTO feedback (service_name, rating, comments, anonymous, created_at)
+                     VALUES (?, ?, ?, ?, ?)''',
+                  (service_name, rating, comments, 1 if anonymous else 0, datetime.now()))
     
-    feedback_id = c.lastrowid
-    conn.commit()
-    conn.close()
+        feedback_id = c.lastrowid
+        conn.commit()
     
     return jsonify({
         'id': feedback_id,
@@ -1180,24 +1154,25 @@ def submit_feedback():
 
 # 6. Most Wanted Criminals
 @app.route('/api/most-wanted', methods=['GET'])
+@response_cache.cached('most_wanted')
 def get_most_wanted():
-    conn = get_db_connection()
-    c = conn.cursor()
+    where, params = filter_clauses(request.args, {'crime': 'crime'})
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM most_wanted WHERE status = "Active" ORDER BY reward_amount DESC')
-    criminals = c.fetchall()
+        criminals, next_cursor = fetch_page(c, 'SELECT * FROM most_wanted', ["status = 'Active'"] + where, params,
+                                            ('reward_amount', 'id'), request.args)
     
-    conn.close()
-    return jsonify([dict(criminal) for criminal in criminals])
+    return page_response(criminals, next_cursor)
 
 @app.route('/api/most-wanted/<int:criminal_id>', methods=['GET'])
+@response_cache.cached('most_wanted')
 def get_most_wanted_details(criminal_id):
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db() as conn:
+        c = conn.cursor()
     
-    c.execute('SELECT * FROM most_wanted WHERE id = ?', (criminal_id,))
-    criminal = c.fetchone()
-    conn.close()
+        c.execute('SELECT * FROM most_wanted WHERE id = ?', (criminal_id,))
+        criminal = c.fetchone()
     
     if criminal:
         return jsonify(dict(criminal))
@@ -1206,7 +1181,7 @@ def get_most_wanted_details(criminal_id):
 # Route to serve static map marker images
 @app.route('/<path:filename>')
 def serve_static_files(filename):
-    # This route is now less specific and might conflict. The /uploads/<filename> is better.
+    # This route is now less specific and might conflict. The /uploads/<path:filename> is better.
     static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images')
     return send_from_directory(static_dir, filename)
 
@@ -0,0 +1,224 @@
+"""Throughput of evidence serving: the original /uploads route against the blob route.
+
+Writes seeded random blobs into a temporary evidence store and serves them over
+HTTP from a local threaded werkzeug server, using two routes:
+
+- original: the route as it was, send_from_directory with an mtime ETag and
+  ``Cache-Control: no-cache``;
+- blob: EvidenceStore.send, as mounted at /uploads by app.py.
+
+Each scenario is run against both routes:
+
+- full: plain GETs of whole files;
+- revalidate: GETs carrying the ETag from an earlier response, as a browser
+  sends when an officer reopens a case. The original route still stats the
+  file; the blob route answers from the URL alone. A browser would not send
+  these at all for the blob route while its copy is fresh;
+- seek: 1 MiB Range requests at random offsets, as a media player makes.
+
+The blob route is also measured in x-accel-redirect mode, where the app only
+sends headers and the proxy copies the bytes.
+
+    python benchmarks/bench_evidence_serving.py --files 8 --size-mib 16 [--json results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, jsonify, send_from_directory
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import evidence_store  # noqa: E402
+from evidence_store import EvidenceStore, blob_hash  # noqa: E402
+
+RANGE_BYTES = 1024 * 1024
+
+
+def build_store(root, files, size, seed=7):
+    """Random blobs in a fresh store; returns (blob paths, legacy file names, db path)."""
+    rng = random.Random(seed)
+    store = EvidenceStore(root)
+    store.ensure_dirs()
+    db_path = os.path.join(root, 'bench.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE evidence (id INTEGER PRIMARY KEY, complaint_id INTEGER, file_path TEXT)')
+    evidence_store.install(conn)
+    blobs, legacy = [], []
+    for number in range(files):
+        data = rng.randbytes(size)
+        staged = store.stage()
+        staged.write(data)
+        sha256, _, relative = store.commit(staged)
+        conn.execute('INSERT INTO evidence_blobs (sha256, size, content_type, path) VALUES (?, ?, ?, ?)',
+                     (sha256, size, 'video/mp4', relative))
+        blobs.append(relative)
+        # The original route served flat files by name
+        name = f'video{number}.mp4'
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(data)
+        legacy.append(name)
+    conn.commit()
+    conn.close()
+    return blobs, legacy, db_path
+
+
+def make_app(root, db_path, sendfile=None):
+    app = Flask(__name__)
+    store = EvidenceStore(root, sendfile=sendfile)
+    local = threading.local()
+
+    def db():
+        if not hasattr(local, 'conn'):
+            local.conn = sqlite3.connect(db_path)
+        return local.conn
+
+    @app.route('/original/<filename>')
+    def original(filename):
+        if '..' in filename or filename.startswith('/'):
+            return "Invalid path", 400
+        return send_from_directory(root, filename)
+
+    @app.route('/uploads/<path:filename>')
+    def blob(filename):
+        # Mirrors app.uploaded_file for blob paths
+        sha256 = blob_hash(filename)
+        response = store.not_modified(sha256)
+        if response is not None:
+            return response
+        row = db().execute('SELECT content_type FROM evidence_blobs WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is None:
+            return jsonify({'error': 'Evidence not found'}), 404
+        return store.send(sha256, row[0])
+
+    return app
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Server:
+    def __init__(self, app):
+        self.httpd = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.port = self.httpd.server_port
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+
+
+def fetch(conn, path, headers=None):
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, dict(response.getheaders()), len(body)
+
+
+def run(port, requests, concurrency):
+    """Runs (path, headers) requests over ``concurrency`` keep-alive connections."""
+    share = [requests[i::concurrency] for i in range(concurrency)]
+
+    def worker(batch):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        statuses, received = {}, 0
+        for path, headers in batch:
+            status, _, size = fetch(conn, path, headers)
+            statuses[status] = statuses.get(status, 0) + 1
+            received += size
+        conn.close()
+        return statuses, received
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, share))
+    elapsed = time.perf_counter() - start
+    statuses, received = {}, 0
+    for batch_statuses, batch_received in results:
+        received += batch_received
+        for status, count in batch_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return elapsed, statuses, received
+
+
+def scenarios(port, paths, size, count, rng):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    etags = {path: fetch(conn, path)[1].get('ETag') for path in paths}
+    conn.close()
+    picks = [rng.choice(paths) for _ in range(count)]
+    offsets = [rng.randrange(0, max(1, size - RANGE_BYTES)) for _ in range(count)]
+    return {
+        'full': [(path, {}) for path in picks],
+        'revalidate': [(path, {'If-None-Match': etags[path]}) for path in picks],
+        'seek': [(path, {'Range': f'bytes={offset}-{offset + RANGE_BYTES - 1}'})
+                 for path, offset in zip(picks, offsets)],
+    }
+
+
+def measure(route, port, paths, size, args):
+    results = []
+    for name, requests in scenarios(port, paths, size, args.requests, random.Random(args.seed)).items():
+        elapsed, statuses, received = run(port, requests, args.concurrency)
+        results.append({
+            'route': route,
+            'scenario': name,
+            'requests': len(requests),
+            'statuses': statuses,
+            'seconds': round(elapsed, 4),
+            'requests_per_second': round(len(requests) / elapsed, 1),
+            'mib_per_second': round(received / elapsed / 2 ** 20, 1),
+            'mib_sent': round(received / 2 ** 20, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--size-mib', type=float, default=16)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    size = int(args.size_mib * 2 ** 20)
+    root = tempfile.mkdtemp(prefix='bench-evidence-')
+    try:
+        blobs, legacy, db_path = build_store(root, args.files, size, args.seed)
+        results = []
+        with Server(make_app(root, db_path)) as server:
+            results += measure('original', server.port, [f'/original/{name}' for name in legacy], size, args)
+            results += measure('blob', server.port, [f'/uploads/{path}' for path in blobs], size, args)
+        with Server(make_app(root, db_path, sendfile='x-accel-redirect')) as server:
+            results += measure('blob x-accel', server.port, [f'/uploads/{path}' for path in blobs], size, args)
+    finally:
+        shutil.rmtree(root)
+
+    for result in results:
+        print(f"{result['route']:<13} {result['scenario']:<11} {result['requests_per_second']:>9} req/s "
+              f"{result['mib_per_second']:>9} MiB/s  {result['mib_sent']:>8} MiB sent  {result['statuses']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Throughput and recall of each PII redaction tier against the original redact_pii.
+
+Builds a seeded synthetic corpus of complaint texts with planted identifiers
+(Aadhaar, PAN, IFSC, phone, email, person names), runs every tier over it and
+reports texts/second and the share of planted values that no longer appear in
+the output.
+
+    python benchmarks/bench_redaction.py --texts 2000 [--json results.json]
+
+Tiers that need Presidio are skipped if it is not installed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pii_rules  # noqa: E402
+from redaction import RedactionService  # noqa: E402
+
+NAMES = ['Rajesh Kumar', 'Priya Sharma', 'Amit Verma', 'Sunita Devi', 'Mohammed Iqbal', 'Anjali Nair']
+TEMPLATES = [
+    "The clerk demanded money before processing my file. My Aadhaar is {aadhaar}.",
+    "Officer {name} asked for a bribe of 5000 rupees. Contact me on {phone}.",
+    "please refund to account with IFSC {ifsc}, PAN {pan}",
+    "Passport pending for months, I wrote to {email} but got no reply.",
+    "my phone {phone} and email {email} were shared without consent",
+    "Inspector {name} refused to register the FIR unless paid.",
+    "{name} demanded 5000 rupees to clear the file.",
+    "Service delayed again at the RTO office, no reason given.",
+]
+
+
+def _aadhaar(rng):
+    digits = str(rng.randint(2, 9)) + ''.join(str(rng.randint(0, 9)) for _ in range(10))
+    digits += pii_rules.verhoeff_check_digit(digits)
+    return f'{digits[:4]} {digits[4:8]} {digits[8:]}'
+
+
+def _pan(rng):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return (''.join(rng.choice(letters) for _ in range(3)) + rng.choice('ABCFGHLJPT') + rng.choice(letters)
+            + f'{rng.randint(0, 9999):04d}' + rng.choice(letters))
+
+
+def build_corpus(size, seed=7):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        values = {
+            'aadhaar': ('IN_AADHAAR', _aadhaar(rng)),
+            'pan': ('IN_PAN', _pan(rng)),
+            'ifsc': ('IN_IFSC', ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4)) + '0'
+                     + f'{rng.randint(0, 999999):06d}'),
+            'phone': ('PHONE_NUMBER', rng.choice(['+91 ', '0', '']) + str(rng.randint(6, 9))
+                      + f'{rng.randint(0, 999999999):09d}'),
+            'email': ('EMAIL_ADDRESS', f'user{rng.randint(1, 99999)}@example.in'),
+            'name': ('PERSON', rng.choice(NAMES)),
+        }
+        template = rng.choice(TEMPLATES)
+        planted = [(entity, value) for key, (entity, value) in values.items() if '{' + key + '}' in template]
+        corpus.append((template.format(**{key: value for key, (_, value) in values.items()}), planted))
+    return corpus
+
+
+def measure(name, redact_all, corpus):
+    texts = [text for text, _ in corpus]
+    start = time.perf_counter()
+    outputs = redact_all(texts)
+    elapsed = time.perf_counter() - start
+    found, total = defaultdict(int), defaultdict(int)
+    for (_, planted), output in zip(corpus, outputs):
+        for entity, value in planted:
+            total[entity] += 1
+            found[entity] += value not in output
+    return {
+        'tier': name,
+        'texts': len(texts),
+        'seconds': round(elapsed, 4),
+        'texts_per_second': round(len(texts) / elapsed, 1) if elapsed else None,
+        'recall': round(sum(found.values()) / sum(total.values()), 4) if total else None,
+        'recall_by_entity': {entity: round(found[entity] / total[entity], 4) for entity in sorted(total)},
+    }
+
+
+def original_redact_all():
+    """The pre-tiering redact_pii: one full Presidio analysis per text."""
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_anonymizer import AnonymizerEngine
+    analyzer = AnalyzerEngine()
+    anonymizer = AnonymizerEngine()
+
+    def redact_all(texts):
+        return [anonymizer.anonymize(text=text, analyzer_results=analyzer.analyze(text=text, language='en')).text
+                for text in texts]
+    return redact_all
+
+
+def service_redact_all(policy):
+    service = RedactionService(pool_size=0, ner_policy=policy)
+    service.redact('warm up the NER model, Rajesh')
+    return service.redact_many
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--texts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.texts, args.seed)
+    tiers = [('fast', lambda: (lambda texts: [pii_rules.redact(text) for text in texts]))]
+    try:
+        import presidio_analyzer  # noqa: F401
+        tiers += [
+            ('original', original_redact_all),
+            ('tiered-auto', lambda: service_redact_all('auto')),
+            ('tiered-always', lambda: service_redact_all('always')),
+        ]
+    except ImportError:
+        print("WARNING: presidio_analyzer not installed; only the fast tier is measured.")
+
+    results = [measure(name, factory(), corpus) for name, factory in tiers]
+    for result in results:
+        print(f"{result['tier']:<14} {result['texts_per_second']:>10} texts/s  recall {result['recall']}  "
+              f"{result['recall_by_entity']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
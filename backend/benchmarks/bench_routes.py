@@ -0,0 +1,589 @@
+"""Latency and throughput of every /api route under citizen, police and analytics traffic.
+
+Fills a database in a temporary directory with synthetic_data.py (or copies
+one given with --source-db) and serves the real ``app`` from it over a local
+threaded werkzeug server, with the pipeline workers and email sender running.
+Gemini and Presidio are replaced by the deterministic fakes in
+benchmarks/fakes and SMTP by a local sink, each with a configurable latency;
+``--real gemini`` or ``--real presidio`` keeps the installed package instead.
+Mail is never sent.
+
+Each mix is a weighted set of routes:
+
+- citizen: filing and following complaints, feedback, guidance;
+- police: the case queue, comments and closures, search and the map;
+- analytics: the dashboard, charts, anomalies and performance reports;
+- all: every /api route with equal weight.
+
+Every (mix, concurrency) run starts from the same seeded database and sends
+the same seeded sequence of requests over keep-alive connections, after a
+warm-up. The report gives throughput and p50/p95/p99 latency per route and
+how long the pipeline took to drain afterwards. With --baseline, the results
+are compared against an earlier --json output and the exit status is 1 if a
+route got slower or started failing. --query-report writes each run's
+slow-query and N+1 report (see query_log.py).
+
+    python benchmarks/bench_routes.py --mix citizen,police,analytics --concurrency 1,8 --requests 1000 \\
+        [--json results.json] [--baseline baseline.json] [--query-report queries.json]
+"""
+import argparse
+import http.client
+import importlib
+import json
+import math
+import os
+import random
+import shutil
+import socketserver
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES = os.path.join(BACKEND, 'benchmarks', 'fakes')
+sys.path.insert(0, BACKEND)
+
+TYPES = ['bribery', 'harassment', 'delay', 'nepotism', 'embezzlement', 'other']
+DEPARTMENTS = {'bribery': 'Police', 'harassment': 'Police', 'delay': 'Passport Office',
+               'nepotism': 'Municipal Corporation', 'embezzlement': 'Finance Ministry'}
+STATUSES = ['Submitted', 'In Progress', 'Resolved']
+CITIES = [(19.0760, 72.8777), (28.6139, 77.2090), (12.9716, 77.5946), (22.5726, 88.3639), (17.3850, 78.4867)]
+SERVICES = ['Passport Office', 'RTO', 'Municipal Corporation', 'Electricity Department', 'Water Supply Department']
+WORDS = ['officer', 'clerk', 'demanded', 'bribe', 'license', 'passport', 'pending', 'months', 'refused', 'file',
+         'without', 'payment', 'office', 'delay', 'application', 'inspector', 'threatened', 'tender', 'contract',
+         'relative', 'funds', 'missing', 'road', 'repair', 'water', 'connection', 'ration', 'card', 'verification']
+DESCRIPTIONS = [
+    "Officer {name} asked for {amount} rupees to approve my {thing}.",
+    "My {thing} has been pending for {months} months and the clerk wants money.",
+    "The {thing} was given to a relative of the inspector without a tender.",
+    "Call me on 98{phone} about the {thing}, I was threatened at the office.",
+]
+NAMES = ['Rajesh Kumar', 'Priya Sharma', 'Amit Verma', 'Sunita Devi', 'Mohammed Iqbal', 'Anjali Nair']
+BBOX = '68.0,8.0,97.5,37.0'  # India
+
+
+# Fake services
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for OutboxSender: accepts every message after ``latency`` seconds."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 bench-smtp ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 bench-smtp')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                time.sleep(self.server.latency)
+                self.server.count()
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.latency = latency
+        self.messages = 0
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def count(self):
+        with self._lock:
+            self.messages += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def configure_environment(root, smtp_port, args):
+    """Points the app at the temporary directory, the SMTP sink and the fakes. Must run before importing it."""
+    os.environ.update({
+        'DATABASE_PATH': os.path.join(root, 'database.db'),
+        'UPLOAD_FOLDER': os.path.join(root, 'uploads'),
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_STARTTLS': '0',
+        # Set, so load_dotenv() keeps the real credentials out of the benchmark
+        'EMAIL_USER': '',
+        'EMAIL_PASSWORD': '',
+        'EMAIL_FROM': 'bench@localhost',
+        'EMAIL_BACKOFF_SECONDS': '1',
+        'FAKE_GEMINI_LATENCY_MS': str(args.gemini_latency_ms),
+        'FAKE_PRESIDIO_LATENCY_MS': str(args.presidio_latency_ms),
+    })
+    os.environ.pop('RESPONSE_CACHE_PATH', None)
+    os.environ.pop('REDACTION_SERVICE_ADDRESS', None)
+    for service in ('gemini', 'presidio'):
+        if service not in args.real:
+            # The redaction pool's spawned processes start with the parent's sys.path
+            sys.path.insert(0, os.path.join(FAKES, service))
+
+
+# Seeding
+
+def _description(rng):
+    return rng.choice(DESCRIPTIONS).format(name=rng.choice(NAMES), amount=rng.randrange(500, 50000, 500),
+                                           thing=rng.choice(WORDS), months=rng.randint(1, 12),
+                                           phone=f'{rng.randrange(10 ** 8):08d}')
+
+
+def build_database(root, args):
+    """Writes the seeded database to root/seed.db and returns its path."""
+    import synthetic_data
+    from migrations import migrate
+
+    path = os.path.join(root, 'seed.db')
+    if args.source_db:
+        source = sqlite3.connect(args.source_db)
+        conn = sqlite3.connect(path)
+        source.backup(conn)
+        source.close()
+        migrate(conn)
+    else:
+        conn = sqlite3.connect(path)
+        migrate(conn)
+        synthetic_data.generate(conn, args.complaints, args.seed, days=365, log=lambda message: None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    return path
+
+
+def restore(seed_path, live_path):
+    """Copies the seeded database over the live one, in place, so pooled connections stay valid."""
+    source = sqlite3.connect(seed_path)
+    target = sqlite3.connect(live_path, timeout=60)
+    source.backup(target)
+    target.close()
+    source.close()
+
+
+# Requests
+
+def load_context(path):
+    """Ids and names the request builders draw from."""
+    conn = sqlite3.connect(path)
+    context = {
+        'complaints': conn.execute('SELECT MAX(id) FROM complaints').fetchone()[0] or 1,
+        'citizens': [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'citizen' LIMIT 10000")] or [1],
+        'emails': [row[0] for row in conn.execute("SELECT email FROM users WHERE role = 'citizen' LIMIT 1000")],
+        'police': [row[0] for row in conn.execute("SELECT id FROM users WHERE role != 'citizen' LIMIT 1000")] or [2],
+        'departments': [row[0] for row in conn.execute('SELECT DISTINCT department FROM officials')] or ['Police'],
+        'most_wanted': [row[0] for row in conn.execute('SELECT id FROM most_wanted')] or [1],
+    }
+    conn.close()
+    return context
+
+
+def _get(path, **query):
+    query = {name: value for name, value in query.items() if value is not None}
+    return 'GET', path + (f'?{urlencode(query)}' if query else ''), None, {}
+
+
+def _json(path, body):
+    return 'POST', path, json.dumps(body).encode('utf-8'), {'Content-Type': 'application/json'}
+
+
+def _form(path, fields):
+    return 'POST', path, urlencode(fields).encode('utf-8'), {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def _complaint(rng, context):
+    return rng.randint(1, context['complaints'])
+
+
+def _maybe(rng, values, chance=0.3):
+    return rng.choice(values) if rng.random() < chance else None
+
+
+# Flask rule -> function(rng, context) returning (method, path, body, headers)
+ENDPOINTS = {
+    'POST /api/login': lambda rng, ctx: _json('/api/login', {
+        'email': rng.choice(ctx['emails']), 'password': 'password123'}),
+    'GET /api/user/complaints': lambda rng, ctx: _get('/api/user/complaints', user_id=rng.choice(ctx['citizens']),
+                                                      status=_maybe(rng, STATUSES)),
+    'GET /api/police/complaints': lambda rng, ctx: _get('/api/police/complaints', status=_maybe(rng, STATUSES, 0.5),
+                                                        type=_maybe(rng, TYPES), limit=rng.choice([20, 50])),
+    'POST /api/police/complaints/<int:complaint_id>/comment': lambda rng, ctx: _form(
+        f'/api/police/complaints/{_complaint(rng, ctx)}/comment',
+        {'user_id': rng.choice(ctx['police']), 'comment': _description(rng)}),
+    'POST /api/police/complaints/<int:complaint_id>/close': lambda rng, ctx: _form(
+        f'/api/police/complaints/{_complaint(rng, ctx)}/close',
+        {'user_id': rng.choice(ctx['police']), 'resolution': _description(rng)}),
+    'GET /api/complaints/<int:complaint_id>/comments': lambda rng, ctx: _get(
+        f'/api/complaints/{_complaint(rng, ctx)}/comments'),
+    'GET /api/complaints/<int:complaint_id>/evidence': lambda rng, ctx: _get(
+        f'/api/complaints/{_complaint(rng, ctx)}/evidence'),
+    'GET /api/users/<int:user_id>/tags': lambda rng, ctx: _get(f"/api/users/{rng.choice(ctx['police'])}/tags"),
+    'POST /api/complaints/<int:complaint_id>/rate': lambda rng, ctx: _json(
+        f'/api/complaints/{_complaint(rng, ctx)}/rate', {'rating': rng.randint(1, 5),
+                                                          'user_id': rng.choice(ctx['citizens'])}),
+    'POST /api/complaints': lambda rng, ctx: _form('/api/complaints', {
+        'type': rng.choice(TYPES), 'description': _description(rng), 'user_id': rng.choice(ctx['citizens']),
+        'latitude': rng.choice(CITIES)[0] + rng.gauss(0, 0.2), 'longitude': rng.choice(CITIES)[1] + rng.gauss(0, 0.2)}),
+    'GET /api/complaints/<int:complaint_id>/status': lambda rng, ctx: _get(
+        f'/api/complaints/{_complaint(rng, ctx)}/status'),
+    'GET /api/complaints/<int:complaint_id>': lambda rng, ctx: _get(f'/api/complaints/{_complaint(rng, ctx)}'),
+    'GET /api/dashboard': lambda rng, ctx: _get('/api/dashboard'),
+    'GET /api/integrity-index': lambda rng, ctx: _get('/api/integrity-index'),
+    'POST /api/rewards': lambda rng, ctx: _json('/api/rewards', {'complaint_id': _complaint(rng, ctx),
+                                                                 'amount': rng.randrange(1000, 50000, 1000)}),
+    'GET /api/risk-analysis': lambda rng, ctx: _get('/api/risk-analysis'),
+    'GET /api/anomalies': lambda rng, ctx: _get('/api/anomalies', days=rng.choice([None, 7, 90]),
+                                                min_z=rng.choice([None, 2.0])),
+    'GET /api/complaint-clusters': lambda rng, ctx: _get('/api/complaint-clusters', type=_maybe(rng, TYPES, 0.5)),
+    'GET /api/systemic-flaw-analysis': lambda rng, ctx: _get('/api/systemic-flaw-analysis',
+                                                             type=_maybe(rng, TYPES, 0.5)),
+    'GET /api/llm-cache/stats': lambda rng, ctx: _get('/api/llm-cache/stats'),
+    'GET /api/response-cache/stats': lambda rng, ctx: _get('/api/response-cache/stats'),
+    'GET /api/email-outbox/stats': lambda rng, ctx: _get('/api/email-outbox/stats'),
+    'GET /api/search': lambda rng, ctx: _get('/api/search', q=' '.join(rng.sample(WORDS, rng.randint(1, 2))),
+                                             type=_maybe(rng, TYPES)),
+    'GET /api/search/facets': lambda rng, ctx: _get('/api/search/facets', q=rng.choice(WORDS)),
+    'GET /api/complaints-by-type': lambda rng, ctx: _get('/api/complaints-by-type'),
+    'GET /api/trend-data': lambda rng, ctx: _get('/api/trend-data', granularity=rng.choice(['hour', 'day', 'week', 'month']),
+                                                 group_by=_maybe(rng, ['type', 'department'])),
+    'GET /api/resolution-time': lambda rng, ctx: _get('/api/resolution-time', granularity=_maybe(rng, ['day', 'week'])),
+    'GET /api/complaints-with-location': lambda rng, ctx: _get('/api/complaints-with-location', bbox=BBOX,
+                                                               zoom=rng.choice([4, 8, 12])),
+    'POST /api/legal-guidance': lambda rng, ctx: _json('/api/legal-guidance', {'type': rng.choice(TYPES)}),
+    'POST /api/protection-assessment': lambda rng, ctx: _json('/api/protection-assessment', {
+        'anonymityLevel': rng.choice(['full', 'partial']), 'complaintType': rng.choice(TYPES)}),
+    'GET /api/official-performance': lambda rng, ctx: _get('/api/official-performance'),
+    'GET /api/departments': lambda rng, ctx: _get('/api/departments'),
+    'GET /api/department-performance/<department>': lambda rng, ctx: _get(
+        f"/api/department-performance/{quote(rng.choice(ctx['departments']))}"),
+    'GET /api/community-reports': lambda rng, ctx: _get('/api/community-reports', status=_maybe(rng, ['Pending'])),
+    'POST /api/community-reports': lambda rng, ctx: _json('/api/community-reports', {
+        'location': rng.choice(SERVICES), 'issue': rng.choice(WORDS), 'severity': rng.choice(['Low', 'High']),
+        'description': _description(rng)}),
+    'GET /api/services': lambda rng, ctx: _get('/api/services'),
+    'POST /api/feedback': lambda rng, ctx: _json('/api/feedback', {
+        'service': rng.choice(SERVICES), 'rating': rng.randint(1, 5), 'comments': rng.choice(WORDS),
+        'anonymous': rng.random() < 0.5}),
+    'GET /api/most-wanted': lambda rng, ctx: _get('/api/most-wanted', crime=_maybe(rng, ['Bribery'])),
+    'GET /api/most-wanted/<int:criminal_id>': lambda rng, ctx: _get(
+        f"/api/most-wanted/{rng.choice(ctx['most_wanted'])}"),
+}
+
+# mix -> {endpoint: weight}
+MIXES = {
+    'citizen': {
+        'POST /api/login': 3, 'POST /api/complaints': 4, 'GET /api/user/complaints': 8,
+        'GET /api/complaints/<int:complaint_id>': 5, 'GET /api/complaints/<int:complaint_id>/status': 8,
+        'GET /api/complaints/<int:complaint_id>/comments': 4, 'GET /api/complaints/<int:complaint_id>/evidence': 2,
+        'POST /api/complaints/<int:complaint_id>/rate': 1, 'POST /api/legal-guidance': 2,
+        'POST /api/protection-assessment': 1, 'GET /api/services': 2, 'POST /api/feedback': 2,
+        'GET /api/community-reports': 2, 'POST /api/community-reports': 1, 'GET /api/most-wanted': 2,
+        'GET /api/most-wanted/<int:criminal_id>': 1, 'GET /api/search': 2, 'GET /api/dashboard': 3,
+    },
+    'police': {
+        'POST /api/login': 1, 'GET /api/police/complaints': 10, 'GET /api/complaints/<int:complaint_id>': 5,
+        'GET /api/complaints/<int:complaint_id>/comments': 5, 'GET /api/complaints/<int:complaint_id>/evidence': 3,
+        'POST /api/police/complaints/<int:complaint_id>/comment': 4,
+        'POST /api/police/complaints/<int:complaint_id>/close': 2, 'GET /api/users/<int:user_id>/tags': 1,
+        'GET /api/search': 5, 'GET /api/search/facets': 2, 'GET /api/complaints-with-location': 4,
+        'POST /api/rewards': 1, 'GET /api/dashboard': 2, 'GET /api/email-outbox/stats': 1,
+    },
+    'analytics': {
+        'GET /api/dashboard': 4, 'GET /api/integrity-index': 3, 'GET /api/risk-analysis': 3, 'GET /api/anomalies': 3,
+        'GET /api/complaint-clusters': 1, 'GET /api/systemic-flaw-analysis': 1, 'GET /api/trend-data': 5,
+        'GET /api/resolution-time': 3, 'GET /api/complaints-by-type': 3, 'GET /api/official-performance': 2,
+        'GET /api/departments': 1, 'GET /api/department-performance/<department>': 2,
+        'GET /api/complaints-with-location': 3, 'GET /api/search/facets': 2, 'GET /api/llm-cache/stats': 1,
+        'GET /api/response-cache/stats': 1,
+    },
+    'all': {endpoint: 1 for endpoint in ENDPOINTS},
+}
+
+
+def api_rules(flask_app):
+    """'METHOD rule' for every /api route the app serves."""
+    return {f'{method} {rule.rule}' for rule in flask_app.url_map.iter_rules() if rule.rule.startswith('/api/')
+            for method in rule.methods - {'HEAD', 'OPTIONS'}}
+
+
+def plan(mix, count, seed, context):
+    """The run's requests, as (endpoint, method, path, body, headers), drawn from a seeded generator."""
+    rng = random.Random(f'{seed}:{mix}')
+    endpoints = list(MIXES[mix])
+    weights = [MIXES[mix][endpoint] for endpoint in endpoints]
+    return [(endpoint,) + ENDPOINTS[endpoint](rng, context)
+            for endpoint in rng.choices(endpoints, weights=weights, k=count)]
+
+
+# Load
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Server:
+    def __init__(self, app):
+        self.httpd = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.port = self.httpd.server_port
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+
+
+def run(port, requests, concurrency):
+    """Sends the requests over ``concurrency`` keep-alive connections; returns (seconds, samples).
+
+    A sample is (endpoint, status, seconds); status 0 means the connection failed.
+    """
+    share = [requests[i::concurrency] for i in range(concurrency)]
+
+    def worker(batch):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        samples = []
+        for endpoint, method, path, body, headers in batch:
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=dict(headers, **{'Accept-Encoding': 'gzip'}))
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+                status = 0
+            samples.append((endpoint, status, time.perf_counter() - start))
+        conn.close()
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = [sample for batch in executor.map(worker, share) for sample in batch]
+    return time.perf_counter() - start, samples
+
+
+PERCENTILES = [('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)]
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, seconds):
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latencies = sorted(latency for _, _, latency in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status == 0 or status >= 500),
+        'statuses': statuses,
+        'requests_per_second': round(len(samples) / seconds, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        **{name: round(percentile(latencies, fraction) * 1000, 2) for name, fraction in PERCENTILES},
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def drain(application, timeout):
+    """Waits for the pipeline jobs and outbox mail the run queued; returns the seconds taken, or None."""
+    import outbox
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        with application.get_db() as conn:
+            jobs = application.pipeline_queue.depth(conn)
+            mail = outbox.depth(conn)
+        if not jobs.get('queued') and not jobs.get('running') and not mail.get('queued') \
+                and not mail.get('sending'):
+            return round(time.perf_counter() - start, 2)
+        time.sleep(0.05)
+    return None
+
+
+def measure(application, port, mix, concurrency, context, args):
+    warmup = plan(mix, args.warmup, f'{args.seed}:warmup', context)
+    if warmup:
+        run(port, warmup, concurrency)
+    application.query_log.LOG.clear()
+    seconds, samples = run(port, plan(mix, args.requests, args.seed, context), concurrency)
+    query_report = application.query_log.LOG.report()
+    endpoints = {}
+    for sample in samples:
+        endpoints.setdefault(sample[0], []).append(sample)
+    return {
+        'mix': mix,
+        'concurrency': concurrency,
+        'seconds': round(seconds, 3),
+        'overall': summarize(samples, seconds),
+        'endpoints': {endpoint: summarize(endpoint_samples, seconds)
+                      for endpoint, endpoint_samples in sorted(endpoints.items())},
+        'pipeline_drain_seconds': drain(application, args.drain_timeout),
+    }, query_report
+
+
+# Baseline comparison
+
+def compare(results, baseline, tolerance, min_delta_ms, min_tail):
+    """Regressions of ``results`` against ``baseline``, as readable lines."""
+    previous = {(run['mix'], run['concurrency']): run for run in baseline['runs']}
+    regressions = []
+    for current in results['runs']:
+        before = previous.get((current['mix'], current['concurrency']))
+        if before is None:
+            continue
+        label = f"{current['mix']} x{current['concurrency']}"
+        if current['overall']['requests_per_second'] < before['overall']['requests_per_second'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['overall']['requests_per_second']} -> "
+                               f"{current['overall']['requests_per_second']} req/s")
+        for endpoint, stats in current['endpoints'].items():
+            old = before['endpoints'].get(endpoint)
+            if old is None:
+                continue
+            if stats['errors'] > old['errors'] and stats['errors'] / stats['requests'] > old['errors'] / old['requests']:
+                regressions.append(f"{label} {endpoint}: errors {old['errors']} -> {stats['errors']}")
+            for name, fraction in PERCENTILES:
+                # A percentile is only compared once enough samples lie above it to make it stable
+                if min(stats['requests'], old['requests']) * (1 - fraction) < min_tail:
+                    continue
+                if stats[name] > old[name] * (1 + tolerance) and stats[name] - old[name] > min_delta_ms:
+                    regressions.append(f"{label} {endpoint}: {name} {old[name]} -> {stats[name]}")
+    return regressions
+
+
+def report(runs):
+    for result in runs:
+        overall = result['overall']
+        print(f"\n{result['mix']} x{result['concurrency']}: {overall['requests_per_second']} req/s, "
+              f"p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms, "
+              f"{overall['errors']} errors, pipeline drained in {result['pipeline_drain_seconds']} s")
+        for endpoint, stats in result['endpoints'].items():
+            print(f"  {endpoint:<58} {stats['requests']:>6} {stats['requests_per_second']:>8} req/s "
+                  f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} ms  {stats['statuses']}")
+
+
+def _names(value, choices):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(names) - set(choices)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown: {', '.join(sorted(unknown))}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', type=lambda value: _names(value, MIXES), default=['citizen', 'police', 'analytics'],
+                        help=f"Comma-separated, from {', '.join(MIXES)}")
+    parser.add_argument('--concurrency', type=lambda value: [int(n) for n in value.split(',')], default=[1, 8],
+                        help='Comma-separated numbers of concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='Measured requests per run')
+    parser.add_argument('--warmup', type=int, default=100, help='Unmeasured requests before each run')
+    parser.add_argument('--complaints', type=int, default=20000, help='Synthetic complaints to seed')
+    parser.add_argument('--source-db', help='Benchmark a copy of this database instead of seeding one')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--gemini-latency-ms', type=float, default=300)
+    parser.add_argument('--presidio-latency-ms', type=float, default=20)
+    parser.add_argument('--smtp-latency-ms', type=float, default=50)
+    parser.add_argument('--real', action='append', choices=['gemini', 'presidio'], default=[],
+                        help='Use the installed package instead of its fake')
+    parser.add_argument('--drain-timeout', type=float, default=120)
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--query-report', help="Write each run's slow-query and N+1 report to this file")
+    parser.add_argument('--baseline', help='Earlier --json output to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore slowdowns smaller than this')
+    parser.add_argument('--min-tail', type=int, default=10,
+                        help='Compare a percentile only if this many samples lie above it')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-routes-')
+    try:
+        with SMTPSink(args.smtp_latency_ms / 1000) as smtp:
+            configure_environment(root, smtp.server_address[1], args)
+            seed_path = build_database(root, args)
+            live_path = os.environ['DATABASE_PATH']
+            restore(seed_path, live_path)
+            context = load_context(seed_path)
+
+            application = importlib.import_module('app')
+            application.init_db()
+            missing = api_rules(application.app) - set(ENDPOINTS)
+            for endpoint in sorted(missing):
+                print(f"WARNING: {endpoint} has no request builder and is not benchmarked")
+            application.start_background_work()
+
+            runs = []
+            query_reports = {}
+            with Server(application.app) as server:
+                for mix in args.mix:
+                    for concurrency in args.concurrency:
+                        if runs:
+                            restore(seed_path, live_path)
+                            # Both hold state derived from the database that was just replaced
+                            application.analytics = application.AnalyticsEngine()
+                            application.response_cache.clear()
+                        result, query_reports[f'{mix}@{concurrency}'] = measure(
+                            application, server.port, mix, concurrency, context, args)
+                        runs.append(result)
+            application.email_sender.stop()
+            results = {
+                'config': {name: getattr(args, name) for name in (
+                    'requests', 'warmup', 'complaints', 'seed', 'gemini_latency_ms', 'presidio_latency_ms',
+                    'smtp_latency_ms', 'real')},
+                'emails_sent': smtp.messages,
+                'runs': runs,
+            }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report(results['runs'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.query_report:
+        with open(args.query_report, 'w') as f:
+            json.dump(query_reports, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms, args.min_tail)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Deterministic stand-in for google.generativeai, used by the benchmarks.
+
+bench_routes.py puts benchmarks/fakes/gemini first on sys.path, so the app's
+``import google.generativeai`` finds this module. Every call sleeps
+FAKE_GEMINI_LATENCY_MS and answers with text derived from a hash of the
+prompt, so repeated runs send and cache the same responses.
+"""
+import hashlib
+import os
+import time
+
+LATENCY_SECONDS = float(os.environ.get('FAKE_GEMINI_LATENCY_MS', 0)) / 1000
+
+SEVERITIES = ('low', 'medium', 'high')
+ACTIONS = ('file FIR', 'RTI application', 'departmental complaint')
+
+
+def configure(**kwargs):
+    pass
+
+
+class GenerateContentResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class GenerativeModel:
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, **kwargs):
+        if LATENCY_SECONDS:
+            time.sleep(LATENCY_SECONDS)
+        digest = hashlib.sha256(str(contents).encode('utf-8')).digest()
+        return GenerateContentResponse(
+            f"Intent: {('bribery request', 'service delay', 'harassment')[digest[0] % 3]}\n"
+            f"Severity: {SEVERITIES[digest[1] % 3]}\n"
+            f"Suggested action: {ACTIONS[digest[2] % 3]}\n"
+            f"Reference: {digest.hex()[:16]}")
@@ -0,0 +1,63 @@
+"""Deterministic stand-in for presidio_analyzer, used by the benchmarks.
+
+Finds PERSON (a title followed by a capitalised name, or two capitalised
+words) and PHONE_NUMBER (runs of ten or more digits) with regular
+expressions. Each batch sleeps FAKE_PRESIDIO_LATENCY_MS, standing in for the
+spaCy pipeline. bench_routes.py puts benchmarks/fakes/presidio first on
+sys.path; the redaction pool's spawned processes inherit it.
+"""
+import os
+import re
+import time
+
+LATENCY_SECONDS = float(os.environ.get('FAKE_PRESIDIO_LATENCY_MS', 0)) / 1000
+
+PATTERNS = {
+    'PERSON': re.compile(r'\b(?:(?:Mr|Mrs|Ms|Shri|Smt|Officer|Inspector|Clerk)\.? [A-Z][a-z]+|[A-Z][a-z]+ [A-Z][a-z]+)\b'),
+    'PHONE_NUMBER': re.compile(r'\+?\d[\d -]{8,}\d'),
+}
+
+
+class RecognizerResult:
+    def __init__(self, entity_type, start, end, score):
+        self.entity_type = entity_type
+        self.start = start
+        self.end = end
+        self.score = score
+
+
+class PatternRecognizer:
+    def __init__(self, entity):
+        self.supported_entities = [entity]
+
+
+class RecognizerRegistry:
+    def __init__(self):
+        self.recognizers = [PatternRecognizer(entity) for entity in PATTERNS]
+
+
+class AnalyzerEngine:
+    def __init__(self, **kwargs):
+        self.registry = RecognizerRegistry()
+
+    def get_supported_entities(self, language='en'):
+        return list(PATTERNS)
+
+    def analyze(self, text, language='en', entities=None, **kwargs):
+        allowed = {entity for recognizer in self.registry.recognizers for entity in recognizer.supported_entities}
+        if entities is not None:
+            allowed &= set(entities)
+        return [RecognizerResult(entity, match.start(), match.end(), 0.85)
+                for entity, pattern in PATTERNS.items() if entity in allowed
+                for match in pattern.finditer(text or '')]
+
+
+class BatchAnalyzerEngine:
+    def __init__(self, analyzer_engine=None):
+        self.analyzer_engine = analyzer_engine or AnalyzerEngine()
+
+    def analyze_iterator(self, texts, language='en', batch_size=1, **kwargs):
+        texts = list(texts)
+        if LATENCY_SECONDS:
+            time.sleep(LATENCY_SECONDS)
+        return [self.analyzer_engine.analyze(text, language, **kwargs) for text in texts]
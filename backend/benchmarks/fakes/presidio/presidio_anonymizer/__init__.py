@@ -0,0 +1,18 @@
+"""Stand-in for presidio_anonymizer: replaces each result with <ENTITY_TYPE>."""
+
+
+class EngineResult:
+    def __init__(self, text):
+        self.text = text
+
+
+class AnonymizerEngine:
+    def anonymize(self, text, analyzer_results, **kwargs):
+        end = len(text)
+        for result in sorted(analyzer_results, key=lambda result: result.start, reverse=True):
+            # Overlapping results collapse into the rightmost one
+            if result.end > end:
+                continue
+            text = text[:result.start] + f'<{result.entity_type}>' + text[result.end:]
+            end = result.start
+        return EngineResult(text)
@@ -0,0 +1,203 @@
+"""Local clustering of complaint descriptions, with no model or network calls.
+
+Descriptions are turned into hashed unigram/bigram TF-IDF vectors, held as
+CSR arrays (indptr, indices, data). Spherical mini-batch k-means then groups
+them: cosine similarity on L2-normalised rows, with centroids updated from
+random batches. Each cluster is summarised by its top terms, departments,
+complaint types and locations. The summaries are small enough to hand to the
+LLM in place of raw complaint rows.
+"""
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+N_FEATURES = 2 ** 16
+MAX_CLUSTERS = 50
+
+_TAG = re.compile(r'<[A-Z_]+>')
+_WORD = re.compile(r'[a-z]{2,}')
+STOPWORDS = frozenset('''
+    a about after again all also am an and any are as at be because been before being but by can could did do
+    does doing for from had has have having he her here him his how i if in into is it its me more most my no
+    not of on once only or other our out over own same she should so some such than that the their them then
+    there these they this those through to too under until up very was we were what when where which while who
+    why will with would you your yours ive im dont didnt its also even still just get got one two per sir madam
+'''.split())
+
+
+def tokenize(text):
+    """Lower-case words and adjacent-word bigrams, without stopwords or redaction tags."""
+    words = [word for word in _WORD.findall(_TAG.sub(' ', text or '').lower()) if word not in STOPWORDS]
+    return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+
+def vectorize(texts, n_features=N_FEATURES):
+    """Hashed TF-IDF rows for ``texts``.
+
+    Returns (indptr, indices, data, terms, kept): CSR arrays with
+    L2-normalised rows, a feature -> term map for reading results, and the
+    positions of the texts that had any terms (the rows, in order).
+    """
+    feature_of = {}
+    terms = {}
+    doc_ids, features, kept = [], [], []
+    for position, text in enumerate(texts):
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        row = len(kept)
+        kept.append(position)
+        for token in tokens:
+            feature = feature_of.get(token)
+            if feature is None:
+                # crc32 rather than hash(), which changes between processes
+                feature = feature_of[token] = zlib.crc32(token.encode('utf-8')) % n_features
+                terms.setdefault(feature, token)
+            doc_ids.append(row)
+            features.append(feature)
+    n_docs = len(kept)
+    if not n_docs:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), terms, kept
+
+    # One entry per distinct (document, feature) pair, already in CSR order
+    keys, counts = np.unique(np.array(doc_ids, dtype=np.int64) * n_features + np.array(features, dtype=np.int64),
+                             return_counts=True)
+    rows, indices = np.divmod(keys, n_features)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_docs))))
+    document_frequency = np.bincount(indices, minlength=n_features)
+    idf = np.log((1 + n_docs) / (1 + document_frequency)) + 1
+    data = (1 + np.log(counts)) * idf[indices]
+    norms = np.sqrt(np.add.reduceat(data ** 2, indptr[:-1]))
+    data /= np.repeat(norms, np.diff(indptr))
+    return indptr, indices, data, terms, kept
+
+
+def _gather(indptr, rows):
+    """CSR indptr and data positions for a subset of rows."""
+    lengths = indptr[rows + 1] - indptr[rows]
+    sub_indptr = np.concatenate(([0], np.cumsum(lengths)))
+    positions = np.repeat(indptr[rows] - sub_indptr[:-1], lengths) + np.arange(sub_indptr[-1])
+    return sub_indptr, positions
+
+
+def _similarity(sub_indptr, indices, data, centroids):
+    """(rows, k) dot products of CSR rows (none empty) with dense centroids."""
+    products = centroids[:, indices] * data
+    return np.add.reduceat(products, sub_indptr[:-1], axis=1).T
+
+
+def _normalize(centroids):
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids / np.where(norms > 0, norms, 1)
+
+
+def _init_centroids(indptr, indices, data, k, n_features, rng, sample_size=5000):
+    """k-means++ seeding on a random sample of rows."""
+    n_docs = len(indptr) - 1
+    sample = rng.choice(n_docs, size=min(n_docs, sample_size), replace=False)
+    sub_indptr, positions = _gather(indptr, sample)
+    sample_indices, sample_data = indices[positions], data[positions]
+    centroids = np.zeros((k, n_features))
+    chosen = [rng.randint(len(sample))]
+    distance = None
+    for j in range(k):
+        row = sample[chosen[-1]]
+        centroids[j, indices[indptr[row]:indptr[row + 1]]] = data[indptr[row]:indptr[row + 1]]
+        if j == k - 1:
+            break
+        # Squared distance between unit vectors is 2 - 2 * cosine
+        new_distance = np.maximum(2 - 2 * _similarity(sub_indptr, sample_indices, sample_data, centroids[j:j + 1])[:, 0], 0)
+        distance = new_distance if distance is None else np.minimum(distance, new_distance)
+        total = distance.sum()
+        chosen.append(rng.choice(len(sample), p=distance / total) if total > 0 else rng.randint(len(sample)))
+    return centroids
+
+
+def minibatch_kmeans(indptr, indices, data, k, n_features=N_FEATURES, batch_size=1024, iterations=None, seed=0):
+    """Spherical mini-batch k-means. Returns (labels, similarity to own centroid, centroids)."""
+    rng = np.random.RandomState(seed)
+    n_docs = len(indptr) - 1
+    centroids = _init_centroids(indptr, indices, data, k, n_features, rng)
+    counts = np.zeros(k)
+    if iterations is None:
+        iterations = min(300, max(20, 3 * n_docs // batch_size))
+    for _ in range(iterations):
+        batch = rng.randint(n_docs, size=min(batch_size, n_docs))
+        sub_indptr, positions = _gather(indptr, batch)
+        batch_indices, batch_data = indices[positions], data[positions]
+        labels = _similarity(sub_indptr, batch_indices, batch_data, centroids).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, (np.repeat(labels, np.diff(sub_indptr)), batch_indices), batch_data)
+        batch_counts = np.bincount(labels, minlength=k)
+        counts += batch_counts
+        # Per-centroid learning rate batch_count / total_count, as in Sculley (2010)
+        seen = counts > 0
+        rate = np.where(seen, batch_counts / np.where(seen, counts, 1), 0)
+        centroids = _normalize(centroids * (1 - rate)[:, None] + sums / np.where(seen, counts, 1)[:, None])
+
+    labels = np.empty(n_docs, dtype=np.int64)
+    best = np.empty(n_docs)
+    for start in range(0, n_docs, 4096):
+        stop = min(start + 4096, n_docs)
+        block_indptr = indptr[start:stop + 1] - indptr[start]
+        similarity = _similarity(block_indptr, indices[indptr[start]:indptr[stop]],
+                                 data[indptr[start]:indptr[stop]], centroids)
+        labels[start:stop] = similarity.argmax(axis=1)
+        best[start:stop] = similarity.max(axis=1)
+    return labels, best, centroids
+
+
+def default_k(n_docs):
+    return max(1, min(n_docs, 20, int(np.sqrt(n_docs / 2)) or 1))
+
+
+def _top(counter, n=3):
+    return [{'name': name, 'count': count} for name, count in counter.most_common(n)]
+
+
+def _location(row):
+    """(latitude, longitude) rounded to 0.1 degree, or None if either is missing or not a number."""
+    try:
+        # SQLite keeps text such as '' as-is in REAL columns
+        return round(float(row['latitude']), 1), round(float(row['longitude']), 1)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def cluster_complaints(complaints, k=None, seed=0):
+    """Clusters complaint dicts by their (redacted) description.
+
+    Returns (clusters, unclustered): cluster summaries, largest first, and
+    how many complaints had no usable terms.
+    """
+    indptr, indices, data, terms, kept = vectorize([complaint.get('description') for complaint in complaints])
+    if not kept:
+        return [], len(complaints)
+    k = min(k or default_k(len(kept)), len(kept))
+    labels, similarity, centroids = minibatch_kmeans(indptr, indices, data, k, seed=seed)
+
+    clusters = []
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        if not len(members):
+            continue
+        rows = [complaints[kept[member]] for member in members]
+        locations = Counter(location for location in map(_location, rows) if location is not None)
+        top_features = [feature for feature in np.argsort(centroids[cluster])[::-1][:10]
+                        if centroids[cluster, feature] > 0]
+        representative = members[np.argsort(similarity[members])[::-1][:5]]
+        clusters.append({
+            'size': len(members),
+            'top_terms': [terms[feature] for feature in top_features if feature in terms],
+            'departments': _top(Counter(row.get('department') or 'Unknown' for row in rows)),
+            'types': _top(Counter(row.get('type') or 'unknown' for row in rows)),
+            'locations': [{'latitude': lat, 'longitude': lng, 'count': count}
+                          for (lat, lng), count in locations.most_common(3)],
+            'complaint_ids': [complaints[kept[member]]['id'] for member in representative],
+        })
+    clusters.sort(key=lambda cluster: cluster['size'], reverse=True)
+    for number, cluster in enumerate(clusters, 1):
+        cluster['cluster'] = number
+    return clusters, len(complaints) - len(kept)
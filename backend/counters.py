@@ -0,0 +1,147 @@
+"""Trigger-maintained counters behind the /api/dashboard summary.
+
+Every counter is the sum of a per-row expression over one table, e.g.
+``status IS 'Resolved'`` over complaints. Insert, update and delete triggers
+add the new row's value and subtract the old row's value inside the writing
+transaction, so the dashboard reads a single row instead of scanning five
+tables. The same expressions recompute the counters from scratch:
+
+    python counters.py --check    # report drift between counters and tables
+    python counters.py --rebuild  # recompute the counters, then check again
+"""
+import argparse
+import sqlite3
+import sys
+
+from db import DB_PATH
+
+COUNTERS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS dashboard_counters
+                        (id INTEGER PRIMARY KEY CHECK (id = 1),
+                         total_complaints INTEGER NOT NULL DEFAULT 0,
+                         resolved_complaints INTEGER NOT NULL DEFAULT 0,
+                         in_progress_complaints INTEGER NOT NULL DEFAULT 0,
+                         submitted_complaints INTEGER NOT NULL DEFAULT 0,
+                         rewards_distributed INTEGER NOT NULL DEFAULT 0,
+                         most_wanted_count INTEGER NOT NULL DEFAULT 0,
+                         pending_reports INTEGER NOT NULL DEFAULT 0,
+                         feedback_count INTEGER NOT NULL DEFAULT 0,
+                         feedback_rating_sum INTEGER NOT NULL DEFAULT 0)'''
+
+# table -> (columns whose update can change a counter, {counter: per-row expression}).
+# "{row}" is NEW or OLD inside the triggers and the table itself when rebuilding.
+COUNTERS = {
+    'complaints': (('status',), {
+        'total_complaints': '1',
+        'resolved_complaints': "{row}.status IS 'Resolved'",
+        'in_progress_complaints': "{row}.status IS 'In Progress'",
+        'submitted_complaints': "{row}.status IS 'Submitted'",
+    }),
+    'rewards': (('status', 'amount'), {
+        'rewards_distributed': "CASE WHEN {row}.status IS 'Distributed' THEN COALESCE({row}.amount, 0) ELSE 0 END",
+    }),
+    'most_wanted': (('status',), {
+        'most_wanted_count': "{row}.status IS 'Active'",
+    }),
+    'community_reports': (('status',), {
+        'pending_reports': "{row}.status IS 'Pending'",
+    }),
+    'feedback': (('rating',), {
+        # AVG(rating) ignores NULL ratings, so the count does too
+        'feedback_count': '{row}.rating IS NOT NULL',
+        'feedback_rating_sum': 'COALESCE({row}.rating, 0)',
+    }),
+}
+
+COUNTER_NAMES = [name for _, counters in COUNTERS.values() for name in counters]
+
+
+def _deltas(counters, new, old):
+    """SET clause adding each counter's NEW value and/or subtracting its OLD value."""
+    parts = []
+    for name, expr in counters.items():
+        delta = f" + ({expr.format(row='NEW')})" if new else ''
+        delta += f" - ({expr.format(row='OLD')})" if old else ''
+        parts.append(f'{name} = {name}{delta}')
+    return ', '.join(parts)
+
+
+def trigger_sql():
+    """CREATE TRIGGER statements keeping dashboard_counters in step with each table."""
+    statements = []
+    for table, (watched, counters) in COUNTERS.items():
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_insert AFTER INSERT ON {table}
+            BEGIN UPDATE dashboard_counters SET {_deltas(counters, True, False)} WHERE id = 1; END''')
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_delete AFTER DELETE ON {table}
+            BEGIN UPDATE dashboard_counters SET {_deltas(counters, False, True)} WHERE id = 1; END''')
+        # Constant counters (row counts) never change on update
+        changing = {name: expr for name, expr in counters.items() if '{row}' in expr}
+        if changing:
+            statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_update
+                AFTER UPDATE OF {', '.join(watched)} ON {table}
+                BEGIN UPDATE dashboard_counters SET {_deltas(changing, True, True)} WHERE id = 1; END''')
+    return statements
+
+
+def install(c):
+    """Creates the counters table and its triggers, then fills it from the tables."""
+    c.execute(COUNTERS_TABLE_SQL)
+    c.execute('INSERT OR IGNORE INTO dashboard_counters (id) VALUES (1)')
+    for sql in trigger_sql():
+        c.execute(sql)
+    rebuild(c)
+
+
+def recompute(c):
+    """Counter values computed directly from the tables."""
+    values = {}
+    for table, (_, counters) in COUNTERS.items():
+        columns = ', '.join(f'COALESCE(SUM({expr.format(row=table)}), 0)' for expr in counters.values())
+        row = c.execute(f'SELECT {columns} FROM {table}').fetchone()
+        values.update(zip(counters, row))
+    return values
+
+
+def rebuild(c):
+    """Overwrites the stored counters with freshly computed values."""
+    values = recompute(c)
+    assignments = ', '.join(f'{name} = ?' for name in COUNTER_NAMES)
+    c.execute(f'UPDATE dashboard_counters SET {assignments} WHERE id = 1', [values[name] for name in COUNTER_NAMES])
+    return values
+
+
+def read(c):
+    row = c.execute(f"SELECT {', '.join(COUNTER_NAMES)} FROM dashboard_counters WHERE id = 1").fetchone()
+    return dict(zip(COUNTER_NAMES, row)) if row else dict.fromkeys(COUNTER_NAMES, 0)
+
+
+def drift(c):
+    """Returns {counter: (stored, actual)} for every counter that disagrees with its table."""
+    stored = read(c)
+    actual = recompute(c)
+    return {name: (stored[name], actual[name]) for name in COUNTER_NAMES if stored[name] != actual[name]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or rebuild the dashboard counters.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check', action='store_true', help='Report counters that drifted from their tables')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every counter from scratch')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        # The write lock keeps other writers (and their triggers) out until the new values are in
+        conn.execute('BEGIN IMMEDIATE')
+        before = drift(conn)
+        rebuild(conn)
+        conn.commit()
+        for name, (stored, actual) in before.items():
+            print(f"Rebuilt {name}: {stored} -> {actual}")
+        print(f"Rebuilt {len(COUNTER_NAMES)} counters ({len(before)} had drifted)")
+    problems = drift(conn)
+    for name, (stored, actual) in problems.items():
+        print(f"WARNING: {name} is {stored}, table says {actual}")
+    if args.check or args.rebuild:
+        print('Counters match their tables' if not problems else f'{len(problems)} counter(s) drifted')
+    conn.close()
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,133 @@
+"""Pooled, tuned SQLite connections for the application database.
+
+Connections are opened once, tuned, and reused across requests instead of
+being opened per route. The database runs in WAL mode so readers never wait
+for the single writer, and a busy timeout makes writers queue up instead of
+failing straight away with "database is locked".
+
+Routes borrow a connection with::
+
+    with get_db() as conn:
+        ...
+        conn.commit()
+
+Anything left uncommitted when the block exits is rolled back.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from query_log import TracingConnection
+
+# DATABASE_PATH points the app at another file, e.g. a benchmark's seeded copy
+DB_PATH = os.environ.get('DATABASE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
+
+BUSY_TIMEOUT_SECONDS = float(os.environ.get('DB_BUSY_TIMEOUT_SECONDS', 30))
+CACHED_STATEMENTS = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KIB = int(os.environ.get('DB_CACHE_SIZE_KIB', 16 * 1024))
+
+
+def connect(path=DB_PATH):
+    """Opens a single tuned connection, e.g. for a long-lived worker thread.
+
+    Its queries are counted and timed for /metrics, and traced by query_log.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, cached_statements=CACHED_STATEMENTS,
+                           check_same_thread=False, factory=TracingConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def enable_wal(path=DB_PATH):
+    """Switches the database to WAL mode. The setting is stored in the file."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+    finally:
+        conn.close()
+
+
+class ConnectionPool:
+    """A bounded pool of connections shared by request threads.
+
+    At most ``size`` connections are open; a thread that finds none free waits
+    up to ``timeout`` seconds for one to be released.
+    """
+
+    def __init__(self, path=DB_PATH, size=16, timeout=30):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._wal_checked = False
+
+    def _open(self):
+        if not self._wal_checked:
+            enable_wal(self.path)
+            self._wal_checked = True
+        return connect(self.path)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection became free within {self.timeout}s")
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped rather than handed to the next request
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+
+pool = ConnectionPool(size=int(os.environ.get('DB_POOL_SIZE', 16)))
+
+
+def get_db():
+    """Borrows a pooled connection for the duration of a ``with`` block."""
+    return pool.connection()
@@ -0,0 +1,327 @@
+"""Thumbnails, previews and metadata for evidence blobs.
+
+After an upload commits, an ``evidence.derive`` job (see app.py) runs
+``derive`` once per new blob and writes, next to it in the evidence store:
+
+- ``<sha256>.v1.thumb.jpg``: at most 320px, for list views;
+- ``<sha256>.v1.preview.jpg`` (or ``.png``): images re-encoded without EXIF,
+  GPS or other embedded metadata, and the first page of PDFs.
+
+It also extracts metadata such as dimensions, duration and page count. Every
+``evidence`` row for the blob records the derivative paths. The original blob
+is never rewritten, because its hash is the evidence's identity.
+
+Pillow, pdftoppm (poppler) and ffprobe are used when installed. Without
+Pillow, JPEG and PNG previews are copies with their metadata segments removed
+and no thumbnail is made. Dimensions and durations then come from the file
+headers.
+"""
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+
+from evidence_store import object_path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+VERSION = 'v1'
+THUMBNAIL_PX = 320
+PREVIEW_PX = 1600
+TOOL_TIMEOUT_SECONDS = 60
+
+DERIVATIVE_COLUMNS = {
+    'thumbnail_path': 'TEXT',
+    'preview_path': 'TEXT',
+    'metadata': 'TEXT',
+    'derivatives_status': 'TEXT',
+}
+
+# JPEG segments dropped from previews: APP1 (EXIF, XMP), APP13 (IPTC), comments
+_JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+# PNG chunks dropped from previews
+_PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+_PDF_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def install(c):
+    existing = {row[1] for row in c.execute('PRAGMA table_info(evidence)')}
+    for column, column_type in DERIVATIVE_COLUMNS.items():
+        if column not in existing:
+            c.execute(f'ALTER TABLE evidence ADD COLUMN {column} {column_type}')
+
+
+def derivative_path(sha256, name, extension='jpg'):
+    return f'{object_path(sha256)}.{VERSION}.{name}.{extension}'
+
+
+class _Output:
+    """Writes one derivative through a staging file and renames it into place."""
+
+    def __init__(self, root, relative):
+        self.target = os.path.join(root, relative)
+        self.relative = relative
+        fd, self.path = tempfile.mkstemp(dir=os.path.join(root, 'tmp'), prefix='derive-')
+        os.close(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            os.replace(self.path, self.target)
+        else:
+            os.unlink(self.path)
+
+
+def image_size(path):
+    """(width, height, format) read from a PNG, GIF or JPEG header, or None."""
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', head[16:24])
+            return width, height, 'PNG'
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            width, height = struct.unpack('<HH', head[6:10])
+            return width, height, 'GIF'
+        if not head.startswith(b'\xff\xd8'):
+            return None
+        f.seek(2)
+        try:
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                if 0xD0 <= marker[1] <= 0xD9 or marker[1] == 0x01:
+                    continue
+                length = struct.unpack('>H', f.read(2))[0]
+                # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack('>xHH', f.read(5))
+                    return width, height, 'JPEG'
+                f.seek(length - 2, os.SEEK_CUR)
+        except struct.error:
+            return None
+
+
+def strip_jpeg(src, dst):
+    """Copies a JPEG without its EXIF, XMP, IPTC and comment segments."""
+    if src.read(2) != b'\xff\xd8':
+        raise ValueError('not a JPEG file')
+    dst.write(b'\xff\xd8')
+    while True:
+        marker = src.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('truncated JPEG file')
+        if marker[1] == 0xDA:
+            # Start of scan: the rest is image data
+            dst.write(marker)
+            shutil.copyfileobj(src, dst)
+            return
+        if 0xD0 <= marker[1] <= 0xD9 or marker[1] == 0x01:
+            dst.write(marker)
+            continue
+        length = src.read(2)
+        body = src.read(struct.unpack('>H', length)[0] - 2)
+        if marker[1] not in _JPEG_METADATA_MARKERS:
+            dst.write(marker + length + body)
+
+
+def strip_png(src, dst):
+    """Copies a PNG without its EXIF, text and timestamp chunks."""
+    signature = src.read(8)
+    if signature != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('not a PNG file')
+    dst.write(signature)
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack('>I4s', header)
+        body = src.read(length + 4)  # data and CRC
+        if chunk_type not in _PNG_METADATA_CHUNKS:
+            dst.write(header + body)
+        if chunk_type == b'IEND':
+            return
+
+
+def mp4_duration(path):
+    """Duration in seconds from the mvhd box of an MP4/MOV file, or None."""
+    with open(path, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        position = 0
+        while position + 8 <= end:
+            f.seek(position)
+            size, box = struct.unpack('>I4s', f.read(8))
+            header = 8
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                header = 16
+            elif size == 0:
+                size = end - position
+            if size < header:
+                return None
+            if box == b'moov':
+                # Descend into the movie box
+                end = position + size
+                position += header
+                continue
+            if box == b'mvhd':
+                version = f.read(4)[0]
+                if version == 1:
+                    timescale, duration = struct.unpack('>16xIQ', f.read(28))
+                else:
+                    timescale, duration = struct.unpack('>8xII', f.read(16))
+                return round(duration / timescale, 3) if timescale else None
+            position += size
+    return None
+
+
+def ffprobe(path):
+    """Duration and video dimensions from ffprobe, or None if it is unavailable or fails."""
+    if not shutil.which('ffprobe'):
+        return None
+    try:
+        result = subprocess.run(['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format',
+                                 '-show_streams', path],
+                                capture_output=True, timeout=TOOL_TIMEOUT_SECONDS, check=True)
+        probe = json.loads(result.stdout)
+    except (subprocess.SubprocessError, ValueError) as e:
+        print(f"WARNING: ffprobe failed on {path}. {e}")
+        return None
+    metadata = {}
+    if probe.get('format', {}).get('duration'):
+        metadata['duration_seconds'] = round(float(probe['format']['duration']), 3)
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == 'video' and stream.get('width'):
+            metadata.update(width=stream['width'], height=stream['height'])
+            break
+    return metadata
+
+
+def _image(root, sha256, path, result):
+    metadata = result['metadata']
+    if Image is not None:
+        try:
+            with Image.open(path) as image:
+                metadata.update(width=image.width, height=image.height, format=image.format)
+                # Apply the EXIF orientation before the EXIF is dropped
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                for column, name, pixels, quality in (('preview_path', 'preview', PREVIEW_PX, 85),
+                                                      ('thumbnail_path', 'thumb', THUMBNAIL_PX, 80)):
+                    copy = image.copy()
+                    copy.thumbnail((pixels, pixels))
+                    with _Output(root, derivative_path(sha256, name)) as out:
+                        copy.save(out.path, 'JPEG', quality=quality, optimize=True)
+                    result[column] = out.relative
+            return
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"WARNING: could not render image {sha256}. {e}")
+
+    size = image_size(path)
+    if size is None:
+        return
+    width, height, image_format = size
+    metadata.update(width=width, height=height, format=image_format)
+    strip = {'JPEG': (strip_jpeg, 'jpg'), 'PNG': (strip_png, 'png')}.get(image_format)
+    if strip is None:
+        return
+    function, extension = strip
+    try:
+        with _Output(root, derivative_path(sha256, 'preview', extension)) as out, \
+                open(path, 'rb') as src, open(out.path, 'wb') as dst:
+            function(src, dst)
+        result['preview_path'] = out.relative
+    except (ValueError, struct.error) as e:
+        print(f"WARNING: could not strip metadata from image {sha256}. {e}")
+
+
+def _pdf(root, sha256, path, result):
+    with open(path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                result['metadata']['pages'] = len(_PDF_PAGE.findall(data))
+        except ValueError:
+            # Empty file
+            return
+    if not shutil.which('pdftoppm'):
+        return
+    for column, name, pixels in (('preview_path', 'preview', PREVIEW_PX), ('thumbnail_path', 'thumb', THUMBNAIL_PX)):
+        output = _Output(root, derivative_path(sha256, name))
+        try:
+            with output:
+                # pdftoppm appends the extension to the output prefix
+                subprocess.run(['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-jpeg',
+                                '-scale-to', str(pixels), path, output.path],
+                               capture_output=True, timeout=TOOL_TIMEOUT_SECONDS, check=True)
+                os.replace(output.path + '.jpg', output.path)
+            result[column] = output.relative
+        except (subprocess.SubprocessError, OSError) as e:
+            if os.path.exists(output.path + '.jpg'):
+                os.unlink(output.path + '.jpg')
+            print(f"WARNING: pdftoppm could not render PDF {sha256}. {e}")
+            return
+
+
+def _media(path, content_type, metadata):
+    probed = ffprobe(path)
+    if probed is not None:
+        metadata.update(probed)
+        return
+    if content_type in ('audio/x-wav', 'audio/wav'):
+        try:
+            with wave.open(path) as audio:
+                metadata['duration_seconds'] = round(audio.getnframes() / audio.getframerate(), 3)
+        except (wave.Error, EOFError) as e:
+            print(f"WARNING: could not read WAV header of {path}. {e}")
+    elif content_type in ('video/mp4', 'video/quicktime', 'audio/mp4'):
+        try:
+            duration = mp4_duration(path)
+        except struct.error:
+            duration = None
+        if duration is not None:
+            metadata['duration_seconds'] = duration
+
+
+def derive(root, sha256, content_type):
+    """Makes the derivatives of one blob. Returns {thumbnail_path, preview_path, metadata}."""
+    path = os.path.join(root, object_path(sha256))
+    result = {'thumbnail_path': None, 'preview_path': None,
+              'metadata': {'size': os.path.getsize(path), 'content_type': content_type}}
+    if content_type.startswith('image/'):
+        _image(root, sha256, path, result)
+    elif content_type == 'application/pdf':
+        _pdf(root, sha256, path, result)
+    elif content_type.startswith(('video/', 'audio/')):
+        _media(path, content_type, result['metadata'])
+    return result
+
+
+def record(c, sha256, result):
+    """Stores a blob's derivatives on every evidence row that points at it."""
+    c.execute('''UPDATE evidence SET thumbnail_path = ?, preview_path = ?, metadata = ?, derivatives_status = 'done'
+                 WHERE sha256 = ?''',
+              (result['thumbnail_path'], result['preview_path'], json.dumps(result['metadata']), sha256))
+
+
+def reuse(c, evidence_id, sha256):
+    """Copies derivatives already made for the same blob onto a new row.
+
+    Returns False, marking the row pending, if there are none yet.
+    """
+    done = c.execute('''SELECT thumbnail_path, preview_path, metadata FROM evidence
+                        WHERE sha256 = ? AND derivatives_status = 'done' LIMIT 1''', (sha256,)).fetchone()
+    if done is None:
+        c.execute("UPDATE evidence SET derivatives_status = 'pending' WHERE id = ?", (evidence_id,))
+        return False
+    c.execute('''UPDATE evidence SET thumbnail_path = ?, preview_path = ?, metadata = ?, derivatives_status = 'done'
+                 WHERE id = ?''', (*done, evidence_id))
+    return True
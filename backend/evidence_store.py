@@ -0,0 +1,361 @@
+"""Content-addressed storage for uploaded evidence files.
+
+Multipart file parts are written straight to a staging file under
+``uploads/tmp`` while the request body is parsed, 64 KiB at a time, with the
+SHA-256 computed on the way. Nothing larger than one chunk is held in memory.
+A finished upload is renamed atomically to ``uploads/objects/ab/cd/<sha256>``.
+If that object already exists, the staging file is dropped instead, so
+identical files are stored once however many complaints attach them.
+
+Each ``evidence`` row names its blob by hash. Triggers keep
+``evidence_blobs.ref_count`` equal to the number of rows pointing at each blob,
+and blobs that reach zero are removed by the garbage collector:
+
+    python evidence_store.py --check  # report ref counts that drifted
+    python evidence_store.py --gc     # delete unreferenced blobs and stale staging files
+"""
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Request, Response, request, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from db import DB_PATH
+
+CHUNK_SIZE = 64 * 1024
+# Blobs and staging files younger than this are never collected, which covers
+# uploads that are on disk but whose evidence rows are not committed yet
+GC_GRACE_SECONDS = 3600
+
+# Types served inline; anything else is stored as a download
+INLINE_TYPES = ('image/', 'video/', 'audio/', 'application/pdf', 'text/plain')
+
+# A blob, or one of its derivatives (see derivatives.py) stored next to it
+BLOB_PATH = re.compile(r'objects/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.v[0-9]+\.[a-z]+\.(?:jpg|png))?')
+DERIVATIVE_TYPES = {'.jpg': 'image/jpeg', '.png': 'image/png'}
+# A blob's bytes never change under its URL, so browsers may keep it without
+# revalidating. "private" keeps evidence out of shared caches.
+BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+SENDFILE_MODES = ('x-sendfile', 'x-accel-redirect')
+
+BLOBS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS evidence_blobs
+                     (sha256 TEXT PRIMARY KEY,
+                      size INTEGER NOT NULL,
+                      content_type TEXT,
+                      path TEXT NOT NULL,
+                      ref_count INTEGER NOT NULL DEFAULT 0,
+                      created_at TIMESTAMP) WITHOUT ROWID'''
+
+EVIDENCE_COLUMNS = {
+    'sha256': 'TEXT',
+    'size': 'INTEGER',
+    'original_name': 'TEXT',
+    'content_type': 'TEXT',
+}
+
+TRIGGERS_SQL = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_evidence_blobs_insert AFTER INSERT ON evidence
+       WHEN NEW.sha256 IS NOT NULL
+       BEGIN UPDATE evidence_blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_evidence_blobs_delete AFTER DELETE ON evidence
+       WHEN OLD.sha256 IS NOT NULL
+       BEGIN UPDATE evidence_blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_evidence_blobs_update AFTER UPDATE OF sha256 ON evidence
+       WHEN OLD.sha256 IS NOT NEW.sha256
+       BEGIN
+           UPDATE evidence_blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;
+           UPDATE evidence_blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;
+       END''',
+]
+
+
+def content_type_for(filename):
+    """Content type guessed from the file name, restricted to types that are safe inline.
+
+    The client's own Content-Type is ignored: serving an upload as text/html
+    from this origin would let it run scripts.
+    """
+    guessed = mimetypes.guess_type(filename or '')[0]
+    if guessed and guessed.startswith(INLINE_TYPES):
+        return guessed
+    return 'application/octet-stream'
+
+
+def object_path(sha256):
+    """Path of a blob relative to the upload folder, sharded on the first two bytes."""
+    return f'objects/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def parse_blob_path(relative):
+    """(sha256, derivative suffix or None) for a blob or derivative path, else None."""
+    match = BLOB_PATH.fullmatch(relative)
+    return match.groups() if match else None
+
+
+def blob_hash(relative):
+    """The SHA-256 named by a blob path, or None if ``relative`` is not an original blob."""
+    parsed = parse_blob_path(relative)
+    return parsed[0] if parsed and parsed[1] is None else None
+
+
+class StagedFile:
+    """A file part being written to the staging directory and hashed as it arrives.
+
+    Werkzeug's form parser calls ``write`` for every chunk of the part. Past
+    ``max_bytes`` the staging file is removed and the request fails with 413.
+    Closing a staged file that was never committed removes it as well.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"Evidence files are limited to {self.max_bytes} bytes each")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read, seek, tell and friends come from the underlying file
+        return getattr(self._file, name)
+
+    def close(self):
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class EvidenceStore:
+    """Blobs under ``root``.
+
+    ``sendfile`` picks who sends blob bytes: None streams them from this
+    process; 'x-sendfile' (Apache, lighttpd) or 'x-accel-redirect' (nginx,
+    under the internal location ``accel_prefix``) hand the file to the fronting
+    proxy, which copies it to the socket itself and handles Range requests.
+    """
+
+    def __init__(self, root, max_file_bytes=None, sendfile=None, accel_prefix='/protected-uploads/'):
+        if sendfile and sendfile not in SENDFILE_MODES:
+            raise ValueError(f"sendfile must be one of {SENDFILE_MODES}, not {sendfile!r}")
+        self.root = root
+        self.staging = os.path.join(root, 'tmp')
+        self.max_file_bytes = max_file_bytes
+        self.sendfile = sendfile or None
+        self.accel_prefix = accel_prefix.rstrip('/') + '/'
+
+    def ensure_dirs(self):
+        os.makedirs(self.staging, exist_ok=True)
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+    def stage(self):
+        return StagedFile(self.staging, self.max_file_bytes)
+
+    def commit(self, staged):
+        """Moves a fully written staged file to its content address.
+
+        Returns (sha256, size, path relative to the store root).
+        """
+        sha256 = staged.hexdigest()
+        relative = object_path(sha256)
+        target = os.path.join(self.root, relative)
+        staged.flush()
+        if os.path.exists(target):
+            # Already stored. Touching it keeps the collector off it until our row commits.
+            os.utime(target)
+            staged.close()
+        else:
+            os.fsync(staged.fileno())
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(staged.path, target)
+            staged.path = None
+            staged.close()
+        return sha256, staged.size, relative
+
+    def save(self, c, complaint_id, file):
+        """Stores one uploaded FileStorage and records it as evidence for the complaint.
+
+        Returns (evidence id, sha256).
+        """
+        stream = file.stream
+        if not isinstance(stream, StagedFile):
+            # Not parsed by StreamingRequest (e.g. a test client body); stream it through a staging file
+            staged = self.stage()
+            try:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    staged.write(chunk)
+            except BaseException:
+                staged.close()
+                raise
+            stream = staged
+        sha256, size, relative = self.commit(stream)
+        content_type = content_type_for(file.filename)
+        c.execute('''INSERT INTO evidence_blobs (sha256, size, content_type, path, created_at)
+                     VALUES (?, ?, ?, ?, ?) ON CONFLICT (sha256) DO NOTHING''',
+                  (sha256, size, content_type, relative, datetime.now()))
+        c.execute('''INSERT INTO evidence (complaint_id, file_path, sha256, size, original_name, content_type)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  (complaint_id, relative, sha256, size, os.path.basename(file.filename or ''), content_type))
+        return c.lastrowid, sha256
+
+    def not_modified(self, sha256, derivative=None):
+        """A 304 response if the client already holds this blob (or derivative), else None.
+
+        The ETag is the content hash from the URL, so this needs neither the
+        database nor the disk.
+        """
+        etag = sha256 + (derivative or '')
+        if etag not in request.if_none_match:
+            return None
+        response = Response(status=304)
+        return self._blob_headers(response, etag)
+
+    def send(self, sha256, content_type, derivative=None):
+        """Response for one blob or derivative, with a strong ETag and single-range (206) support."""
+        relative = object_path(sha256) + (derivative or '')
+        etag = sha256 + (derivative or '')
+        if derivative:
+            content_type = DERIVATIVE_TYPES[os.path.splitext(derivative)[1]]
+        if self.sendfile == 'x-accel-redirect':
+            response = Response(mimetype=content_type)
+            response.headers['X-Accel-Redirect'] = self.accel_prefix + relative
+            return self._blob_headers(response, etag)
+        if self.sendfile == 'x-sendfile':
+            response = Response(mimetype=content_type)
+            response.headers['X-Sendfile'] = os.path.join(self.root, relative)
+            return self._blob_headers(response, etag)
+
+        response = send_file(os.path.join(self.root, relative), mimetype=content_type,
+                             etag=False, conditional=False)
+        self._blob_headers(response, etag)
+        # Handles If-None-Match, If-Range and Range against the strong ETag
+        return response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+    @staticmethod
+    def _blob_headers(response, etag):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = BLOB_CACHE_CONTROL
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    def request_class(self):
+        """A Flask Request class whose file uploads stream into this store."""
+        store = self
+
+        class StreamingRequest(Request):
+            def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+                staged = store.stage()
+                self.__dict__.setdefault('_staged_files', []).append(staged)
+                return staged
+
+            def close(self):
+                super().close()
+                # Also covers parts left behind when parsing stopped half-way, e.g. on a 413
+                for staged in self.__dict__.pop('_staged_files', ()):
+                    staged.close()
+
+        return StreamingRequest
+
+    def collect(self, c, grace_seconds=GC_GRACE_SECONDS):
+        """Deletes unreferenced blobs and stale staging files. Returns (blobs, staging files) removed.
+
+        Run inside BEGIN IMMEDIATE so no upload can re-reference a blob while it is removed.
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for sha256, relative in c.execute('SELECT sha256, path FROM evidence_blobs WHERE ref_count <= 0').fetchall():
+            target = os.path.join(self.root, relative)
+            try:
+                if os.path.getmtime(target) > cutoff:
+                    continue
+                os.unlink(target)
+            except FileNotFoundError:
+                pass
+            # Thumbnails and previews live next to the blob
+            if os.path.isdir(os.path.dirname(target)):
+                for entry in os.scandir(os.path.dirname(target)):
+                    if entry.name.startswith(sha256 + '.'):
+                        os.unlink(entry.path)
+            c.execute('DELETE FROM evidence_blobs WHERE sha256 = ? AND ref_count <= 0', (sha256,))
+            removed += 1
+
+        stale = 0
+        if os.path.isdir(self.staging):
+            for entry in os.scandir(self.staging):
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    stale += 1
+        return removed, stale
+
+
+def install(c):
+    """Adds the hash columns to evidence and creates the blob table with its ref-count triggers."""
+    existing = {row[1] for row in c.execute('PRAGMA table_info(evidence)')}
+    for column, column_type in EVIDENCE_COLUMNS.items():
+        if column not in existing:
+            c.execute(f'ALTER TABLE evidence ADD COLUMN {column} {column_type}')
+    c.execute(BLOBS_TABLE_SQL)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_evidence_sha256 ON evidence (sha256) WHERE sha256 IS NOT NULL')
+    for sql in TRIGGERS_SQL:
+        c.execute(sql)
+    rebuild(c)
+
+
+def rebuild(c):
+    """Recomputes every blob's ref_count from the evidence rows."""
+    c.execute('''UPDATE evidence_blobs SET ref_count =
+                 (SELECT COUNT(*) FROM evidence WHERE evidence.sha256 = evidence_blobs.sha256)''')
+
+
+def drift(c):
+    """Returns {sha256: (stored, actual)} for every blob whose ref_count is wrong."""
+    rows = c.execute('''SELECT b.sha256, b.ref_count,
+                               (SELECT COUNT(*) FROM evidence e WHERE e.sha256 = b.sha256)
+                        FROM evidence_blobs b''').fetchall()
+    return {sha256: (stored, actual) for sha256, stored, actual in rows if stored != actual}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check evidence ref counts or collect unreferenced blobs.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--uploads', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    parser.add_argument('--check', action='store_true', help='Report blobs whose ref_count drifted')
+    parser.add_argument('--gc', action='store_true', help='Delete unreferenced blobs and stale staging files')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    problems = drift(conn)
+    for sha256, (stored, actual) in problems.items():
+        print(f"WARNING: blob {sha256} has ref_count {stored}, evidence says {actual}")
+    if args.gc:
+        if problems:
+            print('ERROR: not collecting while ref counts have drifted; fix them first')
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            blobs, staged = EvidenceStore(args.uploads).collect(conn)
+            conn.commit()
+            print(f"Removed {blobs} unreferenced blob(s) and {staged} stale staging file(s)")
+    elif args.check:
+        print('Ref counts match the evidence table' if not problems else f'{len(problems)} blob(s) drifted')
+    conn.close()
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,88 @@
+"""Map-reduce systemic flaw analysis for complaint sets too large for one prompt.
+
+Complaints are partitioned by department, type and time window. Each
+partition becomes one or more text chunks under a size budget. Chunks are
+summarised in parallel (map), and the summaries are merged until they fit in
+one prompt, which produces the final flaw report (reduce).
+
+Partitions and the rows inside them are always serialised in the same order.
+An unchanged partition therefore yields byte-identical chunks, and a cache
+keyed by chunk text only re-summarises the partitions that changed.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+
+def _window(created_at, window_days):
+    """(first day, last day) of the window holding created_at, or None if it has no date."""
+    try:
+        day = date.fromisoformat(str(created_at)[:10]).toordinal()
+    except ValueError:
+        return None
+    start = day - day % window_days
+    return date.fromordinal(start).isoformat(), date.fromordinal(start + window_days - 1).isoformat()
+
+
+def partition(complaints, window_days=30):
+    """Groups complaint dicts by (department, type, window), in a stable order."""
+    groups = defaultdict(list)
+    for complaint in complaints:
+        key = (complaint.get('department') or 'Unknown', complaint.get('type') or 'unknown',
+               _window(complaint.get('created_at'), window_days))
+        groups[key].append(complaint)
+    ordered = sorted(groups.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or ('', '')))
+    for _, rows in ordered:
+        rows.sort(key=lambda complaint: (str(complaint.get('created_at')), complaint.get('id') or 0))
+    return ordered
+
+
+def _header(key, part, parts):
+    department, complaint_type, window = key
+    period = f"{window[0]} to {window[1]}" if window else 'unknown dates'
+    suffix = f" (part {part} of {parts})" if parts > 1 else ''
+    return f"Department: {department}; complaint type: {complaint_type}; period: {period}{suffix}"
+
+
+def chunks(complaints, window_days=30, max_chars=12000):
+    """Serialises each partition into chunks of at most about ``max_chars`` characters."""
+    texts = []
+    for key, rows in partition(complaints, window_days):
+        lines = [f"- [{complaint.get('status')}] {' '.join(str(complaint.get('description')).split())}"
+                 for complaint in rows]
+        batches, batch, size = [], [], 0
+        for line in lines:
+            if batch and size + len(line) > max_chars:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(line)
+            size += len(line) + 1
+        batches.append(batch)
+        for part, batch in enumerate(batches, 1):
+            texts.append(_header(key, part, len(batches)) + '\n' + '\n'.join(batch))
+    return texts
+
+
+def map_reduce(texts, summarize, reduce, max_chars=12000, concurrency=4):
+    """Summarises ``texts`` in parallel, merges the summaries until they fit
+    ``max_chars``, then returns ``reduce(summaries)``.
+
+    ``summarize`` and ``reduce`` take one string; an exception from either
+    propagates to the caller once the running calls finish.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        summaries = list(executor.map(summarize, texts))
+        while len(summaries) > 1 and sum(len(summary) + 2 for summary in summaries) > max_chars:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                if group and size + len(summary) > max_chars:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += len(summary) + 2
+            groups.append(group)
+            if len(groups) == len(summaries):
+                # Every summary alone fills the budget; merging pairs still makes progress
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            summaries = list(executor.map(summarize, ['\n\n'.join(group) for group in groups]))
+    return reduce('\n\n'.join(summaries))
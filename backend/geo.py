@@ -0,0 +1,275 @@
+"""R*Tree spatial index and viewport queries for the corruption map.
+
+``complaints_rtree`` holds one degenerate box (a point) per geotagged
+complaint. Triggers keep it in step with complaints.latitude/longitude, so a
+map viewport is an R*Tree range search rather than a table scan.
+
+Zoomed out, complaints in the viewport are counted per grid cell. A cell is
+about a quarter of a map tile wide at the requested zoom, and lone complaints
+come back as points. Zoomed in, slim point records are returned directly.
+
+A whole-country viewport matches every row, so the R*Tree alone doesn't help
+there. ``complaint_geo_cells`` therefore keeps per-zoom cell counts and
+coordinate sums, also trigger-maintained. An unfiltered grid query reads only
+the cells in view. Filtered views group the R*Tree matches instead.
+"""
+import json
+import math
+
+from pagination import BadQueryParameter
+
+RTREE_SQL = '''CREATE VIRTUAL TABLE IF NOT EXISTS complaints_rtree
+               USING rtree(id, min_lat, max_lat, min_lng, max_lng)'''
+
+TRIGGERS_SQL = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_rtree_complaints_insert AFTER INSERT ON complaints
+       WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+       BEGIN
+           INSERT INTO complaints_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_rtree_complaints_update AFTER UPDATE OF latitude, longitude ON complaints
+       BEGIN
+           DELETE FROM complaints_rtree WHERE id = OLD.id;
+           INSERT INTO complaints_rtree
+               SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+               WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_rtree_complaints_delete AFTER DELETE ON complaints
+       BEGIN
+           DELETE FROM complaints_rtree WHERE id = OLD.id;
+       END''',
+]
+
+# At this zoom and above the map gets individual points
+POINTS_MIN_ZOOM = 15
+# Grid cells per map tile width; tiles are 256px, so cells are about 64px
+CELLS_PER_TILE = 4
+# Zoom levels with pre-aggregated cells
+GRID_ZOOMS = range(POINTS_MIN_ZOOM)
+# Most lone-complaint cells looked up as points per grid response
+MAX_SINGLE_LOOKUPS = 500
+
+CELLS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS complaint_geo_cells
+                     (zoom INTEGER NOT NULL,
+                      cell_y INTEGER NOT NULL,
+                      cell_x INTEGER NOT NULL,
+                      count INTEGER NOT NULL,
+                      lat_sum REAL NOT NULL,
+                      lng_sum REAL NOT NULL,
+                      PRIMARY KEY (zoom, cell_y, cell_x)) WITHOUT ROWID'''
+# Most points returned for one viewport
+MAX_POINTS = 5000
+
+POINT_COLUMNS = 'c.id, c.latitude, c.longitude, c.type, c.status, c.created_at'
+
+
+def cell_size(zoom):
+    """Grid cell width in degrees at ``zoom``."""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def _cell_offset(zoom):
+    # CAST truncates toward zero; shifting every cell index positive makes it floor()
+    return math.ceil(180 / cell_size(zoom)) + 1
+
+
+def cell_index(value, zoom):
+    """Grid cell of a latitude or longitude, computed exactly as the SQL does."""
+    return int(value / cell_size(zoom) + _cell_offset(zoom))
+
+
+def _cell_sql(column, zoom):
+    return f'CAST({column} / {cell_size(zoom)!r} + {_cell_offset(zoom)} AS INTEGER)'
+
+
+def cell_trigger_sql():
+    """Triggers keeping complaint_geo_cells in step with complaint coordinates."""
+    def add(row):
+        return [f'''INSERT INTO complaint_geo_cells
+                       SELECT {zoom}, {_cell_sql(f'{row}.latitude', zoom)}, {_cell_sql(f'{row}.longitude', zoom)},
+                              1, {row}.latitude, {row}.longitude
+                       WHERE {row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL
+                       ON CONFLICT (zoom, cell_y, cell_x) DO UPDATE SET
+                           count = count + 1, lat_sum = lat_sum + excluded.lat_sum,
+                           lng_sum = lng_sum + excluded.lng_sum;''' for zoom in GRID_ZOOMS]
+
+    def remove(row):
+        # Emptied cells stay behind with count 0; queries skip them
+        return [f'''UPDATE complaint_geo_cells
+                       SET count = count - 1, lat_sum = lat_sum - {row}.latitude, lng_sum = lng_sum - {row}.longitude
+                       WHERE zoom = {zoom} AND cell_y = {_cell_sql(f'{row}.latitude', zoom)}
+                         AND cell_x = {_cell_sql(f'{row}.longitude', zoom)};''' for zoom in GRID_ZOOMS]
+
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_geo_cells_complaints_insert AFTER INSERT ON complaints
+            WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+            BEGIN {' '.join(add('NEW'))} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_geo_cells_complaints_update AFTER UPDATE OF latitude, longitude ON complaints
+            BEGIN {' '.join(remove('OLD') + add('NEW'))} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_geo_cells_complaints_delete AFTER DELETE ON complaints
+            WHEN OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL
+            BEGIN {' '.join(remove('OLD'))} END''',
+    ]
+
+
+def install(c):
+    c.execute(RTREE_SQL)
+    c.execute(CELLS_TABLE_SQL)
+    for sql in TRIGGERS_SQL + cell_trigger_sql():
+        c.execute(sql)
+    rebuild(c)
+
+
+def rebuild(c):
+    """Refills the R*Tree and the grid cells from complaints."""
+    c.execute('DELETE FROM complaints_rtree')
+    c.execute('''INSERT INTO complaints_rtree
+                 SELECT id, latitude, latitude, longitude, longitude FROM complaints
+                 WHERE latitude IS NOT NULL AND longitude IS NOT NULL''')
+    c.execute('DELETE FROM complaint_geo_cells')
+    for zoom in GRID_ZOOMS:
+        c.execute(f'''INSERT INTO complaint_geo_cells
+                      SELECT {zoom}, {_cell_sql('latitude', zoom)} AS cell_y, {_cell_sql('longitude', zoom)} AS cell_x,
+                             COUNT(*), SUM(latitude), SUM(longitude)
+                      FROM complaints WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                      GROUP BY cell_y, cell_x''')
+
+
+def parse_bbox(value):
+    """'west,south,east,north' in degrees (Leaflet's toBBoxString order)."""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise BadQueryParameter('bbox must be west,south,east,north')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise BadQueryParameter('bbox is out of range')
+    return west, south, east, north
+
+
+def parse_zoom(value):
+    try:
+        zoom = int(value)
+    except (TypeError, ValueError):
+        raise BadQueryParameter('zoom must be an integer')
+    if not 0 <= zoom <= 22:
+        raise BadQueryParameter('zoom must be between 0 and 22')
+    return zoom
+
+
+def _lng_ranges(west, east):
+    # A viewport across the antimeridian comes in with west > east
+    return [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+
+def _search(bbox, where, params, join=False):
+    """FROM/WHERE clause and parameters for the rows inside ``bbox`` matching ``where``."""
+    west, south, east, north = bbox
+    ranges = _lng_ranges(west, east)
+    clauses = ['r.min_lat <= ? AND r.max_lat >= ?',
+               '(' + ' OR '.join('(r.min_lng <= ? AND r.max_lng >= ?)' for _ in ranges) + ')']
+    values = [north, south] + [bound for low, high in ranges for bound in (high, low)]
+    sql = 'FROM complaints_rtree r'
+    # Unfiltered counts never touch the complaints table. CROSS JOIN keeps the
+    # R*Tree as the outer loop; otherwise a filter index can win and probe the tree per row.
+    if join or where:
+        sql += ' CROSS JOIN complaints c ON c.id = r.id'
+    clauses += where
+    values += params
+    return f"{sql} WHERE {' AND '.join(clauses)}", values
+
+
+def _table_search(bbox, where, params):
+    """Like _search, but reading complaints directly (through a filter index, if any)."""
+    west, south, east, north = bbox
+    ranges = _lng_ranges(west, east)
+    clauses = ['c.latitude BETWEEN ? AND ?',
+               '(' + ' OR '.join('c.longitude BETWEEN ? AND ?' for _ in ranges) + ')'] + where
+    values = [south, north] + [bound for bounds in ranges for bound in bounds] + params
+    return f"FROM complaints c WHERE {' AND '.join(clauses)}", values
+
+
+def _estimate(c, bbox):
+    """(complaints in view, all geotagged complaints), from the coarse stored cells."""
+    in_view = sum(count for count, _, _ in _stored_cells(c, bbox, 2))
+    total = c.execute('SELECT COALESCE(SUM(count), 0) FROM complaint_geo_cells WHERE zoom = 0').fetchone()[0]
+    return in_view, total
+
+
+def points(c, bbox, where=(), params=(), limit=MAX_POINTS):
+    """Slim records of the complaints inside ``bbox``, at most ``limit``. Returns (points, truncated)."""
+    return _points_limited(c, bbox, list(where), list(params), limit)
+
+
+def grid(c, bbox, zoom, where=(), params=()):
+    """Complaint counts per grid cell inside ``bbox``. Returns (clusters, points).
+
+    Cells holding a single complaint are returned as points instead.
+    """
+    if where:
+        cells = _scan_cells(c, bbox, zoom, list(where), list(params))
+    else:
+        cells = _stored_cells(c, bbox, zoom)
+    clusters, singles = [], []
+    for count, latitude, longitude in cells:
+        if count == 1 and len(singles) < MAX_SINGLE_LOOKUPS:
+            singles.append((latitude, longitude))
+        else:
+            clusters.append({'latitude': latitude, 'longitude': longitude, 'count': count})
+    return clusters, _points_at(c, singles, list(where), list(params))
+
+
+def _stored_cells(c, bbox, zoom):
+    west, south, east, north = bbox
+    cells = []
+    for low, high in _lng_ranges(west, east):
+        c.execute('''SELECT count, lat_sum / count, lng_sum / count FROM complaint_geo_cells
+                     WHERE zoom = ? AND cell_y BETWEEN ? AND ? AND cell_x BETWEEN ? AND ? AND count > 0''',
+                  (zoom, cell_index(south, zoom), cell_index(north, zoom), cell_index(low, zoom), cell_index(high, zoom)))
+        cells.extend(tuple(row) for row in c.fetchall())
+    return cells
+
+
+def _scan_cells(c, bbox, zoom, where, params):
+    in_view, total = _estimate(c, bbox)
+    if in_view * 4 > total:
+        # Most of the map is in view: probing the R*Tree costs more than reading the table
+        search, values = _table_search(bbox, where, params)
+        latitude, longitude = 'c.latitude', 'c.longitude'
+    else:
+        search, values = _search(bbox, where, params)
+        latitude, longitude = 'r.min_lat', 'r.min_lng'
+    c.execute(f'''SELECT COUNT(*), AVG({latitude}), AVG({longitude}) {search}
+                  GROUP BY {_cell_sql(latitude, zoom)}, {_cell_sql(longitude, zoom)}''', values)
+    return [tuple(row) for row in c.fetchall()]
+
+
+def _points_at(c, positions, where, params):
+    """Point records for lone complaints, found by a tiny R*Tree box around each position.
+
+    The positions go in as one JSON array, so all the lookups are one statement.
+    """
+    if not positions:
+        return []
+    # The R*Tree stores 32-bit floats, so search a box slightly larger than the point
+    c.execute(f'''SELECT p.key AS position, {POINT_COLUMNS}
+                  FROM (SELECT key, json_extract(value, '$[0]') AS lat, json_extract(value, '$[1]') AS lng
+                        FROM json_each(?)) p
+                  CROSS JOIN complaints_rtree r
+                      ON r.min_lat <= p.lat + 1e-5 AND r.max_lat >= p.lat - 1e-5
+                     AND r.min_lng <= p.lng + 1e-5 AND r.max_lng >= p.lng - 1e-5
+                  CROSS JOIN complaints c ON c.id = r.id
+                  {'WHERE ' + ' AND '.join(where) if where else ''}''',
+              [json.dumps(positions)] + params)
+    points = {}
+    for row in c.fetchall():
+        point = dict(row)
+        # A neighbour just across the cell edge can fall in the same box; keep one per position
+        points.setdefault(point.pop('position'), point)
+    return [points[position] for position in sorted(points)]
+
+
+def _points_limited(c, bbox, where, params, limit):
+    search, values = _search(bbox, where, params, join=True)
+    c.execute(f'SELECT {POINT_COLUMNS} {search} LIMIT ?', values + [limit + 1])
+    rows = [dict(row) for row in c.fetchall()]
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,171 @@
+"""Durable job queue backed by the application's SQLite database.
+
+Jobs are rows in the ``jobs`` table, so they survive restarts and can be
+drained by any number of worker threads (or processes) sharing the database.
+A job is claimed under a lease; if a worker dies mid-job the lease expires and
+another worker picks it up again.
+"""
+import json
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime
+
+JOBS_TABLE_SQL = '''CREATE TABLE jobs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      kind TEXT NOT NULL,
+                      payload TEXT,
+                      status TEXT NOT NULL DEFAULT 'queued',
+                      attempts INTEGER NOT NULL DEFAULT 0,
+                      run_after REAL NOT NULL,
+                      locked_until REAL,
+                      last_error TEXT,
+                      created_at TIMESTAMP,
+                      updated_at TIMESTAMP)'''
+
+JOBS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, run_after)'
+
+
+def enqueue(c, kind, payload, delay=0):
+    """Adds a job using the caller's cursor, inside the caller's transaction."""
+    now = datetime.now()
+    c.execute('''INSERT INTO jobs (kind, payload, status, run_after, created_at, updated_at)
+                 VALUES (?, ?, 'queued', ?, ?, ?)''',
+              (kind, json.dumps(payload), time.time() + delay, now, now))
+    return c.lastrowid
+
+
+class JobQueue:
+    def __init__(self, connect, lease_seconds=300, max_attempts=5, backoff_seconds=2):
+        self.connect = connect
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._wakeup = threading.Event()
+
+    def wakeup(self):
+        """Tells idle workers in this process that new jobs were committed."""
+        self._wakeup.set()
+
+    def wait(self, timeout):
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def claim(self, conn):
+        """Leases the oldest runnable job, or returns None if there is nothing to do."""
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('''SELECT * FROM jobs
+                                  WHERE (status = 'queued' AND run_after <= ?)
+                                     OR (status = 'running' AND locked_until < ?)
+                                  ORDER BY id LIMIT 1''', (now, now)).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute('''UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                            locked_until = ?, updated_at = ? WHERE id = ?''',
+                         (now + self.lease_seconds, datetime.now(), row['id']))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        job = dict(row)
+        job['attempts'] += 1
+        job['payload'] = json.loads(job['payload']) if job['payload'] else None
+        return job
+
+    def run(self, conn, job, handler):
+        """Runs a handler and records its outcome.
+
+        The handler receives a cursor and the job payload. Its writes, the job
+        completion and any follow-up jobs it returns are committed in a single
+        transaction, so a stage either fully happens or is retried. Handlers
+        should do their slow work before their first write, since the write
+        lock is held from the first INSERT/UPDATE until the commit.
+        """
+        c = conn.cursor()
+        try:
+            follow_ups = handler(c, job['payload']) or []
+            # Drop the payload once the job is done; it may hold unredacted input.
+            c.execute('''UPDATE jobs SET status = 'done', payload = NULL, locked_until = NULL,
+                         last_error = NULL, updated_at = ? WHERE id = ?''',
+                      (datetime.now(), job['id']))
+            for kind, payload in follow_ups:
+                enqueue(c, kind, payload)
+            conn.commit()
+            if follow_ups:
+                self.wakeup()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"ERROR: Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}. {e}")
+            traceback.print_exc()
+            self.fail(conn, job, str(e))
+            return False
+
+    def fail(self, conn, job, error):
+        if job['attempts'] >= self.max_attempts:
+            # Like a finished job, a dead one must not keep unredacted input around
+            conn.execute('''UPDATE jobs SET status = 'failed', payload = NULL, locked_until = NULL,
+                            last_error = ?, updated_at = ? WHERE id = ?''',
+                         (error, datetime.now(), job['id']))
+        else:
+            delay = self.backoff_seconds * (2 ** (job['attempts'] - 1))
+            conn.execute('''UPDATE jobs SET status = 'queued', run_after = ?, locked_until = NULL,
+                            last_error = ?, updated_at = ? WHERE id = ?''',
+                         (time.time() + delay, error, datetime.now(), job['id']))
+        conn.commit()
+
+    def depth(self, conn):
+        """Returns the number of jobs per status."""
+        rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+
+class WorkerPool:
+    """A set of daemon threads draining a JobQueue with per-kind handlers."""
+
+    def __init__(self, queue, handlers, size=2, poll_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.size = size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Started {self.size} pipeline workers")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self.queue.wakeup()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        conn = self.queue.connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    job = self.queue.claim(conn)
+                except sqlite3.OperationalError as e:
+                    print(f"WARNING: Could not claim a job. {e}")
+                    job = None
+                if job is None:
+                    self.queue.wait(self.poll_interval)
+                    continue
+                handler = self.handlers.get(job['kind'])
+                if handler is None:
+                    self.queue.fail(conn, dict(job, attempts=self.queue.max_attempts),
+                                    f"No handler for job kind '{job['kind']}'")
+                    continue
+                self.queue.run(conn, job, handler)
+        finally:
+            conn.close()
@@ -0,0 +1,180 @@
+"""Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed by a SHA-256 of the model name, the prompt template version
+and the input text, and stored in their own SQLite file so that every worker
+process shares them and they survive restarts. Old entries are dropped by TTL
+and, once the size cap is reached, least recently used first.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+CACHE_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS llm_cache
+                     (key TEXT PRIMARY KEY,
+                      model TEXT,
+                      template_version TEXT,
+                      value TEXT,
+                      size INTEGER,
+                      created_at REAL,
+                      last_access REAL)'''
+
+STATS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS llm_cache_stats
+                     (name TEXT PRIMARY KEY,
+                      value INTEGER NOT NULL DEFAULT 0)'''
+
+# Entry count and total size of llm_cache, kept by triggers so puts don't
+# have to aggregate the whole table
+TOTALS_SQL = [
+    '''CREATE TABLE IF NOT EXISTS llm_cache_totals
+       (id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL)''',
+    '''INSERT OR IGNORE INTO llm_cache_totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_llm_cache_insert AFTER INSERT ON llm_cache
+       BEGIN UPDATE llm_cache_totals SET entries = entries + 1, bytes = bytes + NEW.size; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_llm_cache_update AFTER UPDATE OF size ON llm_cache
+       BEGIN UPDATE llm_cache_totals SET bytes = bytes + NEW.size - OLD.size; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_llm_cache_delete AFTER DELETE ON llm_cache
+       BEGIN UPDATE llm_cache_totals SET entries = entries - 1, bytes = bytes - OLD.size; END''',
+]
+
+# Hits within this many seconds of the last recorded access don't rewrite it
+ACCESS_RESOLUTION = 60
+# Hit/miss counts are kept per process and written out at most this often
+# (and with every put), so lookups don't take the write lock
+STATS_FLUSH_SECONDS = 60
+
+
+def cache_key(model_name, template_version, text):
+    digest = hashlib.sha256()
+    for part in (model_name, template_version, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class LLMCache:
+    def __init__(self, db_path, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl_seconds=30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(CACHE_TABLE_SQL)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)')
+        for sql in TOTALS_SQL:
+            conn.execute(sql)
+        conn.execute(STATS_TABLE_SQL)
+        conn.executemany('INSERT OR IGNORE INTO llm_cache_stats (name) VALUES (?)',
+                         [('hits',), ('misses',), ('evictions',)])
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._pending_lock:
+            self._pending[name] = self._pending.get(name, 0) + amount
+
+    def _flush_stats(self, conn):
+        """Adds this process's pending counts to the stats table, in the caller's transaction."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        conn.executemany('UPDATE llm_cache_stats SET value = value + ? WHERE name = ?',
+                         [(amount, name) for name, amount in pending.items()])
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute('SELECT value, created_at, last_access FROM llm_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            self._count('misses')
+            return None
+        self._count('hits')
+        touch = now - row[2] > ACCESS_RESOLUTION
+        if touch or time.monotonic() - self._flushed_at > STATS_FLUSH_SECONDS:
+            if touch:
+                conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+            self._flush_stats(conn)
+            conn.commit()
+        return row[0]
+
+    def put(self, key, value, model_name='', template_version=''):
+        conn = self._connect()
+        now = time.time()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the totals trigger
+        conn.execute('''INSERT INTO llm_cache (key, model, template_version, value, size, created_at, last_access)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (key) DO UPDATE SET model = excluded.model,
+                            template_version = excluded.template_version, value = excluded.value,
+                            size = excluded.size, created_at = excluded.created_at,
+                            last_access = excluded.last_access''',
+                     (key, model_name, template_version, value, len(value.encode('utf-8')), now, now))
+        self._evict(conn, now)
+        self._flush_stats(conn)
+        conn.commit()
+
+    def _evict(self, conn, now):
+        evicted = conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,)).rowcount
+        entries, total_bytes = conn.execute('SELECT entries, bytes FROM llm_cache_totals').fetchone()
+        excess_entries = entries - self.max_entries
+        excess_bytes = total_bytes - self.max_bytes
+        if excess_entries > 0 or excess_bytes > 0:
+            # Count how many of the least recently used rows must go, then drop them in one statement
+            victims = 0
+            rows = conn.execute('SELECT size FROM llm_cache ORDER BY last_access')
+            for size, in rows:
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    break
+                victims += 1
+                excess_entries -= 1
+                excess_bytes -= size
+            rows.close()
+            evicted += conn.execute('''DELETE FROM llm_cache WHERE key IN
+                                       (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)''',
+                                    (victims,)).rowcount
+        if evicted:
+            self._count('evictions', evicted)
+
+    def get_or_compute(self, model_name, template_version, text, compute):
+        """Returns the cached response for this input, calling compute() on a miss.
+
+        Exceptions from compute() propagate and nothing is cached, so failed
+        model calls are retried next time.
+        """
+        key = cache_key(model_name, template_version, text)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value, model_name, template_version)
+        return value
+
+    def stats(self):
+        conn = self._connect()
+        stats = dict(conn.execute('SELECT name, value FROM llm_cache_stats').fetchall())
+        with self._pending_lock:
+            for name, amount in self._pending.items():
+                stats[name] = stats.get(name, 0) + amount
+        entries, total_bytes = conn.execute('SELECT entries, bytes FROM llm_cache_totals').fetchone()
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats.update({
+            'entries': entries,
+            'bytes': int(total_bytes),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'hit_rate': round(stats.get('hits', 0) / lookups, 3) if lookups else 0,
+        })
+        return stats
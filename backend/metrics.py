@@ -0,0 +1,490 @@
+"""Per-route and per-dependency metrics, exported in Prometheus text format.
+
+``init_app`` records, for every request, its latency, status code and how
+many requests are in flight, labelled by the route's URL rule (not the raw
+path, so complaint ids don't create a series each). Connections from
+``db.connect`` use ``TimedConnection``, which counts queries and the time
+spent executing and fetching them; the totals for a request are recorded
+against its route, and queries from worker threads against ``background``
+(published about once a second).
+Calls to slow dependencies (Presidio, Gemini, SMTP) are wrapped with
+``timed``::
+
+    @metrics.timed('gemini_analyze')
+    def analyze_with_gemini(text): ...
+
+``render`` returns everything in the Prometheus text format for ``/metrics``.
+
+With several worker processes, each scrape would only see the process that
+answered it. Set METRICS_DIR to an empty directory and every process keeps its
+values in memory-mapped files there (``values_<pid>.db``, plus
+``gauges_<pid>.db`` for in-flight counts, reset on start); ``render`` sums
+the files of all processes, skipping gauges of processes that have exited.
+Clear the directory when the server is restarted, as counters from earlier
+runs would otherwise carry over.
+"""
+import glob
+import json
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from flask import g, request
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+# Value storage
+
+class MemoryValues:
+    """Values of this process only, when no METRICS_DIR is configured."""
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        return list(self._values.items())
+
+
+class MmapValues:
+    """Values of one process in a memory-mapped file other processes can read.
+
+    The file starts with the number of bytes in use; each entry is the key's
+    length, the UTF-8 key padded to 8 bytes, and the value as a double. Entries
+    are only appended, and the used size is written after the entry, so a
+    reader never sees half an entry.
+    """
+
+    INITIAL_BYTES = 64 * 1024
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self._file = open(path, 'w+b' if reset else 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.INITIAL_BYTES)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = struct.unpack_from('q', self._map, 0)[0] or 8
+        self._positions = {key: position for key, _, position in _entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        struct.pack_into('d', self._map, position, struct.unpack_from('d', self._map, position)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        entry = struct.pack('i', len(encoded)) + encoded
+        entry += b'\0' * (-len(entry) % 8) + struct.pack('d', 0.0)
+        while self._used + len(entry) > len(self._map):
+            size = len(self._map) * 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[self._used:self._used + len(entry)] = entry
+        position = self._used + len(entry) - 8
+        self._used += len(entry)
+        struct.pack_into('q', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def items(self):
+        return [(key, value) for key, value, _ in _entries(self._map, self._used)]
+
+
+def _entries(data, used):
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        position += 4 + length
+        position += -position % 8
+        yield key, struct.unpack_from('d', data, position)[0], position
+        position += 8
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return []
+    used = min(struct.unpack_from('q', data, 0)[0], len(data))
+    return [(key, value) for key, value, _ in _entries(data, used)]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Metric types
+
+class Registry:
+    """Metric definitions and this process's values."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = self._gauges = None
+
+    def _stores(self):
+        # Reopened after a fork, so each worker process writes its own files
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                self._values = MmapValues(os.path.join(self.directory, f'values_{self._pid}.db'))
+                self._gauges = MmapValues(os.path.join(self.directory, f'gauges_{self._pid}.db'), reset=True)
+            else:
+                self._values, self._gauges = MemoryValues(), MemoryValues()
+        return self._values, self._gauges
+
+    def add(self, samples, gauge=False):
+        with self._lock:
+            values, gauges = self._stores()
+            store = gauges if gauge else values
+            for key, amount in samples:
+                store.add(key, amount)
+
+    def collect(self):
+        """Sums every process's values: {(name, labels): value}."""
+        with self._lock:
+            values, gauges = self._stores()
+            sources = [values.items(), gauges.items()]
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*_*.db')):
+                kind, pid = os.path.basename(path)[:-3].rsplit('_', 1)
+                if not pid.isdigit() or int(pid) == self._pid:
+                    continue
+                if kind == 'gauges' and not _pid_alive(int(pid)):
+                    continue
+                try:
+                    sources.append(_read_file(path))
+                except OSError as e:
+                    print(f"WARNING: Could not read metrics file {path}. {e}")
+        totals = {}
+        for items in sources:
+            for key, value in items:
+                name, labels = json.loads(key)
+                sample = (name, tuple(map(tuple, labels)))
+                totals[sample] = totals.get(sample, 0.0) + value
+        return totals
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+
+@lru_cache(maxsize=4096)
+def _key(name, labels):
+    return json.dumps([name, labels], separators=(',', ':'))
+
+
+class Metric:
+    kind = None
+    suffix = ''
+
+    def __init__(self, name, help_text, labels=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _labels(self, values):
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {values}")
+        return tuple((label, str(value)) for label, value in zip(self.labels, values))
+
+    def samples(self, totals):
+        name = self.name + self.suffix
+        return sorted((sample, labels, value) for (sample, labels), value in totals.items() if sample == name)
+
+
+class Counter(Metric):
+    kind = 'counter'
+    suffix = '_total'
+
+    def inc(self, *labels, amount=1):
+        self.registry.add([(_key(self.name + '_total', self._labels(labels)), amount)])
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        self.registry.add([(_key(self.name, self._labels(labels)), amount)], gauge=True)
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, help_text, labels, registry)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, *labels):
+        labels = self._labels(labels)
+        bucket = next(bound for bound in self.buckets if value <= bound)
+        self.registry.add([(_key(self.name + '_bucket', labels + (('le', _format(bucket)),)), 1),
+                           (_key(self.name + '_sum', labels), value),
+                           (_key(self.name + '_count', labels), 1)])
+
+    def samples(self, totals):
+        # Buckets are stored per bucket and made cumulative here
+        series = {}
+        for (name, labels), value in totals.items():
+            if name == self.name + '_bucket':
+                series.setdefault(labels[:-1], {})[labels[-1][1]] = value
+        samples = []
+        for labels in sorted(series):
+            running = 0.0
+            for bound in self.buckets:
+                running += series[labels].get(_format(bound), 0.0)
+                samples.append((self.name + '_bucket', labels + (('le', _format(bound)),), running))
+            samples.append((self.name + '_sum', labels, totals.get((self.name + '_sum', labels), 0.0)))
+            samples.append((self.name + '_count', labels, running))
+        return samples
+
+
+def _format(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render(registry=None):
+    """All metrics, summed across processes, in the Prometheus text format."""
+    registry = registry or REGISTRY
+    totals = registry.collect()
+    lines = []
+    for metric in registry.metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples(totals):
+            label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+            lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if labels
+                         else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+REGISTRY = Registry(METRICS_DIR)
+
+HTTP_REQUESTS = Counter('http_requests', 'HTTP requests by route and status code.', ('method', 'route', 'status'))
+HTTP_DURATION = Histogram('http_request_duration_seconds', 'Time to produce a response, by route.',
+                          ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled, by route.', ('method', 'route'))
+DB_QUERIES = Counter('db_queries', 'SQLite statements executed, by route ("background" for workers).',
+                     ('route',))
+DB_SECONDS = Counter('db_query_seconds', 'Time spent executing and fetching SQLite statements, by route.',
+                     ('route',))
+DB_QUERIES_PER_REQUEST = Histogram('db_queries_per_request', 'SQLite statements executed by one request.',
+                                   ('route',), buckets=QUERY_COUNT_BUCKETS)
+DB_SECONDS_PER_REQUEST = Histogram('db_seconds_per_request', 'SQLite time spent by one request.', ('route',))
+DEPENDENCY_CALLS = Counter('dependency_calls', 'Calls to external dependencies, by outcome.',
+                           ('dependency', 'outcome'))
+DEPENDENCY_DURATION = Histogram('dependency_duration_seconds', 'Latency of external dependency calls.',
+                                ('dependency',))
+
+
+# Dependencies
+
+@contextmanager
+def track(dependency):
+    """Times the block as one call to ``dependency``; an exception counts as an error."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        DEPENDENCY_DURATION.observe(time.perf_counter() - start, dependency)
+        DEPENDENCY_CALLS.inc(dependency, outcome)
+
+
+def timed(dependency):
+    """Decorator recording every call of the function as a call to ``dependency``."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with track(dependency):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# SQLite
+
+# Worker threads publish their query totals at most this often
+BACKGROUND_FLUSH_SECONDS = 1.0
+
+
+class _QueryTotals(threading.local):
+    in_request = False
+    count = 0
+    seconds = 0.0
+    flushed_at = 0.0
+
+
+_queries = _QueryTotals()
+
+
+def _record_query(seconds, statements=1):
+    _queries.count += statements
+    _queries.seconds += seconds
+    if not _queries.in_request:
+        now = time.monotonic()
+        if now - _queries.flushed_at >= BACKGROUND_FLUSH_SECONDS:
+            DB_QUERIES.inc('background', amount=_queries.count)
+            DB_SECONDS.inc('background', amount=_queries.seconds)
+            _queries.count, _queries.seconds, _queries.flushed_at = 0, 0.0, now
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor counting its statements and timing their execution and fetches.
+
+    Rows read by iterating over the cursor are not timed, as a Python hook per
+    row would triple the cost of large scans; ``fetchall`` and friends are.
+    Subclasses extend ``_executed`` and ``_fetched`` to see every statement
+    (``parameters`` is None for executemany and scripts) and fetch.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(sql, None, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._executed(sql_script, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._fetched(time.perf_counter() - start)
+
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            self._fetched(time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._fetched(time.perf_counter() - start)
+
+    def _executed(self, sql, parameters, seconds):
+        _record_query(seconds)
+
+    def _fetched(self, seconds):
+        _record_query(seconds, 0)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, including those of ``execute``, are ``TimedCursor``s."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+
+# Requests
+
+def route_label():
+    """The URL rule of the current request, so ids in the path don't make a series each."""
+    return request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_route = route_label()
+    HTTP_IN_FLIGHT.inc(request.method, g.metrics_route)
+    _queries.in_request, _queries.count, _queries.seconds = True, 0, 0.0
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    if 'metrics_start' not in g:
+        return
+    route = g.metrics_route
+    # Unhandled exceptions skip after_request and become a 500
+    status = g.get('metrics_status', 500)
+    HTTP_IN_FLIGHT.dec(request.method, route)
+    HTTP_REQUESTS.inc(request.method, route, status)
+    HTTP_DURATION.observe(time.perf_counter() - g.metrics_start, request.method, route)
+    count, seconds = _queries.count, _queries.seconds
+    _queries.in_request, _queries.count, _queries.seconds = False, 0, 0.0
+    if count:
+        DB_QUERIES.inc(route, amount=count)
+    DB_SECONDS.inc(route, amount=seconds)
+    DB_QUERIES_PER_REQUEST.observe(count, route)
+    DB_SECONDS_PER_REQUEST.observe(seconds, route)
+
+
+def init_app(app):
+    """Records latency, status, in-flight count and SQLite use for every request.
+
+    Streamed bodies are sent after the request is torn down, so their time is
+    not included in the latency.
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
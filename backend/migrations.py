@@ -0,0 +1,451 @@
+"""Versioned schema migrations for the application database.
+
+The schema version lives in ``PRAGMA user_version``. Each migration runs once,
+in its own transaction, together with the version bump. To change the schema,
+append a new migration to MIGRATIONS; never edit one that has shipped.
+
+    python migrations.py            # bring database.db up to date
+    python migrations.py --explain  # EXPLAIN QUERY PLAN for every route query
+"""
+import argparse
+import sqlite3
+from datetime import datetime
+
+import analytics
+import anomalies
+import counters
+import derivatives
+import evidence_store
+import geo
+import outbox
+import response_cache
+import rollups
+import search
+from db import DB_PATH
+from jobs import JOBS_TABLE_SQL, JOBS_INDEX_SQL
+
+BASELINE_TABLES = {
+    'users': '''CREATE TABLE users
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      email TEXT UNIQUE,
+                      password TEXT,
+                      aadhar TEXT UNIQUE,
+                      role TEXT,
+                      name TEXT)''',
+    'complaints': '''CREATE TABLE complaints
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      type TEXT,
+                      description TEXT,
+                      status TEXT,
+                      created_at TIMESTAMP,
+                      updated_at TIMESTAMP,
+                      user_id INTEGER,
+                      latitude REAL,
+                      longitude REAL,
+                      assigned_official_id INTEGER,
+                      department TEXT,
+                      satisfaction_rating INTEGER,
+                      analysis TEXT,
+                      fir_draft TEXT,
+                      processing_status TEXT,
+                      FOREIGN KEY(user_id) REFERENCES users(id),
+                      FOREIGN KEY(assigned_official_id) REFERENCES users(id))''',
+    'rewards': '''CREATE TABLE rewards
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      complaint_id INTEGER,
+                      amount INTEGER,
+                      status TEXT,
+                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''',
+    'comments': '''CREATE TABLE comments
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      complaint_id INTEGER,
+                      user_id INTEGER,
+                      comment TEXT,
+                      timestamp TIMESTAMP,
+                      FOREIGN KEY(complaint_id) REFERENCES complaints(id),
+                      FOREIGN KEY(user_id) REFERENCES users(id))''',
+    'most_wanted': '''CREATE TABLE most_wanted
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT,
+                      crime TEXT,
+                      description TEXT,
+                      last_seen TEXT,
+                      reward_amount INTEGER,
+                      status TEXT,
+                      image_url TEXT)''',
+    'officials': '''CREATE TABLE officials
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT,
+                      department TEXT,
+                      position TEXT,
+                      performance_score REAL)''',
+    'community_reports': '''CREATE TABLE community_reports
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      location TEXT,
+                      issue TEXT,
+                      severity TEXT,
+                      description TEXT,
+                      status TEXT,
+                      created_at TIMESTAMP)''',
+    'feedback': '''CREATE TABLE feedback
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      service_name TEXT,
+                      rating INTEGER,
+                      comments TEXT,
+                      anonymous INTEGER,
+                      created_at TIMESTAMP)''',
+    'evidence': '''CREATE TABLE evidence
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      complaint_id INTEGER,
+                      file_path TEXT,
+                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''',
+    'user_tags': '''CREATE TABLE user_tags
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER,
+                      tag_type TEXT,
+                      complaint_id INTEGER,
+                      created_at TIMESTAMP,
+                      FOREIGN KEY(user_id) REFERENCES users(id),
+                      FOREIGN KEY(complaint_id) REFERENCES complaints(id))''',
+    'jobs': JOBS_TABLE_SQL,
+}
+
+
+def _table_exists(c, name):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return c.fetchone() is not None
+
+
+def _columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in c.fetchall()]
+
+
+def _seed_demo_data(c, tables):
+    """Inserts the demo rows for any of the given tables that were just created."""
+    now = datetime.now()
+    if 'users' in tables:
+        c.executemany("INSERT INTO users (email, password, aadhar, role, name) VALUES (?, ?, ?, ?, ?)", [
+            ("citizen@example.com", "password123", "123456789012", "citizen", "Rajesh Kumar"),
+            ("police@example.com", "password123", "123456789013", "police", "Inspector Sharma"),
+            ("official@example.com", "password123", "123456789014", "official", "Officer Singh"),
+        ])
+    if 'complaints' in tables:
+        c.executemany("INSERT INTO complaints (type, description, status, created_at, updated_at, user_id, latitude, longitude, department) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            ("bribery", "Officer asked for ₹5000 to approve license", "Resolved", now, now, 1, 19.0760, 72.8777, "Police"),
+            ("delay", "Passport application pending for 3 months", "In Progress", now, now, 1, 28.6139, 77.2090, "Passport Office"),
+        ])
+    if 'rewards' in tables:
+        c.execute("INSERT INTO rewards (complaint_id, amount, status) VALUES (?, ?, ?)", (1, 5000, "Distributed"))
+    if 'most_wanted' in tables:
+        c.executemany("INSERT INTO most_wanted (name, crime, description, last_seen, reward_amount, status, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            ("Vijay Mallya", "Financial Fraud", "Wanted for bank fraud and money laundering", "London, UK", 5000000, "Active", "https://example.com/mallya.jpg"),
+            ("Nirav Modi", "Punjab National Bank Scam", "Wanted for $1.8 billion bank fraud", "Unknown", 5000000, "Active", "https://example.com/nirav.jpg"),
+            ("Mehul Choksi", "Punjab National Bank Scam", "Wanted for bank fraud", "Antigua", 5000000, "Active", "https://example.com/mehul.jpg"),
+        ])
+    if 'officials' in tables:
+        c.executemany("INSERT INTO officials (name, department, position, performance_score) VALUES (?, ?, ?, ?)", [
+            ("Rakesh Asthana", "Police", "Special Director", 85.5),
+            ("Alok Verma", "Passport Office", "Director", 78.2),
+        ])
+    if 'community_reports' in tables:
+        c.executemany("INSERT INTO community_reports (location, issue, severity, description, status, created_at) VALUES (?, ?, ?, ?, ?, ?)", [
+            ("Mumbai", "Bribe at RTO office", "High", "Officials asking for bribes to issue driving licenses", "Pending", now),
+            ("Delhi", "Harassment", "Medium", "Citizens being harassed by police for no reason", "Investigating", now),
+        ])
+    if 'feedback' in tables:
+        c.executemany("INSERT INTO feedback (service_name, rating, comments, anonymous, created_at) VALUES (?, ?, ?, ?, ?)", [
+            ("Passport Office", 2, "Very slow service, staff not helpful", 0, now),
+            ("RTO", 4, "Process was smooth, but took longer than expected", 1, now),
+        ])
+
+
+def _baseline(c):
+    """Brings a new or pre-versioning database to the unversioned schema.
+
+    Databases created before migrations existed may lack tables or columns;
+    those are added here, so this is safe to run against any of them.
+    """
+    created = set()
+    for name, sql in BASELINE_TABLES.items():
+        if not _table_exists(c, name):
+            c.execute(sql)
+            created.add(name)
+    _seed_demo_data(c, created)
+
+    columns = _columns(c, 'complaints')
+    if 'department' not in columns:
+        if 'user_id' not in columns:
+            c.execute("ALTER TABLE complaints ADD COLUMN user_id INTEGER")
+            c.execute("ALTER TABLE complaints ADD COLUMN latitude REAL")
+            c.execute("ALTER TABLE complaints ADD COLUMN longitude REAL")
+        c.execute("ALTER TABLE complaints ADD COLUMN assigned_official_id INTEGER REFERENCES users(id)")
+        c.execute("ALTER TABLE complaints ADD COLUMN department TEXT")
+        c.execute("ALTER TABLE complaints ADD COLUMN satisfaction_rating INTEGER")
+        c.execute("UPDATE complaints SET department = 'Police' WHERE type = 'bribery'")
+        c.execute("UPDATE complaints SET department = 'Passport Office' WHERE type = 'delay'")
+        c.execute("UPDATE complaints SET department = 'Municipal Corporation' WHERE type = 'nepotism'")
+        c.execute("UPDATE complaints SET user_id = 1 WHERE user_id IS NULL")
+    if 'processing_status' not in _columns(c, 'complaints'):
+        c.execute("ALTER TABLE complaints ADD COLUMN analysis TEXT")
+        c.execute("ALTER TABLE complaints ADD COLUMN fir_draft TEXT")
+        c.execute("ALTER TABLE complaints ADD COLUMN processing_status TEXT")
+    c.execute(JOBS_INDEX_SQL)
+
+
+def _route_indexes(c):
+    """Secondary indexes for the WHERE, GROUP BY and JOIN clauses of the routes."""
+    for sql in [
+        # /api/user/complaints
+        'CREATE INDEX IF NOT EXISTS idx_complaints_user_id ON complaints (user_id)',
+        # /api/dashboard status counts, /api/resolution-time
+        'CREATE INDEX IF NOT EXISTS idx_complaints_status_type ON complaints (status, type, created_at, updated_at)',
+        # /api/integrity-index, /api/department-performance
+        'CREATE INDEX IF NOT EXISTS idx_complaints_department ON complaints (department, status, satisfaction_rating)',
+        # /api/risk-analysis, /api/complaints-by-type
+        'CREATE INDEX IF NOT EXISTS idx_complaints_type_status ON complaints (type, status)',
+        # /api/trend-data, /api/anomalies
+        'CREATE INDEX IF NOT EXISTS idx_complaints_created_at ON complaints (created_at)',
+        # /api/complaints-with-location; partial, so it only holds geotagged rows
+        '''CREATE INDEX IF NOT EXISTS idx_complaints_location ON complaints (id)
+           WHERE latitude IS NOT NULL AND longitude IS NOT NULL''',
+        # /api/official-performance
+        'CREATE INDEX IF NOT EXISTS idx_complaints_assigned_official ON complaints (assigned_official_id)',
+        # /api/complaints/<id>/comments
+        'CREATE INDEX IF NOT EXISTS idx_comments_complaint ON comments (complaint_id, timestamp)',
+        # /api/complaints/<id>/evidence
+        'CREATE INDEX IF NOT EXISTS idx_evidence_complaint ON evidence (complaint_id)',
+        # /api/users/<id>/tags
+        'CREATE INDEX IF NOT EXISTS idx_user_tags_user ON user_tags (user_id, tag_type)',
+        # /api/dashboard rewards total
+        'CREATE INDEX IF NOT EXISTS idx_rewards_status ON rewards (status, amount)',
+        # /api/most-wanted
+        'CREATE INDEX IF NOT EXISTS idx_most_wanted_status ON most_wanted (status, reward_amount)',
+        # /api/dashboard pending reports
+        'CREATE INDEX IF NOT EXISTS idx_community_reports_status ON community_reports (status)',
+        # /api/community-reports
+        'CREATE INDEX IF NOT EXISTS idx_community_reports_created_at ON community_reports (created_at)',
+        # /api/department-performance feedback join, /api/dashboard average rating
+        'CREATE INDEX IF NOT EXISTS idx_feedback_service ON feedback (service_name, rating)',
+        # /api/departments
+        'CREATE INDEX IF NOT EXISTS idx_officials_department ON officials (department)',
+    ]:
+        c.execute(sql)
+
+
+def _keyset_indexes(c):
+    """Indexes ending in the (created_at, id) page order for each list filter.
+
+    SQLite appends the rowid to every index entry, so an index on
+    (filter, created_at) also orders ties by id.
+    """
+    c.execute('DROP INDEX IF EXISTS idx_complaints_user_id')
+    c.execute('DROP INDEX IF EXISTS idx_complaints_location')
+    for sql in [
+        'CREATE INDEX IF NOT EXISTS idx_complaints_user_created ON complaints (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_complaints_status_created ON complaints (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_complaints_department_created ON complaints (department, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_complaints_type_created ON complaints (type, created_at)',
+        '''CREATE INDEX IF NOT EXISTS idx_complaints_location_created ON complaints (created_at)
+           WHERE latitude IS NOT NULL AND longitude IS NOT NULL''',
+        'CREATE INDEX IF NOT EXISTS idx_community_reports_status_created ON community_reports (status, created_at)',
+    ]:
+        c.execute(sql)
+
+
+def _dashboard_counters(c):
+    """Trigger-maintained counters for /api/dashboard (see counters.py)."""
+    counters.install(c)
+
+
+def _analytics_changes(c):
+    """Change log feeding the analytics column store (see analytics.py)."""
+    analytics.install(c)
+
+
+def _complaints_rtree(c):
+    """R*Tree over complaint coordinates for map viewports (see geo.py)."""
+    geo.install(c)
+
+
+def _evidence_blobs(c):
+    """Content hashes and ref-counted blobs for evidence (see evidence_store.py)."""
+    evidence_store.install(c)
+
+
+def _evidence_derivatives(c):
+    """Thumbnail, preview and metadata columns for evidence (see derivatives.py)."""
+    derivatives.install(c)
+
+
+def _email_outbox(c):
+    """Transactional email outbox (see outbox.py)."""
+    outbox.install(c)
+
+
+def _full_text_search(c):
+    """FTS5 indexes over complaint, comment and community report text (see search.py)."""
+    search.install(c)
+
+
+def _anomaly_detector(c):
+    """Per-series EWMA state for complaint anomaly detection (see anomalies.py)."""
+    anomalies.install(c)
+
+
+def _complaint_rollups(c):
+    """Hour/day/week/month rollups behind the trend and resolution charts (see rollups.py)."""
+    rollups.install(c)
+
+
+def _table_versions(c):
+    """Per-table write versions behind the response cache (see response_cache.py)."""
+    response_cache.install(c)
+
+
+# (version, description, function). Append only.
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'route indexes', _route_indexes),
+    (3, 'keyset pagination indexes', _keyset_indexes),
+    (4, 'dashboard counters', _dashboard_counters),
+    (5, 'analytics change log', _analytics_changes),
+    (6, 'complaints R*Tree', _complaints_rtree),
+    (7, 'evidence blobs', _evidence_blobs),
+    (8, 'evidence derivatives', _evidence_derivatives),
+    (9, 'email outbox', _email_outbox),
+    (10, 'full-text search', _full_text_search),
+    (11, 'anomaly detector state', _anomaly_detector),
+    (12, 'complaint rollups', _complaint_rollups),
+    (13, 'table versions', _table_versions),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Applies every migration newer than the database's user_version."""
+    version = schema_version(conn)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        print(f"Applying migration {target}: {description}...")
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            apply(c)
+            c.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
+
+
+# Representative parameters for the queries each route runs
+ROUTE_QUERIES = [
+    ('POST /api/login', 'SELECT * FROM users WHERE email = ? AND password = ?', ('citizen@example.com', 'x')),
+    ('GET /api/user/complaints', '''SELECT * FROM complaints WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?''', (1, '9999', 0, 101)),
+    ('GET /api/police/complaints', '''SELECT c.*, u.name as user_name FROM complaints c JOIN users u ON c.user_id = u.id
+        ORDER BY c.created_at DESC, c.id DESC LIMIT ?''', (101,)),
+    ('GET /api/police/complaints?status=', '''SELECT c.*, u.name as user_name FROM complaints c JOIN users u ON c.user_id = u.id
+        WHERE c.status = ? AND (c.created_at, c.id) < (?, ?) ORDER BY c.created_at DESC, c.id DESC LIMIT ?''',
+     ('Submitted', '9999', 0, 101)),
+    ('POST /api/police/complaints/<id>/comment', 'SELECT assigned_official_id FROM complaints WHERE id = ?', (1,)),
+    ('GET /api/complaints/<id>/comments', '''SELECT c.*, u.name, u.role FROM comments c
+        JOIN users u ON c.user_id = u.id WHERE c.complaint_id = ? ORDER BY c.timestamp''', (1,)),
+    ('GET /api/complaints/<id>/evidence', 'SELECT * FROM evidence WHERE complaint_id = ?', (1,)),
+    ('GET /uploads/<path>', 'SELECT content_type FROM evidence_blobs WHERE sha256 = ?', ('0' * 64,)),
+    ('GET /api/users/<id>/tags', 'SELECT tag_type, COUNT(*) as count FROM user_tags WHERE user_id = ? GROUP BY tag_type', (2,)),
+    ('GET /api/complaints/<id>/status', 'SELECT id, status, processing_status, analysis, fir_draft FROM complaints WHERE id = ?', (1,)),
+    ('GET /api/dashboard', 'SELECT * FROM dashboard_counters WHERE id = 1', ()),
+    ('email sender claim', '''SELECT id, to_address, subject, body, attempts FROM email_outbox
+        WHERE (status = 'queued' AND run_after <= ?) OR (status = 'sending' AND locked_until < ?)
+        ORDER BY run_after LIMIT ?''', (0, 0, 50)),
+    ('notify stage', '''UPDATE email_outbox SET status = 'queued' WHERE complaint_id = ? AND status = 'held' ''', (1,)),
+    # /api/integrity-index, risk-analysis, official- and department-performance
+    ('analytics refresh', '''SELECT (SELECT MIN(seq) FROM analytics_changes),
+        (SELECT MAX(seq) FROM analytics_changes)''', ()),
+    ('analytics refresh', 'SELECT table_name, row_id FROM analytics_changes WHERE seq > ? AND seq <= ?', (0, 10)),
+    ('POST /api/complaints', 'SELECT MAX(id) FROM complaints', ()),
+    ('POST /api/complaints', '''SELECT first_day, day, count, mean, var, days_seen FROM anomaly_series
+        WHERE department = ? AND type = ? AND geohash = ?''', ('Police', 'bribery', 'te7ud')),
+    ('GET /api/anomalies', '''SELECT department, type, geohash, day, count, mean, var, days_seen FROM anomaly_series
+        WHERE day >= ? AND days_seen >= ?''', (20000, 14)),
+    ('GET /api/anomalies', 'SELECT * FROM anomaly_events WHERE day >= ? AND z_score >= ?', (20000, 3.0)),
+    # Every cached GET route, for the tables it depends on (here /api/dashboard's)
+    ('response cache', 'SELECT table_name, version FROM table_versions WHERE table_name IN (?, ?, ?, ?, ?)',
+     ('complaints', 'rewards', 'most_wanted', 'community_reports', 'feedback')),
+    ('GET /api/trend-data', '''SELECT bucket, NULL, SUM(created), SUM(resolved), SUM(resolution_days)
+        FROM complaint_rollups WHERE granularity = ? AND bucket BETWEEN ? AND ? GROUP BY 1''',
+     ('day', '2024-01-01', '2024-01-31')),
+    ('GET /api/trend-data?group_by=department', '''SELECT bucket, department, SUM(created), SUM(resolved),
+        SUM(resolution_days) FROM complaint_rollups WHERE granularity = ? AND bucket BETWEEN ? AND ? GROUP BY 1, 2''',
+     ('month', '2020-01', '2024-12')),
+    ('GET /api/resolution-time', '''SELECT type, SUM(created), SUM(resolved), SUM(resolution_days)
+        FROM complaint_rollups WHERE granularity = 'month' GROUP BY 1 ORDER BY 1''', ()),
+    ('GET /api/complaints-by-type', 'SELECT type, COUNT(*) as count FROM complaints GROUP BY type ORDER BY count DESC', ()),
+    ('GET /api/complaints-with-location', '''SELECT * FROM complaints WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY created_at DESC, id DESC LIMIT ?''', (101,)),
+    ('GET /api/complaints-with-location?bbox=&zoom=', '''SELECT COUNT(*), AVG(r.min_lat), AVG(r.min_lng), MIN(r.id)
+        FROM complaints_rtree r WHERE r.min_lat <= ? AND r.max_lat >= ? AND ((r.min_lng <= ? AND r.max_lng >= ?))
+        GROUP BY CAST(r.min_lat / ? + ? AS INTEGER), CAST(r.min_lng / ? + ? AS INTEGER)''',
+     (35.0, 8.0, 97.0, 68.0, 0.35, 515, 0.35, 515)),
+    ('GET /api/complaints-with-location?bbox=&zoom=', '''SELECT c.id, c.latitude, c.longitude, c.type, c.status, c.created_at
+        FROM complaints_rtree r JOIN complaints c ON c.id = r.id
+        WHERE r.min_lat <= ? AND r.max_lat >= ? AND ((r.min_lng <= ? AND r.max_lng >= ?)) LIMIT ?''',
+     (28.7, 28.5, 77.3, 77.1, 5001)),
+    ('GET /api/departments', 'SELECT DISTINCT department FROM officials', ()),
+    ('GET /api/community-reports', 'SELECT * FROM community_reports ORDER BY created_at DESC, id DESC LIMIT ?', (101,)),
+    ('GET /api/most-wanted', '''SELECT * FROM most_wanted WHERE status = 'Active' AND (reward_amount, id) < (?, ?)
+        ORDER BY reward_amount DESC, id DESC LIMIT ?''', (10 ** 12, 0, 101)),
+    ('GET /api/most-wanted/<id>', 'SELECT * FROM most_wanted WHERE id = ?', (1,)),
+    ('GET /api/search', '''SELECT complaints_fts.rowid FROM complaints_fts JOIN complaints c ON c.id = complaints_fts.rowid
+        WHERE complaints_fts MATCH ? AND c.status = ? ORDER BY complaints_fts.rowid DESC LIMIT 1 OFFSET ?''',
+     ('"bribe"', 'Submitted', 4999)),
+    ('GET /api/search', '''SELECT comments_fts.rowid, bm25(comments_fts) AS score FROM comments_fts
+        WHERE comments_fts MATCH ? AND comments_fts.rowid BETWEEN ? AND ? ORDER BY score, comments_fts.rowid
+        LIMIT ? OFFSET ?''', ('"brib"*', 1, 10 ** 6, 101, 0)),
+    ('GET /api/search', '''SELECT m.id, m.complaint_id, c.type FROM comments m JOIN complaints c ON c.id = m.complaint_id
+        WHERE m.id IN (?, ?)''', (1, 2)),
+    ('GET /api/search/facets', '''SELECT r.issue, r.status, COUNT(*) FROM community_reports_fts
+        JOIN community_reports r ON r.id = community_reports_fts.rowid WHERE community_reports_fts MATCH ?
+        AND community_reports_fts.rowid BETWEEN ? AND ? GROUP BY r.issue, r.status''', ('"road"', 0, 10 ** 6)),
+]
+
+
+def explain_routes(conn):
+    """Returns (route, sql, plan lines, full table scans) for every route query."""
+    report = []
+    for route, sql, params in ROUTE_QUERIES:
+        plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+        # "SCAN t USING [COVERING] INDEX" walks an index; a bare "SCAN t" reads the table.
+        # Virtual tables (R*Tree, FTS5) report "SCAN t VIRTUAL TABLE INDEX n:constraints"; with no
+        # constraints after the colon they read every row.
+        scans = [line for line in plan if line.startswith('SCAN') and 'USING' not in line
+                 and line != 'SCAN CONSTANT ROW' and not ('VIRTUAL TABLE INDEX' in line and not line.endswith(':'))]
+        report.append((route, ' '.join(sql.split()), plan, scans))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate the database schema.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--explain', action='store_true', help='Print the query plan of every route query')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    print(f"Schema version {migrate(conn)}")
+    if args.explain:
+        total_scans = 0
+        for route, sql, plan, scans in explain_routes(conn):
+            print(f"\n{route}\n  {sql}")
+            for line in plan:
+                print(f"    {'!! ' if line in scans else ''}{line}")
+            total_scans += len(scans)
+        print(f"\n{total_scans} full table scan(s)")
+    conn.close()
@@ -0,0 +1,283 @@
+"""Transactional email outbox with a batching SMTP sender.
+
+Routes and pipeline stages never talk to the mail server. They write rows to
+``email_outbox`` inside their own transaction, so an email exists exactly
+when the change it reports was committed. A complaint's confirmation is
+inserted as 'held' together with the complaint. The notify stage fills in the
+body once the FIR draft exists and releases the row to 'queued'.
+
+OutboxSender drains queued rows in batches over one SMTP session. The
+session is opened, upgraded with STARTTLS and authenticated once, then reused
+across messages and batches until it has been idle for a while. A failed
+message is retried with exponential backoff. Permanent (5xx) rejections and
+messages out of attempts are marked 'failed'. Rows are claimed under a lease,
+so a sender that dies mid-batch has its messages picked up again: delivery is
+at least once.
+"""
+import smtplib
+import threading
+import time
+import traceback
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import metrics
+
+OUTBOX_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS email_outbox
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       complaint_id INTEGER,
+                       to_address TEXT NOT NULL,
+                       subject TEXT,
+                       body TEXT,
+                       status TEXT NOT NULL,
+                       attempts INTEGER NOT NULL DEFAULT 0,
+                       run_after REAL NOT NULL,
+                       locked_until REAL,
+                       last_error TEXT,
+                       created_at TIMESTAMP,
+                       sent_at TIMESTAMP,
+                       FOREIGN KEY(complaint_id) REFERENCES complaints(id))'''
+
+OUTBOX_INDEXES_SQL = [
+    'CREATE INDEX IF NOT EXISTS idx_email_outbox_claim ON email_outbox (status, run_after)',
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_complaint ON email_outbox (complaint_id) WHERE status = 'held'",
+]
+
+
+def install(c):
+    c.execute(OUTBOX_TABLE_SQL)
+    for sql in OUTBOX_INDEXES_SQL:
+        c.execute(sql)
+
+
+def hold(c, complaint_id, user_id):
+    """Reserves the confirmation email for a new complaint, in the caller's transaction."""
+    c.execute('''INSERT INTO email_outbox (complaint_id, to_address, status, run_after, created_at)
+                 SELECT ?, email, 'held', 0, ? FROM users WHERE id = ? AND email IS NOT NULL''',
+              (complaint_id, datetime.now(), user_id))
+
+
+def enqueue(c, to_address, subject, body, complaint_id=None):
+    """Queues an email for sending once the caller's transaction commits."""
+    c.execute('''INSERT INTO email_outbox (complaint_id, to_address, subject, body, status, run_after, created_at)
+                 VALUES (?, ?, ?, ?, 'queued', ?, ?)''',
+              (complaint_id, to_address, subject, body, time.time(), datetime.now()))
+
+
+def release(c, complaint_id, subject, body):
+    """Fills in a complaint's held email and queues it. Returns False if none was held."""
+    c.execute('''UPDATE email_outbox SET subject = ?, body = ?, status = 'queued', run_after = ?
+                 WHERE complaint_id = ? AND status = 'held' ''',
+              (subject, body, time.time(), complaint_id))
+    return c.rowcount > 0
+
+
+def depth(conn):
+    """Number of outbox rows per status."""
+    return {status: count for status, count in
+            conn.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status').fetchall()}
+
+
+def oldest_queued_age(conn):
+    """Seconds the oldest runnable message has been waiting, or 0."""
+    row = conn.execute('''SELECT MIN(run_after) FROM email_outbox
+                          WHERE status = 'queued' AND run_after <= ?''', (time.time(),)).fetchone()
+    return round(time.time() - row[0], 1) if row and row[0] is not None else 0
+
+
+class OutboxSender:
+    """A daemon thread sending outbox rows over a reused SMTP session."""
+
+    def __init__(self, connect, host, port, username=None, password=None, from_address=None, starttls=True,
+                 batch_size=50, lease_seconds=120, max_attempts=6, backoff_seconds=30, poll_interval=1.0,
+                 idle_seconds=30, timeout=30):
+        self.connect = connect
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.from_address = from_address or username
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self._session = None
+        self._last_used = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'sessions_opened': 0}
+
+    def start(self):
+        # One sender thread per instance: a second one would share the SMTP session
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._work, name='email-sender', daemon=True)
+            self._thread.start()
+        print(f"Started email sender for {self.host}:{self.port}")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_session()
+
+    def wakeup(self):
+        """Tells the sender that new messages were committed."""
+        self._wakeup.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, session_open=self._session is not None)
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _open_session(self):
+        if self._session is not None and time.time() - self._last_used < self.idle_seconds:
+            try:
+                # One round trip per batch catches sessions the server dropped while idle
+                if self._session.noop()[0] == 250:
+                    return self._session
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._close_session()
+        session = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            session.ehlo()
+            if self.starttls:
+                session.starttls()
+                session.ehlo()
+            if self.username and self.password:
+                session.login(self.username, self.password)
+        except Exception:
+            session.close()
+            raise
+        self._session = session
+        self._count(sessions_opened=1)
+        return session
+
+    def _close_session(self):
+        if self._session is None:
+            return
+        try:
+            self._session.quit()
+        except (smtplib.SMTPException, OSError):
+            self._session.close()
+        self._session = None
+
+    def claim(self, conn):
+        """Leases up to batch_size runnable messages."""
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('''SELECT id, to_address, subject, body, attempts FROM email_outbox
+                                   WHERE (status = 'queued' AND run_after <= ?)
+                                      OR (status = 'sending' AND locked_until < ?)
+                                   ORDER BY run_after LIMIT ?''', (now, now, self.batch_size)).fetchall()
+            conn.executemany("UPDATE email_outbox SET status = 'sending', locked_until = ? WHERE id = ?",
+                             [(now + self.lease_seconds, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rows
+
+    def _message(self, row):
+        message = MIMEMultipart()
+        message['From'] = self.from_address
+        message['To'] = row[1]
+        message['Subject'] = row[2] or ''
+        message.attach(MIMEText(row[3] or '', 'plain'))
+        return message
+
+    def send_batch(self, conn, rows):
+        """Sends claimed rows and records every outcome in one transaction."""
+        sent, retry, failed = [], [], []
+        try:
+            session = self._open_session()
+            session_error = None
+        except (smtplib.SMTPException, OSError) as e:
+            # Includes authentication failures: nothing in the batch is at fault
+            session, session_error = None, f"{type(e).__name__}: {e}"
+        for row in rows:
+            error = session_error
+            if session_error is None:
+                try:
+                    with metrics.track('send_email'):
+                        session.send_message(self._message(row), self.from_address, [row[1]])
+                    self._last_used = time.time()
+                    sent.append(row[0])
+                    continue
+                except smtplib.SMTPResponseException as e:
+                    error = f"{e.smtp_code} {e.smtp_error!r}"
+                    if e.smtp_code >= 500:
+                        failed.append((error, row[0]))
+                        continue
+                except smtplib.SMTPRecipientsRefused as e:
+                    failed.append((str(e.recipients), row[0]))
+                    continue
+                except (smtplib.SMTPException, OSError) as e:
+                    # The connection is gone; the rest of the batch waits for the next attempt
+                    session_error = error = f"{type(e).__name__}: {e}"
+                    self._close_session()
+            if row[4] + 1 >= self.max_attempts:
+                failed.append((error, row[0]))
+            else:
+                retry.append((time.time() + self.backoff_seconds * 2 ** row[4], error, row[0]))
+
+        now = datetime.now()
+        conn.executemany('''UPDATE email_outbox SET status = 'sent', attempts = attempts + 1, locked_until = NULL,
+                            last_error = NULL, sent_at = ? WHERE id = ?''', [(now, row_id) for row_id in sent])
+        conn.executemany('''UPDATE email_outbox SET status = 'queued', attempts = attempts + 1, locked_until = NULL,
+                            run_after = ?, last_error = ? WHERE id = ?''', retry)
+        conn.executemany('''UPDATE email_outbox SET status = 'failed', attempts = attempts + 1, locked_until = NULL,
+                            last_error = ? WHERE id = ?''', failed)
+        conn.commit()
+        self._count(sent=len(sent), retried=len(retry), failed=len(failed), batches=1)
+        for error, row_id in failed:
+            print(f"ERROR: Email {row_id} could not be delivered. {error}")
+        if session_error:
+            print(f"WARNING: SMTP session to {self.host}:{self.port} failed; {len(retry)} email(s) will be retried. "
+                  f"{session_error}")
+        return len(sent)
+
+    def run_once(self, conn):
+        """Claims and sends one batch. Returns the number of messages claimed."""
+        rows = self.claim(conn)
+        if rows:
+            self.send_batch(conn, rows)
+        elif self._session is not None and time.time() - self._last_used >= self.idle_seconds:
+            self._close_session()
+        return len(rows)
+
+    def _work(self):
+        conn = self.connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    claimed = self.run_once(conn)
+                except Exception as e:
+                    print(f"ERROR: Email sender loop failed. {e}")
+                    traceback.print_exc()
+                    if conn.in_transaction:
+                        conn.rollback()
+                    claimed = 0
+                if claimed < self.batch_size:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            conn.close()
@@ -0,0 +1,117 @@
+"""Keyset (cursor) pagination and list filters for the listing endpoints.
+
+A page is the next ``limit`` rows after the cursor in (sort key, id) order, so
+fetching any page costs one index range scan no matter how deep it is. Cursors
+are opaque to clients: base64-encoded JSON of the last row's sort key values.
+
+List endpoints still return a JSON array, encoded in chunks of rows as it is
+sent (see responses.py). When there are more rows, the response carries the
+cursor for the next page in the ``X-Next-Cursor`` header and a matching
+``Link: <...>; rel="next"`` header.
+"""
+import base64
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import request
+
+from responses import json_array_response
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class BadQueryParameter(ValueError):
+    """A malformed list parameter; routes answer it with 400."""
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise BadQueryParameter('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise BadQueryParameter('Invalid cursor')
+    return values
+
+
+def page_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadQueryParameter('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise BadQueryParameter(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def filter_clauses(args, columns, created_column=None):
+    """Builds WHERE clauses from request args.
+
+    ``columns`` maps accepted equality filters (e.g. 'status') to the SQL
+    column they constrain. If ``created_column`` is given, 'from' and 'to'
+    restrict it to an inclusive date range.
+    """
+    where, params = [], []
+    for name, column in columns.items():
+        value = args.get(name)
+        if value:
+            where.append(f'{column} = ?')
+            params.append(value)
+    if created_column:
+        if args.get('from'):
+            where.append(f'{created_column} >= ?')
+            params.append(_parse_date(args['from'], 'from'))
+        if args.get('to'):
+            where.append(f"{created_column} < date(?, '+1 day')")
+            params.append(_parse_date(args['to'], 'to'))
+    return where, params
+
+
+def fetch_page(c, select, where, params, keys, args, descending=True):
+    """Runs one keyset page of ``select`` ordered by ``keys``.
+
+    ``keys`` are the sort columns, ending with a unique one (normally the id).
+    Returns (rows, next_cursor), where next_cursor is None on the last page.
+    """
+    where, params = list(where), list(params)
+    limit = page_limit(args)
+    if args.get('cursor'):
+        operator = '<' if descending else '>'
+        where.append(f"({', '.join(keys)}) {operator} ({', '.join('?' * len(keys))})")
+        params.extend(decode_cursor(args['cursor'], len(keys)))
+    direction = 'DESC' if descending else 'ASC'
+    sql = select
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join(f'{key} {direction}' for key in keys) + ' LIMIT ?'
+    c.execute(sql, params + [limit + 1])
+    rows = c.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][key.split('.')[-1]] for key in keys])
+    return rows, next_cursor
+
+
+def page_response(items, next_cursor):
+    """The page as a streamed JSON array; ``items`` are dicts or sqlite3.Row objects."""
+    response = json_array_response(items)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,133 @@
+"""Fast regex and checksum recognizers for Indian identifiers.
+
+This is the first redaction tier. It handles Aadhaar numbers (validated with
+the Verhoeff checksum), PAN, IFSC codes, Indian phone numbers and email
+addresses in a single pass, without loading any NLP model. Matches are replaced
+with the same ``<ENTITY_TYPE>`` tags Presidio's anonymizer produces.
+"""
+import re
+
+# Verhoeff checksum tables (dihedral group D5)
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+_VERHOEFF_INV = [0, 4, 3, 2, 1, 5, 6, 7, 8, 9]
+
+
+def verhoeff_valid(digits):
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+def verhoeff_check_digit(digits):
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[(i + 1) % 8][int(digit)]]
+    return str(_VERHOEFF_INV[check])
+
+
+def _valid_aadhaar(match):
+    return verhoeff_valid(re.sub(r'\D', '', match.group()))
+
+
+# (entity type, pattern, optional validator). Earlier rules win on overlaps.
+RULES = [
+    ('EMAIL_ADDRESS', re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'), None),
+    ('IN_AADHAAR', re.compile(r'(?<![\d-])[2-9]\d{3}[ -]?\d{4}[ -]?\d{4}(?![\d-])'), _valid_aadhaar),
+    ('IN_PAN', re.compile(r'\b[A-Z]{3}[ABCFGHLJPT][A-Z]\d{4}[A-Z]\b'), None),
+    ('IN_IFSC', re.compile(r'\b[A-Z]{4}0[A-Z0-9]{6}\b'), None),
+    ('PHONE_NUMBER', re.compile(r'(?<![\w+])(?:\+91[ -]?|0)?[6-9]\d{4}[ -]?\d{5}(?!\d)'), None),
+]
+
+ENTITIES = [entity for entity, _, _ in RULES]
+
+
+def find(text, entities=None):
+    """Returns non-overlapping (start, end, entity_type) spans, sorted by start."""
+    spans = []
+    for entity, pattern, validator in RULES:
+        if entities is not None and entity not in entities:
+            continue
+        for match in pattern.finditer(text):
+            if validator and not validator(match):
+                continue
+            start, end = match.span()
+            if any(start < s_end and s_start < end for s_start, s_end, _ in spans):
+                continue
+            spans.append((start, end, entity))
+    return sorted(spans)
+
+
+def redact(text, entities=None):
+    """Replaces every fast-tier match with its ``<ENTITY_TYPE>`` tag."""
+    parts = []
+    last = 0
+    for start, end, entity in find(text, entities):
+        parts.append(text[last:start])
+        parts.append(f'<{entity}>')
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r"[A-Za-z][A-Za-z'-]*")
+_TAG = re.compile(r'<[A-Z_]+>')
+_DIGIT_RUN = re.compile(r'\d{6,}')
+# Capitalised only because they open a sentence; any other capitalised first
+# word is treated as a possible name
+_SENTENCE_STARTERS = frozenset("""
+    a about after again all also although an and another any are as at because before being both but by can
+    could dear despite did do does due during each even every few for from had has have he her here his how
+    however i if in is it its kindly last many may me meanwhile more most my no not now of on once one only or
+    our out over please recently she since sir so some such that the their then there these they this those
+    though to today until we were what when where which while who why will with without yesterday yet you your
+""".split())
+# Capitalised complaint vocabulary that is never a name by itself, anywhere in a sentence
+_KNOWN_TERMS = frozenset("""
+    aadhaar pan ifsc fir rto upi otp gst pf id i police passport officer inspector constable clerk office department
+    court municipal corporation service
+""".split())
+
+
+def needs_ner(text):
+    """Cheap guess at whether the NLP tier could still find something.
+
+    Names, places and organisations show up as capitalised words. A sentence's
+    first word counts too unless it is a common sentence opener, so "Rajesh
+    demanded..." still goes to NER while "The clerk demanded..." does not.
+    Identifier names and office titles (PAN, FIR, Inspector) are ignored.
+    Long digit runs may be account or foreign phone numbers the fast tier
+    doesn't know about. Names written entirely in lowercase are not detected,
+    which is why the 'auto' policy that relies on this is opt-in.
+    """
+    if _DIGIT_RUN.search(text):
+        return True
+    for sentence in _SENTENCE_SPLIT.split(_TAG.sub(' ', text)):
+        words = _WORD.findall(sentence)
+        if words and words[0][0].isupper() and words[0].lower() not in _SENTENCE_STARTERS | _KNOWN_TERMS:
+            return True
+        if any(word[0].isupper() and word.lower() not in _KNOWN_TERMS for word in words[1:]):
+            return True
+    return False
@@ -0,0 +1,300 @@
+"""Slow-query log with query plans, and N+1 detection, per route.
+
+``db.connect`` opens ``TracingConnection``s. Every statement a request runs
+is collected by SQL text. When the request ends:
+
+* statements whose execution plus fetches took QUERY_LOG_SLOW_MS or longer
+  are logged with the shape of their bound parameters (types only; values
+  can hold complaint text) and their ``EXPLAIN QUERY PLAN``, captured on the
+  same connection while the statement ran;
+* SQL text that ran QUERY_LOG_REPEAT_THRESHOLD times or more is flagged as a
+  likely N+1 (a loop doing one query per item), and separately how often the
+  very same parameters were sent again. These are logged once per route and
+  statement, then only counted.
+
+Slow statements on worker threads are logged as soon as they pass the
+threshold. ``LOG.report()`` aggregates all of it per route since the process
+started, for /api/query-log/report; ``SCAN`` lines in a plan are full table
+(or full index) scans. QUERY_LOG=0 turns tracing off.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+from metrics import TimedConnection, TimedCursor, route_label
+
+ENABLED = os.environ.get('QUERY_LOG', '1') != '0'
+SLOW_MS = float(os.environ.get('QUERY_LOG_SLOW_MS', 100))
+REPEAT_THRESHOLD = int(os.environ.get('QUERY_LOG_REPEAT_THRESHOLD', 5))
+
+# Statements kept per route in the report, and query plans cached by SQL text
+MAX_STATEMENTS_PER_ROUTE = 100
+PLAN_CACHE_SIZE = 512
+# Longer SQL is cut short in log lines
+LOG_SQL_CHARS = 300
+
+
+def one_line(sql):
+    return ' '.join(sql.split())
+
+
+def parameter_shape(parameters):
+    """The types of the bound parameters, e.g. ``(int, str)``; ``many`` for executemany and scripts."""
+    if parameters is None:
+        return 'many'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f':{name} {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+
+def _parameters_key(parameters):
+    try:
+        return hash(tuple(sorted(parameters.items())) if isinstance(parameters, dict) else tuple(parameters))
+    except TypeError:
+        return None
+
+
+class Statement:
+    """Runs of one SQL text within a request."""
+
+    __slots__ = ('count', 'seconds', 'seen', 'identical')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.seen = {}
+        self.identical = 1
+
+    def add(self, parameters, seconds):
+        self.count += 1
+        self.seconds += seconds
+        key = None if parameters is None else _parameters_key(parameters)
+        if key is not None:
+            times = self.seen[key] = self.seen.get(key, 0) + 1
+            if times > self.identical:
+                self.identical = times
+
+
+class Execution:
+    """One run of a statement: its time so far and, once slow, its plan."""
+
+    __slots__ = ('sql', 'parameters', 'seconds', 'statement', 'plan')
+
+    def __init__(self, sql, parameters, seconds, statement):
+        self.sql = sql
+        self.parameters = parameters
+        self.seconds = seconds
+        self.statement = statement
+        self.plan = None
+
+
+class _RequestTrace(threading.local):
+    route = None
+    statements = None
+    slow = None
+
+
+_request = _RequestTrace()
+
+
+class QueryLog:
+    """Collects statements per request and aggregates slow and repeated ones per route."""
+
+    def __init__(self, slow_ms=SLOW_MS, repeat_threshold=REPEAT_THRESHOLD):
+        self.slow_seconds = slow_ms / 1000
+        self.repeat_threshold = repeat_threshold
+        self._routes = {}
+        self._warned = set()
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Statements
+
+    def executed(self, cursor, sql, parameters, seconds):
+        statement = None
+        if _request.statements is not None:
+            statement = _request.statements.get(sql)
+            if statement is None:
+                statement = _request.statements[sql] = Statement()
+            statement.add(parameters, seconds)
+        execution = cursor.execution = Execution(sql, parameters, seconds, statement)
+        if seconds >= self.slow_seconds:
+            self._slow(cursor, execution)
+
+    def fetched(self, cursor, seconds):
+        execution = cursor.execution
+        if execution is None:
+            return
+        execution.seconds += seconds
+        if execution.statement is not None:
+            execution.statement.seconds += seconds
+        if execution.plan is None and execution.seconds >= self.slow_seconds:
+            self._slow(cursor, execution)
+
+    def _slow(self, cursor, execution):
+        execution.plan = self.explain(cursor.connection, execution.sql, execution.parameters)
+        if _request.slow is not None:
+            _request.slow.append(execution)
+        else:
+            self._log_slow('background', execution)
+            with self._lock:
+                self._add_slow(self._route('background'), execution)
+
+    def explain(self, conn, sql, parameters):
+        """``EXPLAIN QUERY PLAN`` lines, indented by depth; empty for executemany and scripts."""
+        if parameters is None:
+            return []
+        with self._lock:
+            plan = self._plans.get(sql)
+            if plan is not None:
+                self._plans.move_to_end(sql)
+                return plan
+        try:
+            # A plain cursor, so the EXPLAIN itself is neither timed nor traced
+            rows = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            return [f"(no plan: {e})"]
+        depths = {0: -1}
+        plan = []
+        for row in rows:
+            depths[row[0]] = depths.get(row[1], -1) + 1
+            plan.append('  ' * depths[row[0]] + row[3])
+        with self._lock:
+            self._plans[sql] = plan
+            while len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+    # Requests
+
+    def begin_request(self, route):
+        _request.route, _request.statements, _request.slow = route, {}, []
+
+    def end_request(self):
+        route, statements, slow = _request.route, _request.statements, _request.slow
+        _request.route = _request.statements = _request.slow = None
+        if statements is None:
+            return
+        repeated = [(sql, statement) for sql, statement in statements.items()
+                    if statement.count >= self.repeat_threshold]
+        with self._lock:
+            stats = self._route(route)
+            count = sum(statement.count for statement in statements.values())
+            stats['requests'] += 1
+            stats['statements'] += count
+            stats['max_statements'] = max(stats['max_statements'], count)
+            stats['seconds'] += sum(statement.seconds for statement in statements.values())
+            for execution in slow:
+                self._add_slow(stats, execution)
+            first_seen = []
+            for sql, statement in repeated:
+                entry = stats['repeated'].get(sql)
+                if entry is None:
+                    if len(stats['repeated']) >= MAX_STATEMENTS_PER_ROUTE:
+                        continue
+                    entry = stats['repeated'][sql] = {'requests': 0, 'max_runs': 0, 'max_identical': 0}
+                entry['requests'] += 1
+                entry['max_runs'] = max(entry['max_runs'], statement.count)
+                entry['max_identical'] = max(entry['max_identical'], statement.identical)
+                if (route, sql) not in self._warned:
+                    self._warned.add((route, sql))
+                    first_seen.append((sql, statement))
+        for execution in slow:
+            self._log_slow(route, execution)
+        for sql, statement in first_seen:
+            identical = (f", {statement.identical} times with the same parameters" if statement.identical > 1
+                         else '')
+            print(f"WARNING: Possible N+1 in {route}: statement ran {statement.count} times in one request"
+                  f"{identical}: {one_line(sql)[:LOG_SQL_CHARS]}")
+
+    def _log_slow(self, route, execution):
+        print(f"WARNING: Slow query in {route} ({execution.seconds * 1000:.1f} ms), parameters "
+              f"{parameter_shape(execution.parameters)}: {one_line(execution.sql)[:LOG_SQL_CHARS]} "
+              f"| plan: {'; '.join(line.strip() for line in execution.plan) or 'none'}")
+
+    # Report
+
+    def _route(self, route):
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = {'requests': 0, 'statements': 0, 'max_statements': 0, 'seconds': 0.0,
+                                           'slow': {}, 'repeated': {}}
+        return stats
+
+    def _add_slow(self, stats, execution):
+        entry = stats['slow'].get(execution.sql)
+        if entry is None:
+            if len(stats['slow']) >= MAX_STATEMENTS_PER_ROUTE:
+                return
+            entry = stats['slow'][execution.sql] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+        entry['count'] += 1
+        entry['seconds'] += execution.seconds
+        entry['max_seconds'] = max(entry['max_seconds'], execution.seconds)
+        entry['parameters'] = parameter_shape(execution.parameters)
+        entry['plan'] = execution.plan
+
+    def report(self):
+        """Per route, busiest first: statements per request, SQLite time, slow and repeated statements."""
+        with self._lock:
+            routes = []
+            for route, stats in self._routes.items():
+                requests = stats['requests']
+                routes.append({
+                    'route': route,
+                    'requests': requests,
+                    'statements_per_request': round(stats['statements'] / requests, 2) if requests else None,
+                    'max_statements': stats['max_statements'],
+                    'db_ms': round(stats['seconds'] * 1000, 1),
+                    'db_ms_per_request': round(stats['seconds'] * 1000 / requests, 2) if requests else None,
+                    'slow': sorted(({'sql': one_line(sql), 'count': entry['count'],
+                                     'max_ms': round(entry['max_seconds'] * 1000, 1),
+                                     'mean_ms': round(entry['seconds'] * 1000 / entry['count'], 1),
+                                     'parameters': entry['parameters'], 'plan': entry['plan'],
+                                     'scans': [line.strip() for line in entry['plan']
+                                               if line.strip().startswith('SCAN ')]}
+                                    for sql, entry in stats['slow'].items()),
+                                   key=lambda entry: -entry['max_ms']),
+                    'repeated': sorted(({'sql': one_line(sql), **entry} for sql, entry in stats['repeated'].items()),
+                                       key=lambda entry: -entry['max_runs']),
+                })
+        routes.sort(key=lambda route: -route['db_ms'])
+        return {'slow_ms': self.slow_seconds * 1000, 'repeat_threshold': self.repeat_threshold, 'routes': routes}
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+LOG = QueryLog()
+
+
+class TracingCursor(TimedCursor):
+    """``TimedCursor`` that also hands every statement and fetch to ``LOG``."""
+
+    execution = None
+
+    def _executed(self, sql, parameters, seconds):
+        super()._executed(sql, parameters, seconds)
+        if ENABLED:
+            LOG.executed(self, sql, parameters, seconds)
+
+    def _fetched(self, seconds):
+        super()._fetched(seconds)
+        if ENABLED:
+            LOG.fetched(self, seconds)
+
+
+class TracingConnection(TimedConnection):
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+
+def init_app(app):
+    """Traces the statements of every request."""
+    if not ENABLED:
+        return
+    app.before_request(lambda: LOG.begin_request(f"{request.method} {route_label()}"))
+    app.teardown_request(lambda exc: LOG.end_request())
@@ -0,0 +1,272 @@
+"""PII redaction service with request coalescing.
+
+Redaction is tiered. Every text first goes through the regex/checksum
+recognizers in pii_rules, on the caller's thread. Only texts that the NER
+policy says may still contain names or other free-form PII continue to the
+Presidio/spaCy tier.
+
+Callers submit single texts and get futures back. A dispatcher thread gathers
+whatever arrives within a short window into one micro-batch and runs it through
+Presidio's BatchAnalyzerEngine in a process pool, where each pool process keeps
+one loaded spaCy model for its whole life.
+
+Several web worker processes can share a single service (and so a single
+resident model) by running ``python redaction.py --serve`` and pointing them at
+it with REDACTION_SERVICE_ADDRESS. The connection unpickles what it receives,
+so both sides must share a secret REDACTION_SERVICE_AUTHKEY.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from multiprocessing.connection import Client, Listener
+
+import pii_rules
+
+# When to run the NER tier after the fast tier:
+#   always - every text (highest recall)
+#   auto   - only if pii_rules.needs_ner() finds possible names (capitalised words
+#            other than sentence openers and known terms) or digit runs; misses
+#            names written in lowercase, so it is opt-in
+#   never  - fast tier only
+NER_POLICIES = ('always', 'auto', 'never')
+
+# Entities the fast tier is authoritative for. The NER tier does not look for
+# these again. Phone numbers stay in both, since Presidio also catches
+# non-Indian formats.
+FAST_TIER_ONLY = {'EMAIL_ADDRESS', 'IN_AADHAAR', 'IN_PAN', 'IN_IFSC'}
+
+# Per-process Presidio engines, created once by _init_engines
+_batch_analyzer = None
+_anonymizer = None
+_ner_entities = None
+
+
+def _init_engines(language='en', entities=None):
+    """Loads Presidio, keeping only recognizers for the allowed entities."""
+    global _batch_analyzer, _anonymizer, _ner_entities
+    from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+    from presidio_anonymizer import AnonymizerEngine
+    analyzer = AnalyzerEngine()
+    allowed = set(entities or analyzer.get_supported_entities(language)) - FAST_TIER_ONLY
+    analyzer.registry.recognizers = [recognizer for recognizer in analyzer.registry.recognizers
+                                     if allowed & set(recognizer.supported_entities)]
+    _ner_entities = sorted(allowed)
+    _batch_analyzer = BatchAnalyzerEngine(analyzer_engine=analyzer)
+    _anonymizer = AnonymizerEngine()
+
+
+def _redact_batch(texts, language, entities=None):
+    if _batch_analyzer is None:
+        _init_engines(language, entities)
+    results = _batch_analyzer.analyze_iterator(texts, language=language, entities=_ner_entities,
+                                               batch_size=len(texts))
+    return [_anonymizer.anonymize(text=text, analyzer_results=list(analyzer_results)).text
+            for text, analyzer_results in zip(texts, results)]
+
+
+class RedactionService:
+    """Coalesces concurrent redaction requests into micro-batches.
+
+    With pool_size=0 batches run on the dispatcher thread of the calling
+    process instead of in a process pool. ``entities`` is an optional
+    allow-list of entity types to redact; None means everything Presidio
+    supports.
+    """
+
+    def __init__(self, pool_size=1, batch_window=0.01, max_batch_size=32, language='en',
+                 ner_policy='always', entities=None):
+        if ner_policy not in NER_POLICIES:
+            raise ValueError(f"ner_policy must be one of {NER_POLICIES}")
+        self.pool_size = pool_size
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.language = language
+        self.ner_policy = ner_policy
+        self.entities = list(entities) if entities else None
+        self._requests = queue.Queue()
+        self._pool = None
+        self._dispatcher = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            if self.pool_size > 0:
+                # Spawned rather than forked: the web process already runs threads
+                self._pool = ProcessPoolExecutor(max_workers=self.pool_size,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_engines,
+                                                 initargs=(self.language, self.entities))
+            self._dispatcher = threading.Thread(target=self._dispatch, name='redaction-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, text):
+        """Queues a text for redaction and returns a Future for the redacted text."""
+        future = Future()
+        if not text:
+            future.set_result(text)
+            return future
+        text = pii_rules.redact(text, self.entities)
+        if self.ner_policy == 'never' or (self.ner_policy == 'auto' and not pii_rules.needs_ner(text)):
+            future.set_result(text)
+            return future
+        self._start()
+        self._requests.put((text, future))
+        return future
+
+    def redact(self, text, timeout=60):
+        return self.submit(text).result(timeout)
+
+    def redact_many(self, texts, timeout=300):
+        """Redacts a list of texts, e.g. for bulk imports; they share batches with live traffic."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _collect_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+            futures = [future for _, future in batch]
+            if self._pool is None:
+                try:
+                    self._resolve(futures, _redact_batch(texts, self.language, self.entities), None)
+                except Exception as e:
+                    self._resolve(futures, None, e)
+            else:
+                try:
+                    pending = self._pool.submit(_redact_batch, texts, self.language, self.entities)
+                except Exception as e:
+                    # Keep dispatching; callers see the error instead of timing out
+                    self._resolve(futures, None, e)
+                    continue
+                pending.add_done_callback(
+                    lambda done, futures=futures: self._resolve(futures, None if done.exception() else done.result(),
+                                                                done.exception()))
+
+    @staticmethod
+    def _resolve(futures, results, error):
+        for i, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RemoteRedactionService:
+    """Client for a redaction service running in another process."""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        self._local = threading.local()
+
+    def _call(self, texts, timeout):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        try:
+            conn.send(texts)
+            if not conn.poll(timeout):
+                # The late reply would be read by the next call; start over instead
+                conn.close()
+                self._local.conn = None
+                raise TimeoutError(f"Redaction service did not reply within {timeout}s")
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise
+        if status == 'error':
+            raise RuntimeError(f"Redaction service error: {result}")
+        return result
+
+    def redact(self, text, timeout=60):
+        if not text:
+            return text
+        return self._call([text], timeout)[0]
+
+    def redact_many(self, texts, timeout=300):
+        return self._call(list(texts), timeout)
+
+
+def require_authkey(authkey):
+    """Rejects a missing authkey; without one any peer could send pickles to run."""
+    if not authkey:
+        raise RuntimeError("REDACTION_SERVICE_AUTHKEY must be set to use the shared redaction service")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def parse_entities(value):
+    """Turns a comma-separated allow-list into a list, or None when empty."""
+    entities = [entity.strip().upper() for entity in (value or '').split(',') if entity.strip()]
+    return entities or None
+
+
+def parse_address(value):
+    """Accepts 'host:port' for TCP or a filesystem path for a Unix socket."""
+    host, sep, port = value.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return value
+
+
+def serve(address, authkey, service):
+    listener = Listener(address, authkey=require_authkey(authkey))
+    print(f"Redaction service listening on {address}")
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    texts = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', service.redact_many(texts)))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the shared PII redaction service.')
+    parser.add_argument('--serve', action='store_true', required=True)
+    parser.add_argument('--address', default=os.environ.get('REDACTION_SERVICE_ADDRESS', '127.0.0.1:6100'))
+    parser.add_argument('--pool-size', type=int, default=int(os.environ.get('REDACTION_POOL_SIZE', 1)))
+    parser.add_argument('--batch-window-ms', type=float, default=float(os.environ.get('REDACTION_BATCH_WINDOW_MS', 10)))
+    parser.add_argument('--max-batch-size', type=int, default=int(os.environ.get('REDACTION_MAX_BATCH_SIZE', 32)))
+    parser.add_argument('--ner-policy', choices=NER_POLICIES, default=os.environ.get('REDACTION_NER_POLICY', 'always'))
+    parser.add_argument('--entities', default=os.environ.get('REDACTION_ENTITIES', ''),
+                        help='Comma-separated allow-list of entity types (default: all)')
+    args = parser.parse_args()
+    service = RedactionService(pool_size=args.pool_size, batch_window=args.batch_window_ms / 1000,
+                               max_batch_size=args.max_batch_size, ner_policy=args.ner_policy,
+                               entities=parse_entities(args.entities))
+    if not os.environ.get('REDACTION_SERVICE_AUTHKEY'):
+        parser.error('REDACTION_SERVICE_AUTHKEY must be set')
+    serve(parse_address(args.address), os.environ['REDACTION_SERVICE_AUTHKEY'], service)
@@ -0,0 +1,268 @@
+"""Response cache for read-only routes, keyed on table write versions.
+
+``table_versions`` holds a counter per table that triggers bump on every
+insert, update and delete, whichever route, worker or script did the write.
+A cached route names the tables it reads::
+
+    @app.route('/api/dashboard', methods=['GET'])
+    @response_cache.cached('complaints', 'rewards', 'most_wanted', 'community_reports', 'feedback')
+    def get_dashboard(): ...
+
+Each request reads those versions (one query for all its tables) and
+derives the ETag from the path, query string and versions. A client sending
+that ETag in If-None-Match gets a 304 without the view running. Otherwise the
+body is served from a bounded in-process LRU, then from an optional SQLite
+file shared by all worker processes, and only then computed. Responses carry
+``Cache-Control: no-cache``, so browsers revalidate every time and see writes
+immediately.
+
+A view can keep one response out of the cache (say, a failed model call
+reported with a 200) by setting ``Cache-Control: no-store`` on it.
+
+Routes whose output also depends on the clock (a default "last 30 days"
+range) pass ``clock=seconds``; their ETags change at least that often.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request
+
+VERSIONS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS table_versions
+                        (table_name TEXT PRIMARY KEY,
+                         version INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID'''
+
+TRACKED_TABLES = ('complaints', 'comments', 'community_reports', 'feedback', 'most_wanted', 'officials', 'rewards')
+
+DISK_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS response_cache
+                    (key TEXT PRIMARY KEY,
+                     etag TEXT NOT NULL,
+                     status INTEGER NOT NULL,
+                     headers TEXT NOT NULL,
+                     body BLOB NOT NULL,
+                     size INTEGER NOT NULL,
+                     last_access REAL NOT NULL)'''
+
+# Entry count and total size of response_cache, kept by triggers so inserts
+# don't have to aggregate the whole table
+DISK_TOTALS_SQL = [
+    '''CREATE TABLE IF NOT EXISTS response_cache_totals
+       (id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL)''',
+    '''INSERT OR IGNORE INTO response_cache_totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM response_cache''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_response_cache_insert AFTER INSERT ON response_cache
+       BEGIN UPDATE response_cache_totals SET entries = entries + 1, bytes = bytes + NEW.size; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_response_cache_update AFTER UPDATE OF size ON response_cache
+       BEGIN UPDATE response_cache_totals SET bytes = bytes + NEW.size - OLD.size; END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_response_cache_delete AFTER DELETE ON response_cache
+       BEGIN UPDATE response_cache_totals SET entries = entries - 1, bytes = bytes - OLD.size; END''',
+]
+
+# Hits within this many seconds of the last recorded access don't rewrite it
+ACCESS_RESOLUTION = 60
+# Headers the view set that are stored with the body
+STORED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'Link')
+
+
+def trigger_sql():
+    """CREATE TRIGGER statements bumping a table's version on every change."""
+    statements = []
+    for table in TRACKED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_versions_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}'; END''')
+    return statements
+
+
+def install(c):
+    c.execute(VERSIONS_TABLE_SQL)
+    c.executemany('INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)',
+                  [(table,) for table in TRACKED_TABLES])
+    for sql in trigger_sql():
+        c.execute(sql)
+
+
+def read_versions(conn, tables):
+    """Current version of each table, in order."""
+    rows = conn.execute(f"SELECT table_name, version FROM table_versions "
+                        f"WHERE table_name IN ({', '.join('?' * len(tables))})", tables).fetchall()
+    versions = dict(rows)
+    return [versions[table] for table in tables]
+
+
+class DiskTier:
+    """Cached responses in a SQLite file, shared by every worker process."""
+
+    def __init__(self, db_path, max_entries=10000, max_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(DISK_TABLE_SQL)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)')
+        for sql in DISK_TOTALS_SQL:
+            conn.execute(sql)
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, etag):
+        conn = self._connect()
+        row = conn.execute('SELECT status, headers, body, last_access FROM response_cache WHERE key = ? AND etag = ?',
+                           (key, etag)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[3] > ACCESS_RESOLUTION:
+            conn.execute('UPDATE response_cache SET last_access = ? WHERE key = ?', (now, key))
+            conn.commit()
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key, etag, status, headers, body):
+        conn = self._connect()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the totals trigger
+        conn.execute('''INSERT INTO response_cache VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (key) DO UPDATE SET etag = excluded.etag, status = excluded.status,
+                            headers = excluded.headers, body = excluded.body, size = excluded.size,
+                            last_access = excluded.last_access''',
+                     (key, etag, status, json.dumps(headers), body, len(body), time.time()))
+        entries, total_bytes = conn.execute('SELECT entries, bytes FROM response_cache_totals').fetchone()
+        excess_entries = entries - self.max_entries
+        excess_bytes = total_bytes - self.max_bytes
+        if excess_entries > 0 or excess_bytes > 0:
+            # Count how many of the least recently used rows must go, then drop them in one statement
+            victims = 0
+            rows = conn.execute('SELECT size FROM response_cache ORDER BY last_access')
+            for size, in rows:
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    break
+                victims += 1
+                excess_entries -= 1
+                excess_bytes -= size
+            rows.close()
+            conn.execute('''DELETE FROM response_cache WHERE key IN
+                            (SELECT key FROM response_cache ORDER BY last_access LIMIT ?)''', (victims,))
+        conn.commit()
+
+    def stats(self):
+        entries, total_bytes = self._connect().execute('SELECT entries, bytes FROM response_cache_totals').fetchone()
+        return {'entries': entries, 'bytes': int(total_bytes), 'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes}
+
+
+class ResponseCache:
+    """ETags from table versions, with an in-process LRU and an optional disk tier."""
+
+    def __init__(self, get_db, max_entries=1000, max_bytes=32 * 1024 * 1024, disk=None):
+        self.get_db = get_db
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'not_modified': 0, 'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1:]
+
+    def _put(self, key, etag, status, headers, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[3])
+            self._entries[key] = (etag, status, headers, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[3])
+                self._stats['evictions'] += 1
+
+    def cached(self, *tables, clock=None):
+        """Decorates a GET view whose response depends only on its URL and ``tables``."""
+        unknown = set(tables) - set(TRACKED_TABLES)
+        if unknown:
+            raise ValueError(f"Tables without version triggers: {', '.join(sorted(unknown))}")
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                with self.get_db() as conn:
+                    versions = read_versions(conn, tables)
+                key = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+                tick = int(time.time() // clock) if clock else ''
+                etag = hashlib.sha1(f"{key}\0{versions}\0{tick}".encode('utf-8')).hexdigest()[:20]
+                # Weak comparison: compressed responses carry the tag as W/"..."
+                if request.if_none_match.contains_weak(etag):
+                    self._count('not_modified')
+                    return self._respond(Response(status=304), etag)
+
+                entry = self._get(key, etag)
+                if entry is None and self.disk is not None:
+                    entry = self.disk.get(key, etag)
+                    if entry is not None:
+                        self._count('disk_hits')
+                        self._put(key, etag, *entry)
+                if entry is None:
+                    self._count('misses')
+                    response = make_response(view(*args, **kwargs))
+                    # Errors, files and no-store responses pass through untouched; streamed listings are buffered here
+                    if response.status_code != 200 or response.direct_passthrough or response.cache_control.no_store:
+                        return response
+                    entry = (response.status_code,
+                             [(name, value) for name, value in response.headers if name in STORED_HEADERS],
+                             response.get_data())
+                    self._put(key, etag, *entry)
+                    if self.disk is not None:
+                        self.disk.put(key, etag, *entry)
+                status, headers, body = entry
+                return self._respond(Response(body, status=status, headers=headers), etag)
+            return wrapper
+        return decorator
+
+    def _respond(self, response, etag):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_entries=self.max_entries,
+                         max_bytes=self.max_bytes)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
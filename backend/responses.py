@@ -0,0 +1,140 @@
+"""JSON encoding, streamed listings and compression for API responses.
+
+With orjson installed, ``jsonify`` encodes through it instead of the standard
+library; the output keeps Flask's sorted keys and date format. Listing pages
+are not built as one string: ``json_array_response`` encodes the rows in
+chunks as the body is sent, straight from ``sqlite3.Row`` objects, so a page
+is never held as rows, dicts and JSON text at once.
+
+Responses of a compressible type from ``min_bytes`` up, and all streamed
+listings, are compressed with brotli, when the module is installed and the
+client accepts it, or gzip. Compressed responses get a weak ETag, since the
+bytes differ from the identity encoding.
+"""
+import json
+import sqlite3
+import zlib
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STREAM_CHUNK_ROWS = 64
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+def _plain(item):
+    return dict(item) if isinstance(item, sqlite3.Row) else item
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj):
+        return json.dumps(obj, default=DefaultJSONProvider.default, sort_keys=True,
+                          separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+def encode_array(items, chunk_rows=STREAM_CHUNK_ROWS):
+    """Yields a JSON array of ``items`` (dicts or sqlite3.Row) a chunk of rows at a time."""
+    yield b'['
+    for start in range(0, len(items), chunk_rows):
+        chunk = dumps([_plain(item) for item in items[start:start + chunk_rows]])
+        yield (b',' if start else b'') + chunk[1:-1]
+    yield b']\n'
+
+
+def json_array_response(items):
+    return current_app.response_class(encode_array(items), mimetype='application/json')
+
+
+# Compression
+
+def _gzip(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Compressor:
+    """after_request hook compressing responses the client accepts compressed."""
+
+    def __init__(self, min_bytes=1024, gzip_level=6, brotli_quality=5):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = (['br'] if brotli is not None else []) + ['gzip']
+
+    def __call__(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        if not response.is_streamed and response.content_length is not None \
+                and response.content_length < self.min_bytes:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            chunks = response.iter_encoded()
+            response.response = (_brotli_stream(chunks, self.brotli_quality) if encoding == 'br'
+                                 else _gzip_stream(chunks, self.gzip_level))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            response.set_data(brotli.compress(data, quality=self.brotli_quality) if encoding == 'br'
+                              else _gzip(data, self.gzip_level))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def init_app(app, min_bytes=1024, gzip_level=6, brotli_quality=5):
+    """Installs the orjson provider (when available) and response compression."""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+    app.after_request(Compressor(min_bytes, gzip_level, brotli_quality))
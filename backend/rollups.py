@@ -0,0 +1,244 @@
+"""Trigger-maintained complaint rollups behind the trend and resolution charts.
+
+``complaint_rollups`` holds one row per granularity (hour, day, week, month),
+bucket, type and department. It counts the complaints created in the bucket
+and the complaints resolved in it, with the sum of their resolution times in
+days. Buckets are sortable text: '2024-03-05 14:00', '2024-03-05', the
+week's Monday '2024-03-04', and '2024-03'.
+
+Insert, update and delete triggers move a complaint's contributions between
+buckets inside the writing transaction, like the dashboard counters, so a
+chart reads a range of one granularity instead of grouping the complaints
+table. A resolved complaint counts in the bucket of its updated_at, which the
+status routes set. The same expressions recompute the rollups from scratch:
+
+    python rollups.py --check    # report buckets that drifted from complaints
+    python rollups.py --rebuild  # recompute the rollups, then check again
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from db import DB_PATH
+from pagination import BadQueryParameter
+
+ROLLUPS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS complaint_rollups
+                       (granularity TEXT NOT NULL,
+                        bucket TEXT NOT NULL,
+                        type TEXT NOT NULL,
+                        department TEXT NOT NULL,
+                        created INTEGER NOT NULL DEFAULT 0,
+                        resolved INTEGER NOT NULL DEFAULT 0,
+                        resolution_days REAL NOT NULL DEFAULT 0,
+                        PRIMARY KEY (granularity, bucket, type, department)) WITHOUT ROWID'''
+
+# granularity -> bucket of a timestamp expression
+BUCKETS = {
+    'hour': "strftime('%Y-%m-%d %H:00', {ts})",
+    'day': 'DATE({ts})',
+    'week': "DATE({ts}, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m', {ts})",
+}
+GRANULARITIES = list(BUCKETS)
+
+# measure -> (columns whose update moves it, timestamp bucketed, condition, {column: per-row value}).
+# "{row}" is NEW or OLD inside the triggers and complaints when rebuilding.
+MEASURES = {
+    'created': (('created_at', 'type', 'department'), 'created_at', '1', {'created': '1'}),
+    'resolved': (('created_at', 'updated_at', 'status', 'type', 'department'), 'updated_at',
+                 "{row}.status IS 'Resolved' AND {row}.created_at IS NOT NULL", {
+                     'resolved': '1',
+                     'resolution_days': 'JULIANDAY({row}.updated_at) - JULIANDAY({row}.created_at)',
+                 }),
+}
+VALUES = ['created', 'resolved', 'resolution_days']
+GROUPS = {'type': 'type', 'department': 'department'}
+
+# Range shown when the request gives no 'from'
+DEFAULT_SPANS = {'hour': timedelta(days=2), 'day': timedelta(days=30), 'week': timedelta(weeks=26),
+                 'month': timedelta(days=730)}
+MAX_BUCKETS = 2000
+
+
+def _contribution(measure, row, sign):
+    """INSERT adding (sign '+') or removing (sign '-') one row's measure in every granularity."""
+    _, timestamp, condition, values = MEASURES[measure]
+    buckets = ' UNION ALL '.join(f"SELECT '{name}' AS granularity, {expr.format(ts=f'{row}.{timestamp}')} AS bucket"
+                                 for name, expr in BUCKETS.items())
+    columns = ', '.join(values)
+    selected = ', '.join(f"{sign}({values[name].format(row=row)})" for name in values)
+    updates = ', '.join(f'{name} = {name} + excluded.{name}' for name in values)
+    return f'''INSERT INTO complaint_rollups (granularity, bucket, type, department, {columns})
+               SELECT b.granularity, b.bucket, COALESCE({row}.type, ''), COALESCE({row}.department, ''), {selected}
+               FROM ({buckets}) b WHERE b.bucket IS NOT NULL AND ({condition.format(row=row)})
+               ON CONFLICT DO UPDATE SET {updates};'''
+
+
+def trigger_sql():
+    """CREATE TRIGGER statements keeping complaint_rollups in step with complaints."""
+    statements = []
+    for measure, (watched, _, _, _) in MEASURES.items():
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_rollups_{measure}_insert AFTER INSERT ON complaints
+            BEGIN {_contribution(measure, 'NEW', '+')} END''')
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_rollups_{measure}_delete AFTER DELETE ON complaints
+            BEGIN {_contribution(measure, 'OLD', '-')} END''')
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS trg_rollups_{measure}_update
+            AFTER UPDATE OF {', '.join(watched)} ON complaints
+            BEGIN {_contribution(measure, 'OLD', '-')} {_contribution(measure, 'NEW', '+')} END''')
+    return statements
+
+
+def install(c):
+    """Creates the rollups table and its triggers, then fills it from complaints."""
+    c.execute(ROLLUPS_TABLE_SQL)
+    for sql in trigger_sql():
+        c.execute(sql)
+    rebuild(c)
+
+
+def recompute(c):
+    """{(granularity, bucket, type, department): [created, resolved, resolution_days]} from complaints."""
+    rollups = {}
+    for measure, (_, timestamp, condition, values) in MEASURES.items():
+        columns = ', '.join(f"SUM({expr.format(row='complaints')})" for expr in values.values())
+        for granularity, expr in BUCKETS.items():
+            bucket = expr.format(ts=f'complaints.{timestamp}')
+            for row in c.execute(f'''SELECT {bucket}, COALESCE(type, ''), COALESCE(department, ''), {columns}
+                                     FROM complaints WHERE {bucket} IS NOT NULL AND ({condition.format(row='complaints')})
+                                     GROUP BY 1, 2, 3'''):
+                totals = rollups.setdefault((granularity,) + tuple(row[:3]), [0, 0, 0.0])
+                for name, value in zip(values, row[3:]):
+                    totals[VALUES.index(name)] += value
+    return rollups
+
+
+def rebuild(c):
+    """Overwrites the stored rollups with freshly computed ones. Returns the number of rows."""
+    rollups = recompute(c)
+    c.execute('DELETE FROM complaint_rollups')
+    c.executemany('INSERT INTO complaint_rollups VALUES (?, ?, ?, ?, ?, ?, ?)',
+                  [key + tuple(values) for key, values in rollups.items()])
+    return len(rollups)
+
+
+def drift(c, tolerance=1e-6):
+    """Returns {key: (stored, actual)} for every bucket that disagrees with complaints."""
+    actual = recompute(c)
+    stored = {tuple(row[:4]): list(row[4:]) for row in c.execute('SELECT * FROM complaint_rollups')
+              if any(row[4:])}
+    problems = {}
+    for key in set(actual) | set(stored):
+        a, b = stored.get(key, [0, 0, 0.0]), actual.get(key, [0, 0, 0.0])
+        if a[:2] != b[:2] or abs(a[2] - b[2]) > tolerance * max(1.0, abs(b[2])):
+            problems[key] = (a, b)
+    return problems
+
+
+# Reading
+
+def _parse_time(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        # Timestamps are stored as naive local times
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        raise BadQueryParameter(f"{name} must be an ISO date or date and time")
+
+
+def bucket_start(granularity, moment):
+    """Start of the bucket containing ``moment``, as a datetime."""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(granularity, start):
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(weeks=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def bucket_label(granularity, start):
+    """The bucket's key in complaint_rollups, as BUCKETS would compute it."""
+    return start.strftime({'hour': '%Y-%m-%d %H:00', 'month': '%Y-%m'}.get(granularity, '%Y-%m-%d'))
+
+
+def parse_range(args, default_granularity='day'):
+    """(granularity, bucket labels from 'from' to 'to' inclusive, group_by or None) from query args."""
+    granularity = args.get('granularity') or default_granularity
+    if granularity not in BUCKETS:
+        raise BadQueryParameter(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    group_by = args.get('group_by') or None
+    if group_by is not None and group_by not in GROUPS:
+        raise BadQueryParameter(f"group_by must be one of {', '.join(GROUPS)}")
+    end = _parse_time(args, 'to') or datetime.now()
+    start = _parse_time(args, 'from') or end - DEFAULT_SPANS[granularity]
+    if start > end:
+        raise BadQueryParameter('from must not be after to')
+
+    labels = []
+    bucket = bucket_start(granularity, start)
+    while bucket <= end:
+        if len(labels) == MAX_BUCKETS:
+            raise BadQueryParameter(f"from and to span more than {MAX_BUCKETS} {granularity} buckets")
+        labels.append(bucket_label(granularity, bucket))
+        bucket = next_bucket(granularity, bucket)
+    return granularity, labels, group_by
+
+
+def series(c, granularity, labels, group_by=None):
+    """{group: {bucket: [created, resolved, resolution_days]}} for the given buckets.
+
+    Without ``group_by`` everything is under the group None.
+    """
+    # Ungrouped, the primary key already returns the rows in bucket order
+    group, grouping = (GROUPS[group_by], '1, 2') if group_by else ('NULL', '1')
+    rows = c.execute(f'''SELECT bucket, {group}, SUM(created), SUM(resolved), SUM(resolution_days)
+                         FROM complaint_rollups WHERE granularity = ? AND bucket BETWEEN ? AND ?
+                         GROUP BY {grouping}''', (granularity, labels[0], labels[-1])).fetchall()
+    result = {}
+    for bucket, name, created, resolved, days in rows:
+        result.setdefault(name, {})[bucket] = [created, resolved, days]
+    return result
+
+
+def totals(c, group_by='type'):
+    """[(group, created, resolved, resolution_days)] over all time, from the monthly rollups."""
+    return c.execute(f'''SELECT {GROUPS[group_by]}, SUM(created), SUM(resolved), SUM(resolution_days)
+                         FROM complaint_rollups WHERE granularity = 'month' GROUP BY 1 ORDER BY 1''').fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or rebuild the complaint rollups.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check', action='store_true', help='Report buckets that drifted from complaints')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every bucket from scratch')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        # The write lock keeps other writers (and their triggers) out until the new rows are in
+        conn.execute('BEGIN IMMEDIATE')
+        before = drift(conn)
+        rows = rebuild(conn)
+        conn.commit()
+        print(f"Rebuilt {rows} rollup rows ({len(before)} bucket(s) had drifted)")
+    problems = drift(conn)
+    for key, (stored, actual) in sorted(problems.items())[:20]:
+        print(f"WARNING: {key} is {stored}, complaints say {actual}")
+    if args.check or args.rebuild:
+        print('Rollups match complaints' if not problems else f'{len(problems)} bucket(s) drifted')
+    conn.close()
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,369 @@
+"""Full-text search over complaints, comments and community reports.
+
+Each searchable text column has an external-content FTS5 index, e.g.
+``complaints_fts`` over ``complaints.description``. The index stores only the
+inverted lists; the text stays in the base table. Insert, update and delete
+triggers keep each index in step inside the writing transaction.
+
+A search runs one MATCH per source. Each hit is joined to its row for the
+facet filters (type, department, status) and ranked by BM25, and the sources
+are merged into one list. Only the newest SEARCH_RANK_WINDOW matches of each
+source are ranked, which keeps broad queries ("bribe" over millions of rows)
+in the tens of milliseconds. The page cursor pins that window, so later pages
+rank the same rows even while new ones arrive.
+
+    python search.py --check     # FTS5 integrity check of every index
+    python search.py --rebuild   # rebuild the indexes from the base tables
+    python search.py --optimize  # merge index segments after bulk loads
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+from db import DB_PATH
+from pagination import BadQueryParameter, decode_cursor, encode_cursor, page_limit
+
+# Snippet markers; private control characters that never appear in stored text
+_OPEN, _CLOSE = '\x02', '\x03'
+SNIPPET_TOKENS = 12
+# Matches ranked per source; see search()
+RANK_WINDOW = int(os.environ.get('SEARCH_RANK_WINDOW', 5000))
+
+# table -> indexed column
+INDEXED = {
+    'complaints': 'description',
+    'comments': 'comment',
+    'community_reports': 'description',
+}
+
+# Result kind -> where its rows and facet columns live. Facet filters a source
+# cannot answer (department for community reports) leave it out of the results.
+SOURCES = {
+    'complaint': {
+        'fts': 'complaints_fts',
+        'table': 'complaints c',
+        'key': 'c.id',
+        'joins': '',
+        'select': 'c.id, c.id AS complaint_id, c.type, c.department, c.status, c.created_at',
+        'facets': {'type': 'c.type', 'department': 'c.department', 'status': 'c.status'},
+    },
+    'comment': {
+        'fts': 'comments_fts',
+        'table': 'comments m',
+        'key': 'm.id',
+        'joins': 'JOIN complaints c ON c.id = m.complaint_id',
+        'select': 'm.id, m.complaint_id, c.type, c.department, c.status, m.timestamp AS created_at',
+        'facets': {'type': 'c.type', 'department': 'c.department', 'status': 'c.status'},
+    },
+    'community_report': {
+        'fts': 'community_reports_fts',
+        'table': 'community_reports r',
+        'key': 'r.id',
+        'joins': '',
+        'select': 'r.id, NULL AS complaint_id, r.issue AS type, NULL AS department, r.status, r.created_at',
+        'facets': {'type': 'r.issue', 'status': 'r.status'},
+    },
+}
+KINDS = list(SOURCES)
+FACETS = ('type', 'department', 'status')
+
+_TERM = re.compile(r'(-?)"([^"]*)"|(\S+)')
+_WORD = re.compile(r'\w')
+
+
+def fts_table_sql(table, column):
+    return f'''CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+                   {column}, content='{table}', content_rowid='id',
+                   tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')'''
+
+
+def trigger_sql():
+    """Triggers mirroring every insert, delete and text update into the FTS indexes."""
+    statements = []
+    for table, column in INDEXED.items():
+        fts = f'{table}_fts'
+        insert = f'INSERT INTO {fts} (rowid, {column}) VALUES (NEW.id, NEW.{column});'
+        # External-content deletes must be given the values that were indexed
+        delete = f"INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', OLD.id, OLD.{column});"
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS trg_fts_{table}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_fts_{table}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+            f'''CREATE TRIGGER IF NOT EXISTS trg_fts_{table}_update AFTER UPDATE OF {column} ON {table}
+                BEGIN {delete} {insert} END''',
+        ]
+    return statements
+
+
+def install(c):
+    for table, column in INDEXED.items():
+        c.execute(fts_table_sql(table, column))
+    for sql in trigger_sql():
+        c.execute(sql)
+    rebuild(c)
+
+
+def rebuild(c):
+    for table in INDEXED:
+        c.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def optimize(c):
+    for table in INDEXED:
+        c.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('optimize')")
+
+
+def check(c):
+    """Runs the FTS5 integrity check against the base tables. Returns {table: error}."""
+    problems = {}
+    for table in INDEXED:
+        try:
+            c.execute(f"INSERT INTO {table}_fts ({table}_fts, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as e:
+            problems[table] = str(e)
+    return problems
+
+
+def parse_query(text):
+    """Turns user search text into an FTS5 MATCH expression.
+
+    Words must all match. "Quoted words" match as a phrase, a trailing * makes
+    a prefix query (brib* finds bribe and bribery), and a leading - excludes.
+    Everything is quoted, so FTS5 operators typed by users are plain text.
+    """
+    required, excluded = [], []
+    for negated_phrase, phrase, word in _TERM.findall(text or ''):
+        negate = bool(negated_phrase)
+        prefix = False
+        if not phrase:
+            negate = word.startswith('-') and len(word) > 1
+            prefix = word.endswith('*')
+            phrase = word.lstrip('-').rstrip('*')
+        if not _WORD.search(phrase):
+            continue
+        term = '"' + phrase.replace('"', '""') + '"' + ('*' if prefix else '')
+        (excluded if negate else required).append(term)
+    if not required:
+        raise BadQueryParameter('q must contain at least one word to search for')
+    expression = ' AND '.join(required)
+    for term in excluded:
+        expression = f'({expression}) NOT {term}'
+    return expression
+
+
+def parse_kinds(args):
+    value = args.get('kinds')
+    if not value:
+        return KINDS
+    kinds = [kind.strip() for kind in value.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in SOURCES]
+    if unknown:
+        raise BadQueryParameter(f"kinds must be a comma-separated subset of {', '.join(KINDS)}")
+    return kinds
+
+
+def _filters(source, args):
+    """WHERE clauses for the facet filters, or None if the source cannot satisfy them."""
+    where, params = [], []
+    for facet in FACETS:
+        value = args.get(facet)
+        if not value:
+            continue
+        column = source['facets'].get(facet)
+        if column is None:
+            return None
+        where.append(f'{column} = ?')
+        params.append(value)
+    return where, params
+
+
+def highlight(snippet):
+    """Splits a marked-up snippet into [{'text', 'match'}] segments.
+
+    Clients render matches as they like without handling raw HTML from
+    user-written text.
+    """
+    segments = []
+    for position, part in enumerate((snippet or '').split(_OPEN)):
+        if position:
+            matched, _, part = part.partition(_CLOSE)
+            if matched:
+                segments.append({'text': matched, 'match': True})
+        if part:
+            segments.append({'text': part, 'match': False})
+    return segments
+
+
+def _join(source):
+    return f"JOIN {source['table']} ON {source['key']} = {source['fts']}.rowid {source['joins']}"
+
+
+def _rank_window(c, source, expression, joins, where, params, window):
+    """(lowest, highest) rowid of the newest ``window`` matches passing the filters.
+
+    The lower bound is 0 when there are fewer matches than that.
+    """
+    fts = source['fts']
+    sql = f'''SELECT {fts}.rowid FROM {fts} {joins}
+              WHERE {fts} MATCH ? {''.join(' AND ' + clause for clause in where)}
+              ORDER BY {fts}.rowid DESC LIMIT 1 OFFSET ?'''
+    newest = c.execute(sql, [expression] + params + [0]).fetchone()
+    if newest is None:
+        return 0, 0
+    oldest = c.execute(sql, [expression] + params + [window - 1]).fetchone()
+    return (oldest[0] if oldest else 0), newest[0]
+
+
+def _sources(c, args, expression, window, windows=None):
+    """(position, kind, source, joins, where, params, rank window) for every source the request can match.
+
+    The row tables are only joined when a facet filter needs them; on its
+    own the full-text index answers in a fraction of the time.
+    ``where`` includes the rank window. ``windows`` come from a cursor, so
+    every page ranks the same rows.
+    """
+    kinds = parse_kinds(args)
+    result = []
+    for position, kind in enumerate(KINDS):
+        if kind not in kinds:
+            continue
+        source = SOURCES[kind]
+        filters = _filters(source, args)
+        if filters is None:
+            continue
+        where, params = filters
+        joins = _join(source) if where else ''
+        if windows:
+            bounds = windows[2 * position:2 * position + 2]
+        else:
+            bounds = _rank_window(c, source, expression, joins, where, params, window)
+        where.append(f"{source['fts']}.rowid BETWEEN ? AND ?")
+        params += bounds
+        result.append((position, kind, source, joins, where, params, bounds))
+    return result
+
+
+def search(c, args, window=RANK_WINDOW):
+    """One page of ranked hits for request ``args``. Returns (items, next_cursor).
+
+    BM25 has to score every candidate before the best can be picked, so a
+    word found in a large share of the rows would cost a full pass. Each
+    source ranks only its newest ``window`` matches (after the filters).
+    Queries with fewer matches rank all of them.
+
+    The cursor holds each source's window and how many of its hits earlier
+    pages used. Scores shift whenever rows are written, so a keyset on the
+    score would repeat or skip hits; an offset into the window cannot, and
+    the window bounds what it costs.
+    """
+    expression = parse_query(args.get('q'))
+    limit = page_limit(args)
+    windows = taken = None
+    if args.get('cursor'):
+        cursor = decode_cursor(args['cursor'], 3 * len(KINDS))
+        if not all(type(value) is int and value >= 0 for value in cursor):
+            raise BadQueryParameter('Invalid cursor')
+        windows, taken = cursor[:2 * len(KINDS)], cursor[2 * len(KINDS):]
+
+    hits = []
+    sources = _sources(c, args, expression, window, windows)
+    for position, kind, source, joins, where, params, _ in sources:
+        fts = source['fts']
+        sql = f'''SELECT {fts}.rowid, bm25({fts}) AS score,
+                         snippet({fts}, 0, '{_OPEN}', '{_CLOSE}', '…', {SNIPPET_TOKENS})
+                  FROM {fts} {joins}
+                  WHERE {fts} MATCH ? {''.join(' AND ' + clause for clause in where)}
+                  ORDER BY score, {fts}.rowid LIMIT ? OFFSET ?'''
+        offset = taken[position] if taken else 0
+        for row_id, score, snippet in c.execute(sql, [expression] + params + [limit + 1, offset]).fetchall():
+            hits.append((score, position, row_id, kind, snippet))
+
+    hits.sort(key=lambda hit: hit[:3])
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        if windows is None:
+            windows, taken = [0] * (2 * len(KINDS)), [0] * len(KINDS)
+            for position, *_, bounds in sources:
+                windows[2 * position:2 * position + 2] = bounds
+        for _, position, _, _, _ in hits:
+            taken[position] += 1
+        next_cursor = encode_cursor(list(windows) + taken)
+
+    # Row details for this page only
+    rows = {}
+    for kind in {hit[3] for hit in hits}:
+        source = SOURCES[kind]
+        ids = [hit[2] for hit in hits if hit[3] == kind]
+        for row in c.execute(f'''SELECT {source['select']} FROM {source['table']} {source['joins']}
+                                 WHERE {source['key']} IN ({', '.join('?' * len(ids))})''', ids).fetchall():
+            rows[kind, row['id']] = row
+    items = []
+    for score, _, row_id, kind, snippet in hits:
+        row = rows.get((kind, row_id))
+        if row is None:
+            continue
+        item = {key: row[key] for key in ('id', 'complaint_id', 'type', 'department', 'status', 'created_at')}
+        # BM25 is negative in SQLite; flip it so higher is better for clients
+        item.update(kind=kind, score=round(-score, 4), snippet=highlight(snippet))
+        items.append(item)
+    return items, next_cursor
+
+
+def facets(c, args, window=RANK_WINDOW):
+    """Counts per type, department and status of the rows search() ranks, per kind.
+
+    ``complete`` is False when a kind had more matches than the rank window.
+    """
+    expression = parse_query(args.get('q'))
+    result = {}
+    for _, kind, source, joins, where, params, bounds in _sources(c, args, expression, window):
+        names = [facet for facet in FACETS if facet in source['facets']]
+        columns = ', '.join(source['facets'][facet] for facet in names)
+        fts = source['fts']
+        # One pass over the matches, grouped by every facet at once
+        rows = c.execute(f'''SELECT {columns}, COUNT(*) FROM {fts} {joins or _join(source)}
+                             WHERE {fts} MATCH ? {''.join(' AND ' + clause for clause in where)}
+                             GROUP BY {columns}''', [expression] + params).fetchall()
+        counts = {facet: {} for facet in names}
+        total = 0
+        for row in rows:
+            total += row[-1]
+            for index, facet in enumerate(names):
+                value = row[index] or 'Unknown'
+                counts[facet][value] = counts[facet].get(value, 0) + row[-1]
+        result[kind] = {
+            'total': total,
+            'complete': not bounds[0],
+            **{facet: [{'value': value, 'count': count}
+                       for value, count in sorted(values.items(), key=lambda item: -item[1])]
+               for facet, values in counts.items()},
+        }
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check, rebuild or optimize the full-text indexes.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check', action='store_true', help='Run the FTS5 integrity check')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild every index from its table')
+    parser.add_argument('--optimize', action='store_true', help='Merge index segments into one')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild or args.optimize:
+        conn.execute('BEGIN IMMEDIATE')
+        if args.rebuild:
+            rebuild(conn)
+        if args.optimize:
+            optimize(conn)
+        conn.commit()
+        print('Rebuilt' if args.rebuild else 'Optimized', ', '.join(f'{table}_fts' for table in INDEXED))
+    problems = check(conn)
+    for table, error in problems.items():
+        print(f"WARNING: {table}_fts does not match {table}. {error}")
+    if args.check or args.rebuild:
+        print('Indexes match their tables' if not problems else f'{len(problems)} index(es) out of step')
+    conn.close()
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,427 @@
+"""Synthetic complaints and related rows for scaling tests.
+
+Fills the existing schema with correlated rows in bulk:
+
+- users: citizens, a few of whom file most complaints, and police;
+- complaints: around Indian cities weighted by population. Each city skews
+  the type mix and each type its departments. Filing follows office hours,
+  weekdays and growth over the period. Each complaint goes from Submitted
+  to In Progress at its first response and to Resolved after a
+  department-dependent delay. Slow resolutions get poorer ratings;
+- comments, user_tags, evidence, rewards, feedback and community_reports,
+  keyed to those complaints and their timestamps.
+
+Rows are written with executemany, one transaction per chunk, with the
+journal and syncing off. Triggers and secondary indexes are dropped for the
+load and recreated from their stored SQL. The tables they maintain
+(counters, geo, search, evidence ref counts, anomalies, rollups) are then
+rebuilt, so the result is the same as writing every row through the app.
+Run it with the app stopped, against a file you can throw away if it is
+interrupted:
+
+    python synthetic_data.py --db /tmp/scale.db --rows 10000000
+    python synthetic_data.py --db /tmp/scale.db --complaints 200000 --seed 3
+
+A missing database is created and migrated first; an existing one is added to.
+"""
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import anomalies
+import counters
+import evidence_store
+import geo
+import rollups
+import search
+from db import DB_PATH
+from migrations import migrate
+
+LOADED_TABLES = ('users', 'officials', 'complaints', 'comments', 'evidence', 'user_tags', 'rewards', 'feedback',
+                 'community_reports')
+
+# name, latitude, longitude, metro population in millions
+CITIES = [
+    ('Delhi', 28.6139, 77.2090, 32), ('Mumbai', 19.0760, 72.8777, 21), ('Kolkata', 22.5726, 88.3639, 15),
+    ('Bengaluru', 12.9716, 77.5946, 13), ('Chennai', 13.0827, 80.2707, 11), ('Hyderabad', 17.3850, 78.4867, 10),
+    ('Ahmedabad', 23.0225, 72.5714, 8), ('Pune', 18.5204, 73.8567, 7), ('Jaipur', 26.9124, 75.7873, 4),
+    ('Lucknow', 26.8467, 80.9462, 4), ('Patna', 25.5941, 85.1376, 2.5), ('Bhopal', 23.2599, 77.4126, 2.5),
+]
+TYPES = {'bribery': 38, 'delay': 24, 'harassment': 12, 'nepotism': 9, 'embezzlement': 7, 'extortion': 6, 'fraud': 4}
+DEPARTMENTS = {
+    'bribery': {'Police': 45, 'RTO': 20, 'Municipal Corporation': 15, 'Revenue Department': 12,
+                'Electricity Department': 8},
+    'delay': {'Passport Office': 35, 'RTO': 25, 'Municipal Corporation': 20, 'Water Supply Department': 10,
+              'Electricity Department': 10},
+    'harassment': {'Police': 70, 'Municipal Corporation': 15, 'General Administration': 15},
+    'nepotism': {'Municipal Corporation': 50, 'General Administration': 30, 'Revenue Department': 20},
+    'embezzlement': {'Finance Ministry': 60, 'Municipal Corporation': 25, 'Revenue Department': 15},
+    'extortion': {'Police': 80, 'General Administration': 20},
+    'fraud': {'Finance Ministry': 40, 'Revenue Department': 40, 'General Administration': 20},
+}
+# Median days from filing to resolution
+RESOLUTION_DAYS = {'Police': 20, 'RTO': 12, 'Municipal Corporation': 35, 'Revenue Department': 40,
+                   'Electricity Department': 10, 'Passport Office': 25, 'Water Supply Department': 15,
+                   'General Administration': 45, 'Finance Ministry': 60}
+FIRST_RESPONSE_DAYS = 3
+NEVER_RESOLVED = 0.12
+# Filing by hour of day and by weekday (Monday first)
+HOURLY = [1, 1, 1, 1, 1, 2, 3, 5, 8, 11, 12, 12, 10, 11, 12, 11, 10, 9, 8, 7, 5, 4, 2, 1]
+WEEKLY = [1.0, 1.0, 0.95, 0.95, 0.9, 0.6, 0.4]
+# Filing at the end of the period relative to its start
+GROWTH = 3.0
+
+DESCRIPTIONS = {
+    'bribery': ["Officer <PERSON> at the {department} office asked for {amount} rupees to clear my {item}.",
+                "The clerk said my {item} would be approved only after paying {amount} rupees.",
+                "Agent outside the {department} office collects {amount} rupees for the inspector."],
+    'delay': ["My {item} has been pending with the {department} for {months} months without reason.",
+              "Applied for {item} {months} months ago, every visit they ask to come next week.",
+              "The {department} keeps losing my {item} file, {months} months and counting."],
+    'harassment': ["Staff at the {department} shouted at me and threatened to reject my {item}.",
+                   "I was made to wait all day and insulted when I asked about my {item}.",
+                   "Inspector <PERSON> called me on <PHONE_NUMBER> repeatedly demanding I withdraw my complaint."],
+    'nepotism': ["The {department} contract went to a relative of the officer without a tender.",
+                 "Jobs at the {department} were given to family members of <PERSON>.",
+                 "The {item} allotment list has only names connected to the ward officer."],
+    'embezzlement': ["Funds of {amount} rupees for the {item} scheme never reached the beneficiaries.",
+                     "The {department} shows the road repaired on paper, nothing was done.",
+                     "Ration meant for the {item} scheme is being sold in the open market."],
+    'extortion': ["Local officer demands {amount} rupees every month to let my shop stay open.",
+                  "Police threatened a false case unless I paid {amount} rupees.",
+                  "<PERSON> from the {department} demanded {amount} rupees to not seal my premises."],
+    'fraud': ["Fake receipts of {amount} rupees were issued for my {item} fee.",
+              "My {item} was cancelled and reissued to someone else using forged papers.",
+              "The {department} charged {amount} rupees for a form that is free."],
+}
+ITEMS = ['driving licence', 'passport', 'ration card', 'building permit', 'electricity connection',
+         'water connection', 'birth certificate', 'land record', 'pension', 'trade licence', 'scholarship']
+COMMENTS = ["Complaint received and assigned to the vigilance officer.", "Officer has been asked for a written reply.",
+            "Site inspection scheduled, please keep documents ready.", "Statement of the complainant recorded.",
+            "Matter escalated to the department head.", "Awaiting records from the {department}.",
+            "Any update? It has been weeks.", "I have uploaded the receipt as evidence."]
+RESOLUTIONS = ["Disciplinary action initiated against the officer.", "Pending {item} has been processed.",
+               "Amount refunded to the complainant.", "FIR registered and forwarded to the ACB.",
+               "Allegation not substantiated after inquiry."]
+EVIDENCE_KINDS = [('jpg', 'image/jpeg', 55), ('mp4', 'video/mp4', 15), ('pdf', 'application/pdf', 20),
+                  ('mp3', 'audio/mpeg', 10)]
+SERVICES = {'Passport Office': 3.4, 'RTO': 2.6, 'Municipal Corporation': 2.4, 'Electricity Department': 3.0,
+            'Water Supply Department': 2.9}
+ISSUES = ['Bribe demanded at counter', 'Touts outside office', 'Road work abandoned', 'Streetlights not repaired',
+          'Garbage not collected', 'Ration shop closed', 'Hospital charging for free medicines']
+
+# Rows written per complaint on average, for --rows
+ROWS_PER_COMPLAINT = 5.1
+CHUNK = 50000
+# Generated times are microseconds since the epoch
+DAY = 86400 * 10 ** 6
+
+
+def _normalized(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def _pick(rng, cumulative):
+    """One index per row of ``cumulative`` (rows of cumulative probabilities)."""
+    picks = (rng.random(len(cumulative))[:, None] > cumulative).sum(axis=1)
+    return np.minimum(picks, cumulative.shape[1] - 1)
+
+
+def _where(mask, values):
+    """``values`` as a list, with None where ``mask`` is false."""
+    return [value if keep else None for keep, value in zip(mask.tolist(), values.tolist())]
+
+
+def _timestamps(microseconds):
+    """Naive local timestamps as the app stores them ('YYYY-MM-DD HH:MM:SS.ffffff')."""
+    return [text.replace('T', ' ') for text in
+            np.datetime_as_string(microseconds.astype('datetime64[us]'), unit='us').tolist()]
+
+
+class Generator:
+    """Draws correlated rows; ``seed`` makes the output reproducible."""
+
+    def __init__(self, seed=7, days=730, now=None):
+        self.rng = np.random.default_rng(seed)
+        self.text = random.Random(seed)
+        self.now = np.datetime64(now or datetime.now(), 'us').astype(np.int64)
+        # Midnight starting the first of ``days`` days, the last being today
+        self.start = (self.now // DAY - days + 1) * DAY
+        self.days = days
+
+        self.types = list(TYPES)
+        self.departments = sorted(RESOLUTION_DAYS)
+        self.city_p = _normalized([city[3] for city in CITIES])
+        # Each city leans towards some types
+        base = _normalized(list(TYPES.values()))
+        skew = self.rng.gamma(8.0, 1.0, size=(len(CITIES), len(TYPES)))
+        self.city_types = np.cumsum(skew * base / (skew * base).sum(axis=1, keepdims=True), axis=1)
+        self.type_departments = np.cumsum([_normalized([DEPARTMENTS[t].get(d, 0) for d in self.departments])
+                                           for t in self.types], axis=1)
+        self.median_seconds = np.array([RESOLUTION_DAYS[d] * 86400.0 for d in self.departments])
+
+        day = np.arange(days)
+        # 1970-01-01 was a Thursday
+        weekday = (self.start // DAY + day + 3) % 7
+        self.day_p = _normalized(np.exp(math.log(GROWTH) * day / days) * np.array(WEEKLY)[weekday])
+        self.hour_p = _normalized(HOURLY)
+
+    def moments(self, size):
+        """Filing times over the period, in microseconds since the epoch."""
+        day = self.rng.choice(self.days, size, p=self.day_p)
+        hour = self.rng.choice(24, size, p=self.hour_p)
+        seconds = day * 86400 + hour * 3600 + self.rng.random(size) * 3600
+        moments = self.start + (seconds * 10 ** 6).astype(np.int64)
+        # Today is partly in the future; those move to the same weekday a week earlier
+        return np.where(moments > self.now, moments - 7 * DAY, moments)
+
+    def users(self, first_id, citizens, police):
+        rows = [(first_id + n, f'citizen{first_id + n}@synthetic.local', 'password123', f'{900000000000 + first_id + n}',
+                 'citizen', f'Citizen {first_id + n}') for n in range(citizens)]
+        rows += [(first_id + citizens + n, f'police{first_id + citizens + n}@synthetic.local', 'password123',
+                  f'{900000000000 + first_id + citizens + n}', 'police', f'Inspector {first_id + citizens + n}')
+                 for n in range(police)]
+        return rows
+
+    def officials(self, first_id, per_department):
+        rows = []
+        for department in self.departments:
+            for _ in range(per_department):
+                rows.append((first_id + len(rows), f'Officer {first_id + len(rows)}', department,
+                             self.text.choice(['Inspector', 'Deputy Director', 'Section Officer', 'Commissioner']),
+                             round(float(self.rng.normal(70, 12)), 1)))
+        return rows
+
+    def _describe(self, templates, department):
+        return self.text.choice(templates).format(department=department, item=self.text.choice(ITEMS),
+                                                  amount=self.text.randrange(500, 200000, 500),
+                                                  months=self.text.randint(2, 18))
+
+    def complaints(self, first_id, size, citizens, police, officials):
+        """Rows for ``size`` complaints from ``first_id`` on; returns {table: rows}.
+
+        ``citizens`` and ``police`` are arrays of user ids, ``officials`` has a
+        row of official ids per department, in ``self.departments`` order.
+        """
+        rng = self.rng
+        ids = np.arange(first_id, first_id + size)
+        city = rng.choice(len(CITIES), size, p=self.city_p)
+        type_index = _pick(rng, self.city_types[city])
+        department_index = _pick(rng, self.type_departments[type_index])
+        created = self.moments(size)
+
+        first_response = created + (rng.exponential(FIRST_RESPONSE_DAYS * DAY, size)).astype(np.int64)
+        resolution = rng.lognormal(np.log(self.median_seconds[department_index]), 0.8)
+        resolved_at = created + (resolution * 10 ** 6).astype(np.int64)
+        resolved = (rng.random(size) >= NEVER_RESOLVED) & (resolved_at <= self.now)
+        handled = resolved | (first_response <= self.now)
+        updated = np.where(resolved, resolved_at, np.where(handled, np.minimum(first_response, self.now), created))
+        # A resolution within a couple of weeks rates well, one taking months poorly
+        weeks = resolution / (14 * 86400.0)
+        rating = np.clip(np.rint(4.2 - 0.9 * np.log2(weeks) + rng.normal(0, 0.7, size)), 1, 5)
+        rated = resolved & (rng.random(size) < 0.55)
+
+        located = rng.random(size) >= 0.08
+        latitude = np.array([CITIES[c][1] for c in city]) + rng.standard_t(4, size) * 0.06
+        longitude = np.array([CITIES[c][2] for c in city]) + rng.standard_t(4, size) * 0.06
+        # A few citizens file most of the complaints
+        filer = citizens[(len(citizens) * rng.random(size) ** 2).astype(np.int64)]
+        handler = police[rng.integers(0, len(police), size)]
+        assigned = officials[department_index, rng.integers(0, officials.shape[1], size)]
+
+        types = [self.types[n] for n in type_index.tolist()]
+        departments = [self.departments[n] for n in department_index.tolist()]
+        rows = list(zip(
+            ids.tolist(), types,
+            [self._describe(DESCRIPTIONS[t], d) for t, d in zip(types, departments)],
+            np.where(resolved, 'Resolved', np.where(handled, 'In Progress', 'Submitted')).tolist(),
+            _timestamps(created), _timestamps(updated), filer.tolist(),
+            _where(located, latitude), _where(located, longitude), _where(handled, assigned), departments,
+            _where(rated, rating.astype(np.int64)), ['ready'] * size))
+
+        tables = {'complaints': rows}
+        tables['comments'] = self._comments(ids, created, first_response, updated, resolved, handled, filer, handler,
+                                            department_index)
+        bribery = handled & np.isin(type_index, [self.types.index('bribery'), self.types.index('extortion')])
+        tables['user_tags'] = list(zip(handler[bribery].tolist(), ['bribery_complaint'] * int(bribery.sum()),
+                                       ids[bribery].tolist(), _timestamps(first_response[bribery])))
+        tables['evidence'] = self._evidence(ids, created)
+        rewarded = resolved & bribery & (rng.random(size) < 0.1)
+        tables['rewards'] = list(zip(ids[rewarded].tolist(),
+                                     rng.choice([5000, 10000, 25000, 50000], int(rewarded.sum())).tolist(),
+                                     rng.choice(['Pending', 'Approved', 'Distributed'], int(rewarded.sum()),
+                                                p=[0.3, 0.2, 0.5]).tolist()))
+        tables['feedback'] = self._feedback(size // 5)
+        tables['community_reports'] = self._reports(size // 10)
+        return tables
+
+    def _comments(self, ids, created, first_response, updated, resolved, handled, filer, handler, department_index):
+        """Officer updates between the first response and the last change, then the resolution."""
+        rng = self.rng
+        counts = np.where(handled, 1 + rng.poisson(0.8, len(ids)), 0)
+        owner = np.repeat(np.arange(len(ids)), counts)
+        start = np.minimum(first_response[owner], self.now)
+        end = np.maximum(np.where(resolved[owner], updated[owner], self.now), start)
+        moments = start + ((end - start) * rng.random(len(owner))).astype(np.int64)
+        by_citizen = rng.random(len(owner)) < 0.25
+        authors = np.where(by_citizen, filer[owner], handler[owner])
+        rows = [(int(ids[o]), int(author), self.text.choice(COMMENTS).format(department=self.departments[
+                    department_index[o]]), moment)
+                for o, author, moment in zip(owner.tolist(), authors.tolist(), _timestamps(moments))]
+        closed = np.flatnonzero(resolved)
+        rows += [(int(ids[o]), int(handler[o]), 'RESOLUTION: ' + self.text.choice(RESOLUTIONS).format(
+                    item=self.text.choice(ITEMS)), moment)
+                 for o, moment in zip(closed.tolist(), _timestamps(updated[closed]))]
+        return rows
+
+    def _evidence(self, ids, created):
+        rng = self.rng
+        counts = np.where(rng.random(len(ids)) < 0.3, 1 + rng.poisson(0.5, len(ids)), 0)
+        owner = np.repeat(np.arange(len(ids)), counts)
+        kinds = rng.choice(len(EVIDENCE_KINDS), len(owner), p=_normalized([kind[2] for kind in EVIDENCE_KINDS]))
+        sizes = rng.lognormal(13.5, 1.2, len(owner)).astype(np.int64)
+        rows = []
+        for n, (o, kind, size) in enumerate(zip(owner.tolist(), kinds.tolist(), sizes.tolist())):
+            extension, content_type, _ = EVIDENCE_KINDS[kind]
+            rows.append((int(ids[o]), f'synthetic/{ids[o]}_{n}.{extension}', size, f'evidence_{n}.{extension}',
+                         content_type))
+        return rows
+
+    def _feedback(self, size):
+        services = list(SERVICES)
+        service = self.rng.choice(len(services), size)
+        means = np.array([SERVICES[name] for name in services])[service]
+        ratings = np.clip(np.rint(self.rng.normal(means, 1.0)), 1, 5).astype(int)
+        return [(services[s], int(r), self.text.choice(['', 'Long queues', 'Staff was helpful', 'Asked for money',
+                                                        'Website down']), int(anonymous), moment)
+                for s, r, anonymous, moment in zip(service.tolist(), ratings.tolist(),
+                                                   (self.rng.random(size) < 0.4).tolist(),
+                                                   _timestamps(self.moments(size)))]
+
+    def _reports(self, size):
+        city = self.rng.choice(len(CITIES), size, p=self.city_p)
+        severity = self.rng.choice(['Low', 'Medium', 'High'], size, p=[0.4, 0.4, 0.2])
+        status = self.rng.choice(['Pending', 'Verified', 'Resolved'], size, p=[0.5, 0.3, 0.2])
+        return [(CITIES[c][0], self.text.choice(ISSUES), s, self._describe(DESCRIPTIONS['embezzlement'], 'ward office'),
+                 st, moment)
+                for c, s, st, moment in zip(city.tolist(), severity.tolist(), status.tolist(),
+                                            _timestamps(self.moments(size)))]
+
+
+INSERTS = {
+    'users': 'INSERT INTO users (id, email, password, aadhar, role, name) VALUES (?, ?, ?, ?, ?, ?)',
+    'officials': 'INSERT INTO officials (id, name, department, position, performance_score) VALUES (?, ?, ?, ?, ?)',
+    'complaints': '''INSERT INTO complaints (id, type, description, status, created_at, updated_at, user_id,
+                                             latitude, longitude, assigned_official_id, department,
+                                             satisfaction_rating, processing_status)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+    'comments': 'INSERT INTO comments (complaint_id, user_id, comment, timestamp) VALUES (?, ?, ?, ?)',
+    'user_tags': 'INSERT INTO user_tags (user_id, tag_type, complaint_id, created_at) VALUES (?, ?, ?, ?)',
+    'evidence': 'INSERT INTO evidence (complaint_id, file_path, size, original_name, content_type) VALUES (?, ?, ?, ?, ?)',
+    'rewards': 'INSERT INTO rewards (complaint_id, amount, status) VALUES (?, ?, ?)',
+    'feedback': 'INSERT INTO feedback (service_name, rating, comments, anonymous, created_at) VALUES (?, ?, ?, ?, ?)',
+    'community_reports': '''INSERT INTO community_reports (location, issue, severity, description, status, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+}
+
+
+def suspend(conn, kind, tables=LOADED_TABLES):
+    """Drops the triggers or explicit indexes on ``tables``; returns their CREATE statements."""
+    rows = conn.execute(f'''SELECT name, sql FROM sqlite_master WHERE type = ? AND sql IS NOT NULL
+                            AND tbl_name IN ({', '.join('?' * len(tables))})''', (kind,) + tuple(tables)).fetchall()
+    for name, _ in rows:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    return [sql for _, sql in rows]
+
+
+def rebuild_derived(conn):
+    """Recomputes everything the suspended triggers would have maintained."""
+    counters.rebuild(conn)
+    geo.rebuild(conn)
+    search.rebuild(conn)
+    evidence_store.rebuild(conn)
+    rollups.rebuild(conn)
+    anomalies.rebuild(conn)
+    # Cached responses for the old contents must not be served again
+    conn.execute('UPDATE table_versions SET version = version + 1')
+
+
+def _next_id(conn, table):
+    return conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+
+
+def generate(conn, complaints, seed=7, days=730, chunk=CHUNK, log=print):
+    """Adds ``complaints`` complaints with their users and related rows. Returns {table: rows added}."""
+    generator = Generator(seed, days)
+    added = dict.fromkeys(LOADED_TABLES, 0)
+    started = time.perf_counter()
+
+    conn.commit()
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('BEGIN')
+    triggers = suspend(conn, 'trigger')
+    indexes = suspend(conn, 'index')
+
+    first_user = _next_id(conn, 'users')
+    citizens, police = max(100, complaints // 4), max(10, complaints // 2000)
+    conn.executemany(INSERTS['users'], generator.users(first_user, citizens, police))
+    per_department = max(3, complaints // 50000)
+    official_rows = generator.officials(_next_id(conn, 'officials'), per_department)
+    conn.executemany(INSERTS['officials'], official_rows)
+    added.update(users=citizens + police, officials=len(official_rows))
+    citizen_ids = np.arange(first_user, first_user + citizens)
+    police_ids = np.arange(first_user + citizens, first_user + citizens + police)
+    officials = np.array([row[0] for row in official_rows]).reshape(-1, per_department)
+
+    first_complaint = _next_id(conn, 'complaints')
+    for offset in range(0, complaints, chunk):
+        size = min(chunk, complaints - offset)
+        for table, rows in generator.complaints(first_complaint + offset, size, citizen_ids, police_ids,
+                                                officials).items():
+            conn.executemany(INSERTS[table], rows)
+            added[table] += len(rows)
+        conn.commit()
+        conn.execute('BEGIN')
+        log(f"{offset + size} of {complaints} complaints, {sum(added.values())} rows "
+            f"({time.perf_counter() - started:.0f} s)")
+
+    for sql in indexes + triggers:
+        conn.execute(sql)
+    log(f"Recreated {len(indexes)} indexes and {len(triggers)} triggers ({time.perf_counter() - started:.0f} s)")
+    rebuild_derived(conn)
+    conn.commit()
+    log(f"Rebuilt counters, geo, search, evidence, rollups and anomalies ({time.perf_counter() - started:.0f} s)")
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA optimize')
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic complaints for scaling tests.')
+    parser.add_argument('--db', default=DB_PATH)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--complaints', type=int, help='Number of complaints to add')
+    size.add_argument('--rows', type=int, help='Approximate number of rows to add across all tables')
+    parser.add_argument('--days', type=int, default=730, help='Complaints are filed over this many days up to now')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    complaints = args.complaints or max(1, round(args.rows / ROWS_PER_COMPLAINT))
+    started = time.perf_counter()
+    added = generate(conn, complaints, args.seed, args.days)
+    conn.close()
+    print(f"Added {sum(added.values())} rows in {time.perf_counter() - started:.0f} s: "
+          + ', '.join(f'{count} {table}' for table, count in added.items()))
+    sys.exit(0)
@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anomalies  # noqa: E402
+
+
+def test_geohash_without_usable_coordinates():
+    assert anomalies.geohash(None, 77.2) == ''
+    assert anomalies.geohash('', '') == ''
+    assert anomalies.geohash('abc', 77.2) == ''
+
+
+def test_geohash_accepts_numeric_text():
+    assert anomalies.geohash('28.6', '77.2') == anomalies.geohash(28.6, 77.2)
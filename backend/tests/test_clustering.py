@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clustering  # noqa: E402
+
+
+def test_text_coordinates_are_skipped():
+    complaints = [
+        {'id': 1, 'description': 'bribe demanded at the passport office', 'latitude': '', 'longitude': 77.2},
+        {'id': 2, 'description': 'passport office demanded a bribe', 'latitude': 28.61, 'longitude': 77.2},
+        {'id': 3, 'description': 'bribe for the passport office file', 'latitude': 'abc', 'longitude': 'x'},
+    ]
+    clusters, _ = clustering.cluster_complaints(complaints, k=1)
+    assert clusters[0]['locations'] == [{'latitude': 28.6, 'longitude': 77.2, 'count': 1}]
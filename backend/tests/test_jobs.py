@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JOBS_TABLE_SQL, JobQueue, enqueue  # noqa: E402
+
+
+def _conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(JOBS_TABLE_SQL)
+    return conn
+
+
+def _fail(c, payload):
+    raise ValueError('boom')
+
+
+def test_permanently_failed_job_drops_payload():
+    conn = _conn()
+    enqueue(conn.cursor(), 'complaint.redact', {'description': 'Rajesh demanded 5000 rupees.'})
+    queue = JobQueue(lambda: conn, max_attempts=1)
+    job = queue.claim(conn)
+    assert not queue.run(conn, job, _fail)
+    row = conn.execute('SELECT status, payload, last_error FROM jobs').fetchone()
+    assert (row['status'], row['payload'], row['last_error']) == ('failed', None, 'boom')
+
+
+def test_retried_job_keeps_payload():
+    conn = _conn()
+    enqueue(conn.cursor(), 'complaint.redact', {'description': 'text'})
+    queue = JobQueue(lambda: conn, max_attempts=2)
+    assert not queue.run(conn, queue.claim(conn), _fail)
+    row = conn.execute('SELECT status, payload FROM jobs').fetchone()
+    assert row['status'] == 'queued' and row['payload'] is not None
@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+from concurrent.futures import TimeoutError
+from multiprocessing.connection import Listener
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pii_rules  # noqa: E402
+from redaction import RedactionService, RemoteRedactionService  # noqa: E402
+
+
+def test_ner_runs_by_default():
+    assert RedactionService(pool_size=0).ner_policy == 'always'
+
+
+def test_sentence_initial_name_needs_ner():
+    assert pii_rules.needs_ner("Rajesh demanded 5000 rupees.")
+    assert pii_rules.needs_ner("The clerk was rude. Rajesh demanded 5000 rupees.")
+    assert pii_rules.needs_ner("officer RAJESH took the money")
+
+
+def test_sentence_openers_and_known_terms_skip_ner():
+    assert not pii_rules.needs_ner("The clerk demanded money. I paid him.")
+    assert not pii_rules.needs_ner("Please check the FIR. My PAN is <IN_PAN>.")
+    assert pii_rules.needs_ner("Inspector Sharma refused to register the FIR.")
+
+
+def test_auto_policy_sends_sentence_initial_name_to_ner():
+    service = RedactionService(pool_size=0, ner_policy='auto')
+    sent = []
+    service._start = lambda: None
+    service._requests.put = lambda item: sent.append(item[0])
+    service.submit("Rajesh demanded 5000 rupees.")
+    assert sent == ["Rajesh demanded 5000 rupees."]
+
+
+def test_remote_service_requires_authkey():
+    with pytest.raises(RuntimeError):
+        RemoteRedactionService(('127.0.0.1', 0), None)
+    with pytest.raises(RuntimeError):
+        RemoteRedactionService(('127.0.0.1', 0), '')
+
+
+def test_remote_redact_honours_timeout():
+    listener = Listener(('127.0.0.1', 0), authkey=b'secret')
+    accepted = []
+    threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True).start()
+    service = RemoteRedactionService(listener.address, 'secret')
+    with pytest.raises(TimeoutError):
+        service.redact("Rajesh demanded 5000 rupees.", timeout=0.05)
+    listener.close()
@@ -0,0 +1,20 @@
+"""Runs the background work without serving HTTP.
+
+Processes the job queue, sends outbox email and keeps analytics warm, for
+deployments that run the web app with BACKGROUND_WORKERS=0:
+
+    python worker.py
+"""
+import time
+
+from app import init_db, start_background_work
+
+if __name__ == '__main__':
+    init_db()
+    start_background_work()
+    print("Background workers running. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
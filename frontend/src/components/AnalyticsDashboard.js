@@ -29,6 +29,7 @@ ChartJS.register(
 function AnalyticsDashboard() {
   const [complaintsByType, setComplaintsByType] = useState({ labels: [], datasets: [] });
   const [trendData, setTrendData] = useState({ labels: [], datasets: [] });
+  const [granularity, setGranularity] = useState('day');
   const [resolutionTime, setResolutionTime] = useState({ labels: [], datasets: [] });
   const [riskAnalysis, setRiskAnalysis] = useState([]);
   const [anomalies, setAnomalies] = useState([]);
@@ -50,21 +51,6 @@ function AnalyticsDashboard() {
         ],
       });
 
-      // Fetch trend data
-      const trendResponse = await axios.get('/api/trend-data');
-      setTrendData({
-        labels: trendResponse.data.labels,
-        datasets: [
-          {
-            label: 'Complaints Over Time',
-            data: trendResponse.data.data,
-            borderColor: 'rgb(255, 99, 132)',
-            backgroundColor: 'rgba(255, 99, 132, 0.5)',
-            tension: 0.3,
-          },
-        ],
-      });
-
       // Fetch resolution time
       const timeResponse = await axios.get('/api/resolution-time');
       setResolutionTime({
@@ -92,6 +78,26 @@ function AnalyticsDashboard() {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    const fetchTrend = async () => {
+      const trendResponse = await axios.get('/api/trend-data', { params: { granularity } });
+      setTrendData({
+        labels: trendResponse.data.labels,
+        datasets: [
+          {
+            label: 'Complaints Over Time',
+            data: trendResponse.data.data,
+            borderColor: 'rgb(255, 99, 132)',
+            backgroundColor: 'rgba(255, 99, 132, 0.5)',
+            tension: 0.3,
+          },
+        ],
+      });
+    };
+
+    fetchTrend();
+  }, [granularity]);
+
   const options = {
     responsive: true,
     plugins: {
@@ -117,6 +123,12 @@ function AnalyticsDashboard() {
         
         <div className="chart-container">
           <h3>Trend Over Time</h3>
+          <select value={granularity} onChange={(e) => setGranularity(e.target.value)}>
+            <option value="hour">Last 2 days, hourly</option>
+            <option value="day">Last 30 days, daily</option>
+            <option value="week">Last 6 months, weekly</option>
+            <option value="month">Last 2 years, monthly</option>
+          </select>
           <Line data={trendData} options={options} />
         </div>
         
@@ -157,7 +169,13 @@ function AnalyticsDashboard() {
             {anomalies.map((anomaly, index) => (
               <div key={index} className={`anomaly-item ${anomaly.severity.toLowerCase()}`}>
                 <div className="anomaly-date">{anomaly.date}</div>
-                <div className="anomaly-count">{anomaly.count} complaints</div>
+                <div className="anomaly-series">
+                  {anomaly.department === '*' ? 'All complaints' : `${anomaly.department} · ${anomaly.type}`}
+                  {anomaly.geohash && anomaly.geohash !== '*' ? ` · area ${anomaly.geohash}` : ''}
+                </div>
+                <div className="anomaly-count">
+                  {anomaly.count} complaints (expected {anomaly.expected}, z {anomaly.z_score})
+                </div>
                 <div className="anomaly-severity">{anomaly.severity}</div>
               </div>
             ))}
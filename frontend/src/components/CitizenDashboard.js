@@ -16,10 +16,19 @@ function CitizenDashboard() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
+    // The stat cards count every complaint, so follow the cursor to the last page
     const fetchComplaints = async () => {
       try {
-        const response = await axios.get(`/api/user/complaints?user_id=${user.id}`);
-        setComplaints(response.data);
+        let all = [];
+        let cursor = null;
+        do {
+          const response = await axios.get('/api/user/complaints', {
+            params: cursor ? { user_id: user.id, cursor } : { user_id: user.id }
+          });
+          all = [...all, ...response.data];
+          cursor = response.headers['x-next-cursor'] || null;
+        } while (cursor);
+        setComplaints(all);
       } catch (error) {
         console.error('Error fetching complaints:', error);
       } finally {
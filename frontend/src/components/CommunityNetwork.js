@@ -10,17 +10,19 @@ function CommunityNetwork() {
     description: ''
   });
   const [submitting, setSubmitting] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    const fetchReports = async () => {
-      try {
-        const response = await axios.get('/api/community-reports');
-        setReports(response.data);
-      } catch (error) {
-        console.error('Error fetching reports:', error);
-      }
-    };
+  const fetchReports = async (cursor = null) => {
+    try {
+      const response = await axios.get('/api/community-reports', { params: cursor ? { cursor } : {} });
+      setReports(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching reports:', error);
+    }
+  };
 
+  useEffect(() => {
     fetchReports();
   }, []);
 
@@ -42,8 +44,7 @@ function CommunityNetwork() {
       });
       
       // Refresh reports
-      const response = await axios.get('/api/community-reports');
-      setReports(response.data);
+      await fetchReports();
       
       alert('Report submitted successfully!');
     } catch (error) {
@@ -154,6 +155,7 @@ function CommunityNetwork() {
                 </div>
               </div>
             ))}
+            {nextCursor && <button onClick={() => fetchReports(nextCursor)}>Load more</button>}
           </div>
         )}
       </div>
@@ -22,6 +22,21 @@ function ComplaintForm() {
     setEvidence(e.target.files);
   };
 
+  // Analysis and the FIR draft are produced in the background after submission
+  const pollStatus = async (statusUrl, attempt = 0) => {
+    try {
+      const response = await axios.get(statusUrl);
+      if (response.data.processing_status === 'ready') {
+        setAnalysis(response.data.analysis);
+        setFirDraft(response.data.fir_draft);
+      } else if (attempt < 30) {
+        setTimeout(() => pollStatus(statusUrl, attempt + 1), 2000);
+      }
+    } catch (error) {
+      console.error('Error fetching complaint status:', error);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     
@@ -52,8 +67,9 @@ function ComplaintForm() {
       });
       
       setSubmissionStatus({ success: true, id: response.data.id });
-      setAnalysis(response.data.analysis);
-      setFirDraft(response.data.fir_draft);
+      setAnalysis('');
+      setFirDraft('');
+      pollStatus(response.data.status_url);
       
       // Reset form
       setComplaint({ type: '', description: '' });
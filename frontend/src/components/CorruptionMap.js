@@ -1,28 +1,60 @@
-import React, { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import React, { useState, useEffect, useRef } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, CircleMarker, Tooltip, useMap, useMapEvents } from 'react-leaflet';
 import axios from 'axios';
 import 'leaflet/dist/leaflet.css';
 
+// Reports the map's viewport on load and after every pan or zoom
+function ViewportWatcher({ onViewportChange }) {
+  const map = useMapEvents({
+    moveend: () => onViewportChange(map),
+  });
+
+  useEffect(() => {
+    onViewportChange(map);
+  }, [map]); // eslint-disable-line react-hooks/exhaustive-deps
+
+  return null;
+}
+
+function ClusterMarker({ cluster }) {
+  const map = useMap();
+  return (
+    <CircleMarker
+      center={[cluster.latitude, cluster.longitude]}
+      radius={Math.min(40, 10 + Math.log2(cluster.count) * 3)}
+      pathOptions={{ color: 'red', fillOpacity: 0.5 }}
+      eventHandlers={{ click: () => map.setView([cluster.latitude, cluster.longitude], Math.min(map.getZoom() + 2, 18)) }}
+    >
+      <Tooltip direction="center" permanent>{cluster.count}</Tooltip>
+    </CircleMarker>
+  );
+}
+
 function CorruptionMap() {
+  const [clusters, setClusters] = useState([]);
   const [complaints, setComplaints] = useState([]);
   const [loading, setLoading] = useState(true);
   const [center] = useState([20.5937, 78.9629]);
   const [zoom] = useState(5);
+  const latestRequest = useRef(0);
 
-  useEffect(() => {
-    const fetchComplaints = async () => {
-      try {
-        const response = await axios.get('/api/complaints-with-location');
-        setComplaints(response.data);
-      } catch (error) {
-        console.error('Error fetching complaints:', error);
-      } finally {
-        setLoading(false);
+  // The server clusters complaints for the visible area; only the newest response is shown
+  const fetchViewport = async (map) => {
+    const request = ++latestRequest.current;
+    try {
+      const response = await axios.get('/api/complaints-with-location', {
+        params: { bbox: map.getBounds().toBBoxString(), zoom: map.getZoom() }
+      });
+      if (request === latestRequest.current) {
+        setClusters(response.data.clusters);
+        setComplaints(response.data.points);
       }
-    };
-
-    fetchComplaints();
-  }, []);
+    } catch (error) {
+      console.error('Error fetching complaints:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
   const getStatusColor = (status) => {
     switch (status.toLowerCase()) {
@@ -35,18 +67,19 @@ function CorruptionMap() {
     }
   };
 
-  if (loading) {
-    return <div className="loading">Loading map...</div>;
-  }
-
   return (
     <div className="corruption-map">
       <h2>Corruption Hotspots Map</h2>
+      {loading && <div className="loading">Loading map...</div>}
       <MapContainer center={center} zoom={zoom} style={{ height: '500px', width: '100%' }}>
         <TileLayer
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
           attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
         />
+        <ViewportWatcher onViewportChange={fetchViewport} />
+        {clusters.map(cluster => (
+          <ClusterMarker key={`${cluster.latitude},${cluster.longitude}`} cluster={cluster} />
+        ))}
         {complaints.map(complaint => (
           complaint.latitude && complaint.longitude && (
             <Marker
@@ -56,7 +89,6 @@ function CorruptionMap() {
               <Popup>
                 <div className="popup-content">
                   <h4>{complaint.type}</h4>
-                  <p>{complaint.description}</p>
                   <p><strong>Status:</strong> {complaint.status}</p>
                   <p><strong>Date:</strong> {new Date(complaint.created_at).toLocaleDateString()}</p>
                 </div>
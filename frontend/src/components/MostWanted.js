@@ -5,19 +5,21 @@ function MostWanted() {
   const [criminals, setCriminals] = useState([]);
   const [selectedCriminal, setSelectedCriminal] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    const fetchCriminals = async () => {
-      try {
-        const response = await axios.get('/api/most-wanted');
-        setCriminals(response.data);
-      } catch (error) {
-        console.error('Error fetching most wanted criminals:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
+  const fetchCriminals = async (cursor = null) => {
+    try {
+      const response = await axios.get('/api/most-wanted', { params: cursor ? { cursor } : {} });
+      setCriminals(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching most wanted criminals:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchCriminals();
   }, []);
 
@@ -59,6 +61,7 @@ function MostWanted() {
           </div>
         ))}
       </div>
+      {nextCursor && <button onClick={() => fetchCriminals(nextCursor)}>Load more</button>}
       
       {selectedCriminal && (
         <div className="criminal-modal">
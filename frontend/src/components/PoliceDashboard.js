@@ -24,19 +24,21 @@ function PoliceDashboard() {
   const [showSystemicAnalysis, setShowSystemicAnalysis] = useState(false);
   const [systemicAnalysisResult, setSystemicAnalysisResult] = useState('');
   const [isAnalysisLoading, setIsAnalysisLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    const fetchComplaints = async () => {
-      try {
-        const response = await axios.get('/api/police/complaints');
-        setComplaints(response.data);
-      } catch (error) {
-        console.error('Error fetching complaints:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
+  const fetchComplaints = async (cursor = null) => {
+    try {
+      const response = await axios.get('/api/police/complaints', { params: cursor ? { cursor } : {} });
+      setComplaints(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching complaints:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchComplaints();
   }, []);
   
@@ -201,8 +203,12 @@ function PoliceDashboard() {
               {evidence.map(file => (
                 <li key={file.id}>
                   {/* This now uses a relative path, which will be correctly prefixed by axios's baseURL */}
-                  <a href={`${axios.defaults.baseURL}/uploads/${file.file_path}`} target="_blank" rel="noopener noreferrer">
-                    {file.file_path}
+                  <a href={`${axios.defaults.baseURL}${file.url}`} target="_blank" rel="noopener noreferrer">
+                    {/* Thumbnails are a few KB; the original only loads when opened */}
+                    {file.thumbnail_url && (
+                      <img src={`${axios.defaults.baseURL}${file.thumbnail_url}`} alt="" loading="lazy" className="evidence-thumbnail" />
+                    )}
+                    {file.original_name || file.file_path}
                   </a>
                 </li>
               ))}
@@ -314,6 +320,7 @@ function PoliceDashboard() {
               <ComplaintCard complaint={complaint} userType="police" />
             </div>
           ))}
+          {nextCursor && <button onClick={() => fetchComplaints(nextCursor)}>Load more</button>}
         </div>
       )}
     </div>
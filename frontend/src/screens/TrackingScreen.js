@@ -6,19 +6,23 @@ function TrackingScreen() {
   const { user } = useAuth();
   const [complaints, setComplaints] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    const fetchComplaints = async () => {
-      try {
-        const response = await axios.get(`http://localhost:5000/api/user/complaints?user_id=${user.id}`);
-        setComplaints(response.data);
-      } catch (error) {
-        console.error('Error fetching complaints:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
+  const fetchComplaints = async (cursor = null) => {
+    try {
+      const response = await axios.get('http://localhost:5000/api/user/complaints', {
+        params: cursor ? { user_id: user.id, cursor } : { user_id: user.id }
+      });
+      setComplaints(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching complaints:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     if (user) {
       fetchComplaints();
     }
@@ -82,6 +86,7 @@ function TrackingScreen() {
               </div>
             </div>
           ))}
+          {nextCursor && <button onClick={() => fetchComplaints(nextCursor)}>Load more</button>}
         </div>
       )}
     </div>